@@ -1,4 +1,7 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
+import time
+import json
+import logging
 from dotenv import load_dotenv
 import os
 from logging_config import setup_logging
@@ -9,53 +12,190 @@ setup_logging()
 # Load environment variables
 load_dotenv()
 
-# Import tools
-from tools.duckduckgo_search import search as duckduckgo_search
-from tools.ig_inbox_song_automate import get_song_data
-from tools.get_lyrics import get_lyrics
+# Import tools; search, lyrics and instagram are imported on first use through the registry
 from tools.simple_song_history import save_song_history_from_webhook
+from tools.song_history_queue import WRITE_BEHIND, enqueue, queue_status, start_flusher
+from tools.song_history_store import get_store
+from tools.song_events import get_event_log
+from tools.lyrics_index import search_lyrics
+from tools import metrics
+from tools.registry import registry
+import webhooks
+from webhooks import WebhookError
 
 app = Flask(__name__)
 
+if WRITE_BEHIND:
+    # Pick up payloads left in the queue by a previous run
+    start_flusher()
+
+# TOOLS_WARMUP=search,lyrics|all imports tools now, e.g. once in the master with gunicorn --preload
+registry.warm_up_from_env()
+
+def _route_label():
+    # The URL rule, not the path, so /users/<username> stays one series
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.add_gauge('http_requests_in_flight', 1, route=_route_label())
+
+@app.after_request
+def _record_request_metrics(response):
+    # Streamed responses are timed until their first byte is ready
+    route = _route_label()
+    metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_started,
+                    route=route, method=request.method)
+    metrics.inc('http_requests_total', route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def _finish_request_metrics(exc):
+    if 'request_started' in g:
+        metrics.add_gauge('http_requests_in_flight', -1, route=_route_label())
+
+@app.errorhandler(WebhookError)
+def _webhook_error(e):
+    return jsonify(e.body), e.status
+
+def _json_body():
+    return request.get_json(silent=True)
+
+def _conditional_json(build):
+    """
+    Respond with build()'s JSON, tagged with an ETag derived from the history's
+    last_updated timestamp and the request URL. Matching If-None-Match polls get
+    a 304 without running the query.
+    """
+    etag = webhooks.history_etag(get_store().last_updated(), request.full_path)
+    if webhooks.etag_matches(request.headers.get('If-None-Match'), etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = jsonify(webhooks.history_body(build()))
+    response.set_etag(etag)
+    return response
+
+def _ndjson(lines):
+    return Response((json.dumps(line) + '\n' for line in lines), mimetype='application/x-ndjson')
+
 @app.route('/webhook/search', methods=['POST'])
 def search_webhook():
-    data = request.get_json()
-    if not data or 'query' not in data or 'max_results' not in data:
-        return jsonify({'error': 'Missing query parameter'}), 400
+    data = _json_body()
+    params = webhooks.parse_search(data, request.headers)
+    logging.debug("Search request: %s", data, extra={"sample": "search_request"})
+    search_tool = registry.tool('search')
+    query, max_results, deadline = params['query'], params['max_results'], params['deadline']
 
-    query = data['query']
-    max_results = data['max_results']
-    print(data)
-    results = duckduckgo_search(query, int(max_results))
-    return jsonify(results)
+    if params['stream']:
+        def generate():
+            try:
+                yield from search_tool.iter_search(query, max_results, params['stop_after'], params['time_budget'],
+                                                   deadline)
+                trailer = webhooks.search_stream_trailer(deadline)
+                if trailer:
+                    yield trailer
+            except Exception as e:
+                logging.error(f"Streaming search failed: {e}")
+                yield {'error': str(e)}
+        return _ndjson(generate())
+
+    if params['stop_after'] or params['time_budget'] or deadline:
+        results = list(search_tool.iter_search(query, max_results, params['stop_after'], params['time_budget'],
+                                               deadline))
+    else:
+        results = search_tool.search(query, max_results)
+    return jsonify(webhooks.search_body(results, deadline))
 
 @app.route('/webhook/instagram', methods=['POST'])
 def instagram_webhook():
-    data = get_song_data()
-    return jsonify(data)
+    options = webhooks.parse_instagram(_json_body(), request.headers)
+    instagram = registry.tool('instagram')
+
+    if options['async']:
+        try:
+            job = instagram.submit_job(options['max_age'], options['callback_url'])
+        except ValueError as e:
+            raise WebhookError(str(e))
+        response = jsonify(job)
+        response.headers['Location'] = webhooks.job_location(job)
+        return response, 202
+
+    return jsonify(instagram.get_song_data_coalesced(options['max_age'], options['deadline']))
+
+@app.route('/webhook/instagram/jobs/<job_id>', methods=['GET'])
+def instagram_job_webhook(job_id):
+    return jsonify(webhooks.job_body(registry.tool('instagram').get_job(job_id)))
 
 @app.route('/webhook/get_lyrics', methods=['POST'])
 def get_lyrics_webhook():
-    data = request.get_json()
-    if not data or 'artists' not in data or 'song_name' not in data:
-        return jsonify({'error': 'Missing artists or song_name parameter'}), 400
+    artists, song_name, deadline = webhooks.parse_get_lyrics(_json_body(), request.headers)
+    return jsonify(registry.tool('lyrics').get_lyrics(artists, song_name, deadline))
+
+@app.route('/webhook/get_lyrics/batch', methods=['POST'])
+def get_lyrics_batch_webhook():
+    items, concurrency, deadline, stream = webhooks.parse_lyrics_batch(_json_body(), request.headers)
+    lyrics_tool = registry.tool('lyrics')
+
+    if stream:
+        return _ndjson(webhooks.batch_line(index, result)
+                       for index, result in lyrics_tool.iter_lyrics_batch(items, concurrency, deadline))
 
-    artists = data['artists']
-    song_name = data['song_name']
-    lyrics = get_lyrics(artists, song_name)
-    return jsonify(lyrics)
+    return jsonify(lyrics_tool.get_lyrics_batch(items, concurrency, deadline))
+
+@app.route('/webhook/lyrics_search', methods=['POST'])
+def lyrics_search_webhook():
+    # Identify songs from a remembered line: answered from the local lyrics index, DDGS + Genius only on a miss
+    query, max_results, live_fallback, deadline = webhooks.parse_lyrics_search(_json_body(), request.headers)
+    return jsonify(search_lyrics(query, max_results, live_fallback, deadline))
 
 @app.route('/webhook/song_note', methods=['POST'])
 def song_note_webhook():
-    data = request.get_json()
-    if not data:
-        return jsonify({'error': 'Invalid payload'}), 400
+    data = webhooks.parse_song_note(_json_body(), WRITE_BEHIND)
 
-    success = save_song_history_from_webhook(data)
-    if success:
-        return jsonify({'status': 'success', 'message': 'Song history saved.'})
+    if WRITE_BEHIND:
+        body, status = webhooks.song_note_queued(enqueue(data))
     else:
-        return jsonify({'status': 'error', 'message': 'Failed to save song history.'}), 500
-    
+        body, status = webhooks.song_note_saved(save_song_history_from_webhook(data))
+    return jsonify(body), status
+
+@app.route('/webhook/song_note/queue', methods=['GET'])
+def song_note_queue_webhook():
+    return jsonify(queue_status())
+
+@app.route('/webhook/song_note/users/<username>', methods=['GET'])
+def song_note_user_webhook(username):
+    return _conditional_json(lambda: get_store().get_user(username))
+
+@app.route('/webhook/song_note/users/<username>/songs', methods=['GET'])
+def song_note_user_songs_webhook(username):
+    offset, limit = webhooks.parse_songs_page(request.args)
+    return _conditional_json(lambda: get_store().songs_played(username, offset, limit))
+
+@app.route('/webhook/song_note/recent', methods=['GET'])
+def song_note_recent_webhook():
+    since, limit = webhooks.parse_recent(request.args)
+    return _conditional_json(lambda: get_store().recent_plays(since, limit))
+
+@app.route('/webhook/song_note/top', methods=['GET'])
+def song_note_top_webhook():
+    kind, limit = webhooks.parse_top(request.args)
+    return _conditional_json(lambda: webhooks.top_query(get_store(), kind, limit))
+
+@app.route('/webhook/song_note/events', methods=['GET'])
+def song_note_events_webhook():
+    return jsonify(get_event_log().read(*webhooks.parse_events(request.args)))
+
+@app.route('/webhook/tools', methods=['GET'])
+def tools_webhook():
+    # Per worker: which tools this process imported and what they cost
+    return jsonify(registry.report())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_webhook():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
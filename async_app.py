@@ -0,0 +1,328 @@
+"""
+asyncio serving mode: the webhooks of app.py on aiohttp.
+
+One event loop per worker holds many slow requests open at once. Lyrics are
+fetched with aiohttp (tools.async_lyrics); the blocking tools run on bounded
+thread pools so a burst of one kind of request can't starve the others:
+
+    ASYNC_DDGS_WORKERS      DuckDuckGo searches
+    ASYNC_SELENIUM_WORKERS  Instagram scrapes (each one drives a Chrome)
+    ASYNC_IO_WORKERS        song history store, event log, write-behind queue
+
+Run it with `python async_app.py` or, like run.sh, under gunicorn:
+    gunicorn --workers 4 --worker-class aiohttp.GunicornWebWorker async_app:app
+app.py keeps serving the same endpoints under plain WSGI.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import aclosing
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from logging_config import setup_logging
+
+# Setup logging
+setup_logging()
+
+# Load environment variables
+load_dotenv()
+
+# Import tools; search, lyrics and instagram are imported on first use through the registry
+from tools.simple_song_history import save_song_history_from_webhook
+from tools.song_history_queue import WRITE_BEHIND, enqueue, queue_status, start_flusher
+from tools.song_history_store import get_store
+from tools.song_events import get_event_log
+from tools.async_lyrics import AsyncLyricsClient
+from tools.lyrics_index import search_lyrics_live, search_lyrics_local
+from tools import metrics
+from tools.registry import registry
+import webhooks
+from webhooks import WebhookError
+
+ASYNC_DDGS_WORKERS = int(os.getenv("ASYNC_DDGS_WORKERS", 16))
+ASYNC_SELENIUM_WORKERS = int(os.getenv("ASYNC_SELENIUM_WORKERS", 2))
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", 8))
+
+DDGS_EXECUTOR = web.AppKey("ddgs_executor", ThreadPoolExecutor)
+SELENIUM_EXECUTOR = web.AppKey("selenium_executor", ThreadPoolExecutor)
+IO_EXECUTOR = web.AppKey("io_executor", ThreadPoolExecutor)
+LYRICS_CLIENT = web.AppKey("lyrics_client", dict)
+
+routes = web.RouteTableDef()
+
+
+async def _run(request, executor_key, func, *args):
+    return await asyncio.get_running_loop().run_in_executor(request.app[executor_key], func, *args)
+
+
+def _route_label(request):
+    # The route pattern, not the path, so /users/{username} stays one series
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else 'unmatched'
+
+
+@web.middleware
+async def request_metrics(request, handler):
+    route = _route_label(request)
+    started = time.perf_counter()
+    metrics.add_gauge('http_requests_in_flight', 1, route=route)
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        # Streamed responses are timed until their last byte was written
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method)
+        metrics.inc('http_requests_total', route=route, method=request.method, status=status)
+        metrics.add_gauge('http_requests_in_flight', -1, route=route)
+
+
+@web.middleware
+async def webhook_errors(request, handler):
+    try:
+        return await handler(request)
+    except WebhookError as e:
+        return web.json_response(e.body, status=e.status)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def _conditional_json(request, build):
+    """
+    Same contract as app._conditional_json: the ETag is derived from the
+    history's last_updated timestamp and the request URL, and matching
+    If-None-Match polls get a 304 without running build() on the IO pool.
+    """
+    last_updated = await _run(request, IO_EXECUTOR, lambda: get_store().last_updated())
+    etag = webhooks.history_etag(last_updated, f"{request.path}?{request.query_string}")
+    if webhooks.etag_matches(request.headers.get('If-None-Match'), etag):
+        response = web.Response(status=304)
+        response.etag = etag
+        return response
+
+    response = web.json_response(webhooks.history_body(await _run(request, IO_EXECUTOR, build)))
+    response.etag = etag
+    return response
+
+
+async def _stream_ndjson(request, items):
+    """Write every dict of the async iterable ``items`` as one NDJSON line."""
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    # aclosing: a client disconnect stops ``items`` right away instead of whenever it is collected
+    async with aclosing(items):
+        async for item in items:
+            await response.write((json.dumps(item) + '\n').encode())
+    await response.write_eof()
+    return response
+
+
+def _lyrics_client(request) -> AsyncLyricsClient:
+    holder = request.app[LYRICS_CLIENT]
+    if 'client' not in holder:
+        scraper = registry.tool('lyrics').get_shared_scraper()
+        holder['client'] = AsyncLyricsClient(scraper)
+    return holder['client']
+
+
+@routes.post('/webhook/search')
+async def search_webhook(request):
+    data = await _json_body(request)
+    params = webhooks.parse_search(data, request.headers)
+    logging.debug("Search request: %s", data, extra={"sample": "search_request"})
+    search_tool = registry.tool('search')
+    query, max_results, deadline = params['query'], params['max_results'], params['deadline']
+
+    if params['stream']:
+        async def results():
+            # The sync generator is stepped on the DDGS pool, one result at a time
+            pages = search_tool.iter_search(query, max_results, params['stop_after'], params['time_budget'], deadline)
+            try:
+                while True:
+                    result = await _run(request, DDGS_EXECUTOR, next, pages, None)
+                    if result is None:
+                        break
+                    yield result
+                trailer = webhooks.search_stream_trailer(deadline)
+                if trailer:
+                    yield trailer
+            except Exception as e:
+                logging.error(f"Streaming search failed: {e}")
+                yield {'error': str(e)}
+            finally:
+                # Runs the generator's cleanup (closing DDGS) when the client went away early
+                await _run(request, DDGS_EXECUTOR, pages.close)
+        return await _stream_ndjson(request, results())
+
+    if params['stop_after'] or params['time_budget'] or deadline:
+        results = await _run(request, DDGS_EXECUTOR, lambda: list(
+            search_tool.iter_search(query, max_results, params['stop_after'], params['time_budget'], deadline)))
+    else:
+        results = await _run(request, DDGS_EXECUTOR, search_tool.search, query, max_results)
+    return web.json_response(webhooks.search_body(results, deadline))
+
+
+@routes.post('/webhook/instagram')
+async def instagram_webhook(request):
+    options = webhooks.parse_instagram(await _json_body(request), request.headers)
+    instagram = registry.tool('instagram')
+
+    if options['async']:
+        try:
+            job = await _run(request, IO_EXECUTOR, instagram.submit_job, options['max_age'], options['callback_url'])
+        except ValueError as e:
+            raise WebhookError(str(e))
+        return web.json_response(job, status=202, headers={'Location': webhooks.job_location(job)})
+
+    data = await _run(request, SELENIUM_EXECUTOR, instagram.get_song_data_coalesced,
+                      options['max_age'], options['deadline'])
+    return web.json_response(data)
+
+
+@routes.get('/webhook/instagram/jobs/{job_id}')
+async def instagram_job_webhook(request):
+    job = await _run(request, IO_EXECUTOR, registry.tool('instagram').get_job, request.match_info['job_id'])
+    return web.json_response(webhooks.job_body(job))
+
+
+@routes.post('/webhook/get_lyrics')
+async def get_lyrics_webhook(request):
+    artists, song_name, deadline = webhooks.parse_get_lyrics(await _json_body(request), request.headers)
+    return web.json_response(await _lyrics_client(request).get_lyrics(artists, song_name, deadline))
+
+
+@routes.post('/webhook/get_lyrics/batch')
+async def get_lyrics_batch_webhook(request):
+    items, concurrency, deadline, stream = webhooks.parse_lyrics_batch(await _json_body(request), request.headers)
+    client = _lyrics_client(request)
+
+    if stream:
+        async def results():
+            async with aclosing(client.iter_lyrics_batch(items, concurrency, deadline)) as batch:
+                async for index, result in batch:
+                    yield webhooks.batch_line(index, result)
+        return await _stream_ndjson(request, results())
+
+    return web.json_response(await client.get_lyrics_batch(items, concurrency, deadline))
+
+
+@routes.post('/webhook/lyrics_search')
+async def lyrics_search_webhook(request):
+    query, max_results, live_fallback, deadline = webhooks.parse_lyrics_search(await _json_body(request),
+                                                                              request.headers)
+    # The index lookup runs on the IO pool; only a local miss occupies the DDGS pool
+    result = await _run(request, IO_EXECUTOR, search_lyrics_local, query, max_results, live_fallback)
+    if result is None:
+        result = await _run(request, DDGS_EXECUTOR, search_lyrics_live, query, max_results, deadline)
+    return web.json_response(result)
+
+
+@routes.post('/webhook/song_note')
+async def song_note_webhook(request):
+    data = webhooks.parse_song_note(await _json_body(request), WRITE_BEHIND)
+
+    if WRITE_BEHIND:
+        body, status = webhooks.song_note_queued(await _run(request, IO_EXECUTOR, enqueue, data))
+    else:
+        body, status = webhooks.song_note_saved(await _run(request, IO_EXECUTOR, save_song_history_from_webhook, data))
+    return web.json_response(body, status=status)
+
+
+@routes.get('/webhook/song_note/queue')
+async def song_note_queue_webhook(request):
+    return web.json_response(await _run(request, IO_EXECUTOR, queue_status))
+
+
+@routes.get('/webhook/song_note/users/{username}')
+async def song_note_user_webhook(request):
+    username = request.match_info['username']
+    return await _conditional_json(request, lambda: get_store().get_user(username))
+
+
+@routes.get('/webhook/song_note/users/{username}/songs')
+async def song_note_user_songs_webhook(request):
+    username = request.match_info['username']
+    offset, limit = webhooks.parse_songs_page(request.query)
+    return await _conditional_json(request, lambda: get_store().songs_played(username, offset, limit))
+
+
+@routes.get('/webhook/song_note/recent')
+async def song_note_recent_webhook(request):
+    since, limit = webhooks.parse_recent(request.query)
+    return await _conditional_json(request, lambda: get_store().recent_plays(since, limit))
+
+
+@routes.get('/webhook/song_note/top')
+async def song_note_top_webhook(request):
+    kind, limit = webhooks.parse_top(request.query)
+    return await _conditional_json(request, lambda: webhooks.top_query(get_store(), kind, limit))
+
+
+@routes.get('/webhook/song_note/events')
+async def song_note_events_webhook(request):
+    events = await _run(request, IO_EXECUTOR, get_event_log().read, *webhooks.parse_events(request.query))
+    return web.json_response(events)
+
+
+@routes.get('/webhook/tools')
+async def tools_webhook(request):
+    # Per worker: which tools this process imported and what they cost
+    return web.json_response(registry.report())
+
+
+@routes.get('/metrics')
+async def metrics_webhook(request):
+    body = await _run(request, IO_EXECUTOR, metrics.render)
+    return web.Response(body=body.encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def _start_executors(app):
+    app[DDGS_EXECUTOR] = ThreadPoolExecutor(max_workers=ASYNC_DDGS_WORKERS, thread_name_prefix="async-ddgs")
+    app[SELENIUM_EXECUTOR] = ThreadPoolExecutor(max_workers=ASYNC_SELENIUM_WORKERS, thread_name_prefix="async-selenium")
+    app[IO_EXECUTOR] = ThreadPoolExecutor(max_workers=ASYNC_IO_WORKERS, thread_name_prefix="async-io")
+
+
+async def _stop_executors(app):
+    client = app[LYRICS_CLIENT].pop('client', None)
+    if client is not None:
+        await client.close()
+    for key in (DDGS_EXECUTOR, SELENIUM_EXECUTOR, IO_EXECUTOR):
+        app[key].shutdown(wait=False, cancel_futures=True)
+
+
+def create_app():
+    # webhook_errors runs inside request_metrics, so refused requests are counted with their status
+    application = web.Application(middlewares=[request_metrics, webhook_errors])
+    application[LYRICS_CLIENT] = {}
+    application.add_routes(routes)
+    application.on_startup.append(_start_executors)
+    application.on_cleanup.append(_stop_executors)
+    return application
+
+
+app = create_app()
+
+if WRITE_BEHIND:
+    # Pick up payloads left in the queue by a previous run
+    start_flusher()
+
+# TOOLS_WARMUP=search,lyrics|all imports tools now, e.g. once in the master with gunicorn --preload
+registry.warm_up_from_env()
+
+if __name__ == '__main__':
+    web.run_app(app, host="0.0.0.0", port=5000)
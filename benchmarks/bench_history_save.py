@@ -0,0 +1,93 @@
+"""
+Time song history saves as the history grows.
+
+Builds histories of the given sizes (total songs across all users), then
+times saving a typical inbox payload into each backend. The JSON backend
+rewrites the whole songs_data.json per save, the SQLite backend only touches
+the rows of the users in the payload.
+
+Usage (from the project root):
+    python -m benchmarks.bench_history_save [--sizes 10000,100000] [--saves 5] [--users 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize, write_results
+from tools.song_history_store import JsonHistoryStore, SqliteHistoryStore, _write_json_atomic
+
+
+def make_history(entries, users):
+    """A songs_data.json document with ``entries`` songs spread over ``users`` users."""
+    per_user = max(1, entries // users)
+    data = {"last_updated": "2024-01-01T00:00:00", "users": {}}
+    for user in range(users):
+        songs = [f"Song {user}-{n} by Artist {n % 500}" for n in range(per_user)]
+        data["users"][f"bench_user_{user}"] = {
+            "songs-played": songs,
+            "current-played": songs[-1],
+            "note": "",
+            "notes": [f"note {user}-{n}" for n in range(per_user // 10)],
+            "song-stats": {song: {"first-seen": "2024-01-01T00:00:00", "last-seen": "2024-01-01T00:00:00", "plays": 1}
+                           for song in songs},
+        }
+    return data
+
+
+def inbox_payload(round_number, users=30):
+    """A scraped inbox: mostly known users, each with a new current song."""
+    return {
+        f"bench_user_{user}": [{"song": f"New song {round_number}-{user}", "artist": f"Artist {user}",
+                                "note": f"note {round_number}"}]
+        for user in range(users)
+    }
+
+
+def time_saves(store, saves):
+    durations = []
+    for round_number in range(saves):
+        started = time.perf_counter()
+        store.save_payload(inbox_payload(round_number))
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help="Comma-separated history sizes in songs")
+    parser.add_argument('--saves', type=int, default=5, help="Saves timed per size and backend")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--json', help="Write the results here instead of benchmarks/results/")
+    args = parser.parse_args()
+
+    # The stores log every processed user at INFO
+    logging.basicConfig(level=logging.WARNING)
+    results = {}
+    for size in (int(size) for size in args.sizes.split(',')):
+        history = make_history(size, args.users)
+        with tempfile.TemporaryDirectory(prefix='bench-history-') as directory:
+            json_path = os.path.join(directory, 'songs_data.json')
+            _write_json_atomic(json_path, history)
+            json_store = JsonHistoryStore(json_path)
+
+            sqlite_store = SqliteHistoryStore(os.path.join(directory, 'songs_data.db'))
+            sqlite_store.import_data(json.loads(json.dumps(history)))
+
+            for backend, store in (("json", json_store), ("sqlite", sqlite_store)):
+                summary = summarize(time_saves(store, args.saves))
+                summary["file_bytes"] = os.path.getsize(store.path)
+                results[f"{backend}-{size}"] = summary
+                print(f"{backend:6} {size:>8} songs  p50 {summary['p50_ms']:8.1f} ms  "
+                      f"max {summary['max_ms']:8.1f} ms  {summary['file_bytes'] / 1e6:6.1f} MB")
+
+    write_results("history_save", {"config": vars(args), "sizes": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
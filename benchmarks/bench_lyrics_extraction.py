@@ -0,0 +1,212 @@
+"""
+Microbenchmark of the lyrics extraction engines over saved Genius pages.
+
+Usage (from the project root):
+    python -m benchmarks.bench_lyrics_extraction [--iterations N] [--json out.json]
+    python -m benchmarks.bench_lyrics_extraction --record https://genius.com/...-lyrics
+
+Recorded pages are stored in benchmarks/fixtures/genius/. Without recordings a
+generated page of similar shape is used.
+
+Engines:
+    baseline  the original extractor: a full BeautifulSoup parse of the page
+    soup      BeautifulSoup limited to the lyrics containers (parser='soup')
+    lxml      lxml with the iterative walk (parser='lxml', the default)
+
+Memory is the growth of the peak resident set size while extracting, measured
+in a fresh subprocess per engine and page, so lxml's C allocations count too.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fixtures import GENIUS_FIXTURES_DIR, load_genius_fixtures
+from tools.get_lyrics import LyricsScraper
+
+ENGINES = ('baseline', 'soup', 'lxml')
+
+
+def extract_baseline(scraper: LyricsScraper, html: str) -> Optional[str]:
+    """The extractor as it was before the fast paths: parse the whole page, then try each selector."""
+    soup = BeautifulSoup(html, 'html.parser')
+    selectors = [
+        "div[data-lyrics-container='true']",
+        "div[class*='lyrics']",
+        "div[class*='Lyrics']"
+    ]
+    lyrics_containers = []
+    for selector in selectors:
+        lyrics_containers = soup.select(selector)
+        if lyrics_containers:
+            break
+
+    all_lyrics = [scraper._extract_lyrics_content(container) for container in lyrics_containers]
+    all_lyrics = [lyrics_content for lyrics_content in all_lyrics if lyrics_content]
+    if not all_lyrics:
+        return None
+    return scraper._clean_lyrics('\n'.join(all_lyrics)) or None
+
+
+def make_extractor(engine: str):
+    """Return (extract(html), close()) for an engine."""
+    scraper = LyricsScraper(parser='soup' if engine == 'baseline' else engine)
+    if engine == 'baseline':
+        return (lambda html: extract_baseline(scraper, html)), scraper.close
+    return scraper.extract_lyrics, scraper.close
+
+
+def measure(extract, html: str, iterations: int) -> dict:
+    """Return timing of extracting lyrics from ``html``."""
+    extract(html)  # warm-up
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        extract(html)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "mean_ms": sum(timings) / len(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0] * 1000,
+    }
+
+
+def _proc_status_kib(field: str) -> Optional[int]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS of this process (Linux), so imports and setup don't mask the extraction."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _max_rss_kib() -> int:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def rss_probe(engine: str, path: str):
+    """Runs in a fresh interpreter: print the peak RSS of one extraction and its growth over the RSS before."""
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+    extract, close = make_extractor(engine)
+    try:
+        if _reset_peak_rss():
+            before = _proc_status_kib('VmRSS')
+            extract(html)
+            peak = _proc_status_kib('VmHWM')
+        else:
+            # Without a reset the peak may still be the one reached while importing
+            before = _max_rss_kib()
+            extract(html)
+            peak = _max_rss_kib()
+    finally:
+        close()
+    print(json.dumps({"peak_rss_kib": peak, "rss_growth_kib": peak - before}))
+
+
+def measure_rss(engine: str, html: str) -> dict:
+    """Peak RSS of one extraction with ``engine``, in a subprocess that has done nothing else."""
+    # The page goes through a file: building it in the subprocess would already raise the peak
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.html') as page:
+        page.write(html)
+        page.flush()
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_lyrics_extraction', '--rss-probe', engine, page.name],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def record(url: str):
+    """Save a live Genius page as a fixture."""
+    scraper = LyricsScraper()
+    try:
+        response = scraper.session.get(url, timeout=scraper.timeout)
+        response.raise_for_status()
+    finally:
+        scraper.close()
+    os.makedirs(GENIUS_FIXTURES_DIR, exist_ok=True)
+    name = re.sub(r'[^\w-]', '_', url.rstrip('/').rsplit('/', 1)[-1])
+    path = os.path.join(GENIUS_FIXTURES_DIR, f"{name}.html")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(response.text)
+    print(f"Saved {url} to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', help="Write the results to this file")
+    parser.add_argument('--record', metavar='URL', help="Save a Genius page as a fixture and exit")
+    parser.add_argument('--rss-probe', nargs=2, metavar=('ENGINE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return
+    if args.rss_probe:
+        rss_probe(*args.rss_probe)
+        return
+
+    extractors = {engine: make_extractor(engine) for engine in ENGINES}
+    results = {}
+    try:
+        for name, html in load_genius_fixtures().items():
+            outputs = {engine: extract(html) for engine, (extract, _) in extractors.items()}
+            results[name] = {
+                "size_kib": len(html) / 1024,
+                "identical_output": len(set(outputs.values())) == 1,
+                **{engine: {**measure(extract, html, args.iterations), **measure_rss(engine, html)}
+                   for engine, (extract, _) in extractors.items()},
+            }
+    finally:
+        for _, close in extractors.values():
+            close()
+
+    for name, result in results.items():
+        baseline = result['baseline']
+        print(f"{name} ({result['size_kib']:.0f} KiB, identical output: {result['identical_output']})")
+        for engine in ENGINES:
+            r = result[engine]
+            print(f"  {engine:8} mean {r['mean_ms']:8.2f} ms  min {r['min_ms']:8.2f} ms  "
+                  f"p95 {r['p95_ms']:8.2f} ms  peak RSS +{r['rss_growth_kib']:7d} KiB")
+        for engine in ENGINES[1:]:
+            r = result[engine]
+            print(f"  {engine} vs baseline: speed-up x{baseline['mean_ms'] / r['mean_ms']:.1f}, "
+                  f"peak RSS growth {r['rss_growth_kib']} KiB vs {baseline['rss_growth_kib']} KiB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Load test of the webhooks, served by gunicorn against local fakes.
+
+Starts benchmarks.fake_servers for Genius and the Instagram inbox, puts the
+stub ddgs package from benchmarks/stubs first on PYTHONPATH, runs `app:app`
+under gunicorn with DATA_DIR, METRICS_DIR and LOG_FILE in a temporary
+directory and fires requests at every webhook.
+Reports throughput and p50/p95/p99 latency per webhook.
+
+Usage (from the project root):
+    python -m benchmarks.bench_webhooks [--requests 200] [--concurrency 8] [--workers 4]
+    python -m benchmarks.bench_webhooks --scenarios get_lyrics,song_note --with-caches
+    python -m benchmarks.bench_webhooks --scenarios instagram --requests 5   # needs Chrome
+
+Caches are disabled by default so every request exercises the full pipeline.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SESSIONID", "bench")
+
+from benchmarks.common import BENCHMARKS_DIR, ROOT_DIR, summarize, write_results
+from benchmarks.fake_servers import FakeUpstream
+
+STUBS_DIR = os.path.join(BENCHMARKS_DIR, 'stubs')
+
+
+def _song_note_payload(i):
+    return {
+        f"bench_user_{user}": [{"song": f"Song {i}-{user}", "artist": f"Artist {user % 40}", "note": f"note {i}"}]
+        for user in range(20)
+    }
+
+
+# name -> (method, path, body factory)
+SCENARIOS = {
+    "search": ("POST", "/webhook/search", lambda i: {"query": f"bench query {i}", "max_results": 10}),
+    "search_stream": ("POST", "/webhook/search",
+                      lambda i: {"query": f"bench stream {i}", "max_results": 20, "stream": True}),
+    "get_lyrics": ("POST", "/webhook/get_lyrics", lambda i: {"artists": f"Artist {i % 40}", "song_name": f"Song {i}"}),
+    "get_lyrics_batch": ("POST", "/webhook/get_lyrics/batch",
+                         lambda i: {"items": [{"artists": f"Artist {n}", "song_name": f"Song {i}-{n}"} for n in range(10)]}),
+    # Words of the fake Genius pages, so after the get_lyrics scenarios these are local index hits
+    "lyrics_search": ("POST", "/webhook/lyrics_search",
+                      lambda i: {"query": ["love gold light", "rain dream gold", "fire alone night"][i % 3]}),
+    "song_note": ("POST", "/webhook/song_note", _song_note_payload),
+    "song_note_recent": ("GET", "/webhook/song_note/recent?limit=50", None),
+    "song_note_top": ("GET", "/webhook/song_note/top?kind=artists", None),
+    "instagram": ("POST", "/webhook/instagram", lambda i: {}),
+}
+DEFAULT_SCENARIOS = [name for name in SCENARIOS if name != "instagram"]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _tail(path, lines=20):
+    try:
+        with open(path, 'r', errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+    except OSError:
+        return ''
+
+
+def app_env(data_dir, upstream_url, ddgs_latency, with_caches=False):
+    """Environment of the app under test: fakes for every upstream, and everything it writes inside ``data_dir``."""
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([STUBS_DIR, ROOT_DIR, os.environ.get('PYTHONPATH', '')]),
+        DATA_DIR=data_dir,
+        METRICS_DIR=os.path.join(data_dir, 'metrics'),
+        LOG_FILE=os.path.join(data_dir, 'app.log'),
+        GENIUS_BASE_URL=upstream_url,
+        IG_BASE_URL=upstream_url,
+        SESSIONID="bench",
+        BENCH_DDGS_LATENCY=str(ddgs_latency),
+        # Measure the service, not the politeness delay towards the real Genius
+        GENIUS_RATE_PER_SEC="0",
+        LYRICS_PREFETCH="0",
+    )
+    if not with_caches:
+        env.update(LYRICS_CACHE_ENABLED="0", SEARCH_CACHE_TTL="0", IG_SNAPSHOT_MAX_AGE="0")
+    return env
+
+
+def start_app(port, workers, env, log_path):
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+             '--timeout', '300', 'app:app'],
+            cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {process.returncode}:\n{_tail(log_path)}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/webhook/song_note/recent", timeout=2)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    process.wait(timeout=60)
+    raise RuntimeError(f"gunicorn did not start within 60s:\n{_tail(log_path)}")
+
+
+def run_scenario(base_url, name, total, concurrency):
+    method, path, body = SCENARIOS[name]
+    local = threading.local()
+
+    def one(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, json=body(i) if body else None, timeout=300)
+            response.content  # read streamed bodies to the end
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+    return summarize([duration for duration, _ in outcomes], wall, sum(1 for _, ok in outcomes if not ok))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument('--upstream-latency', type=float, default=0.15, help="Seconds per fake Genius/Instagram response")
+    parser.add_argument('--ddgs-latency', type=float, default=0.2, help="Seconds per stub DDGS call")
+    parser.add_argument('--with-caches', action='store_true', help="Keep the search and lyrics caches enabled")
+    parser.add_argument('--json', help="Write the results here instead of benchmarks/results/")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    upstream = FakeUpstream(latency=args.upstream_latency).start()
+    results = {}
+    # Everything the app writes (history, queues, caches, metrics, logs) goes away with the directory
+    with tempfile.TemporaryDirectory(prefix='bench-webhooks-') as data_dir:
+        port = _free_port()
+        env = app_env(data_dir, upstream.base_url, args.ddgs_latency, args.with_caches)
+
+        log_path = os.path.join(data_dir, 'gunicorn.log')
+        try:
+            app = start_app(port, args.workers, env, log_path)
+        except Exception:
+            upstream.shutdown()
+            raise
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for name in scenarios:
+                summary = run_scenario(base_url, name, args.requests, args.concurrency)
+                results[name] = summary
+                print(f"{name:18} {summary['throughput_rps']:8.1f} req/s  p50 {summary['p50_ms']:8.1f} ms  "
+                      f"p95 {summary['p95_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms  errors {summary['errors']}")
+        finally:
+            app.send_signal(signal.SIGTERM)
+            app.wait(timeout=60)
+            upstream.shutdown()
+            if any(summary['errors'] for summary in results.values()):
+                print(f"Last lines of the app log:\n{_tail(log_path)}")
+
+    write_results("webhooks", {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "upstream_latency": args.upstream_latency,
+            "ddgs_latency": args.ddgs_latency,
+            "with_caches": args.with_caches,
+        },
+        "scenarios": results,
+        "upstream_requests": upstream.requests,
+    }, args.json)
+
+
+if __name__ == "__main__":
+    main()
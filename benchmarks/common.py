@@ -0,0 +1,70 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, 'results')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(durations, wall_seconds=None, errors=0):
+    """Latency summary in milliseconds, plus throughput when the wall-clock time is known."""
+    values = sorted(durations)
+    summary = {
+        "requests": len(values),
+        "errors": errors,
+        "mean_ms": sum(values) / len(values) * 1000 if values else None,
+        "p50_ms": _ms(percentile(values, 0.50)),
+        "p95_ms": _ms(percentile(values, 0.95)),
+        "p99_ms": _ms(percentile(values, 0.99)),
+        "max_ms": _ms(values[-1] if values else None),
+    }
+    if wall_seconds:
+        summary["throughput_rps"] = len(values) / wall_seconds
+    return summary
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(name, results, path=None):
+    """
+    Write benchmark results with the commit and machine they were measured on.
+    Defaults to benchmarks/results/<name>-<timestamp>.json, so runs can be compared over time.
+    """
+    document = {
+        "benchmark": name,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"Results written to {path}")
+    return path
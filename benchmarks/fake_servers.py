@@ -0,0 +1,102 @@
+"""
+Local stand-in for genius.com and the Instagram inbox.
+
+Serves recorded (or generated) Genius pages for every "/<slug>-lyrics" path
+and the inbox markup at "/direct/inbox/", so the app can be pointed at it
+with GENIUS_BASE_URL and IG_BASE_URL.
+
+Usage (from the project root):
+    python -m benchmarks.fake_servers [--port 8765] [--latency 0.15]
+"""
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import load_genius_fixtures, make_inbox_page
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.15, inbox_users=30):
+        """
+        Args:
+            port: Port to listen on, 0 picks a free one
+            latency: Seconds added to every response, standing in for the network
+            inbox_users: Number of notes on the inbox page
+        """
+        super().__init__(('127.0.0.1', port), FakeUpstreamHandler)
+        self.latency = latency
+        self.genius_pages = list(load_genius_fixtures().values())
+        self._next_page = itertools.cycle(range(len(self.genius_pages)))
+        self._next_page_lock = threading.Lock()
+        self.inbox_page = make_inbox_page(inbox_users)
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def next_genius_page(self):
+        with self._next_page_lock:
+            self.requests += 1
+            return self.genius_pages[next(self._next_page)]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-upstream", daemon=True).start()
+        return self
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        path = self.path.split('?', 1)[0]
+        if path.endswith('-lyrics'):
+            # Only the first candidate slug of a song exists, so the variants are real misses
+            if '%' in path or 'missing' in path:
+                self._send(404, '<html><body>Oops! Page not found</body></html>')
+            else:
+                self._send(200, self.server.next_genius_page())
+        elif path.startswith('/direct/inbox'):
+            self._send(200, self.server.inbox_page)
+        elif path == '/':
+            self._send(200, '<html><head><title>Instagram</title></head><body></body></html>')
+        else:
+            self._send(404, '<html><body>Not found</body></html>')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.15)
+    parser.add_argument('--inbox-users', type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SESSIONID", "bench")
+    server = FakeUpstream(args.port, args.latency, args.inbox_users)
+    print(f"Serving fake Genius and Instagram at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
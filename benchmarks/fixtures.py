@@ -0,0 +1,93 @@
+import glob
+import os
+import random
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+GENIUS_FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, 'fixtures', 'genius')
+
+WORDS = ("love night baby heart fire dance away light dream tonight feel never "
+         "forever alone stay home road rain sky gold run fall rise burn cold").split()
+
+
+def make_genius_page(verses: int = 6, lines_per_verse: int = 8, filler_nodes: int = 4000, seed: int = 0) -> str:
+    """
+    Build a page shaped like a Genius lyrics page: a large amount of unrelated
+    markup (navigation, scripts, recommendations) around a few
+    data-lyrics-container divs holding <br>-separated lines with nested links.
+    """
+    rng = random.Random(seed)
+
+    def line():
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))).capitalize()
+
+    filler = ''.join(
+        f'<div class="SongPage__Section-sc-{i}"><a href="/artists/{i}"><span class="Label-{i % 7}">{line()}</span></a></div>'
+        for i in range(filler_nodes)
+    )
+    containers = []
+    for verse in range(verses):
+        body = []
+        for index in range(lines_per_verse):
+            if index % 3 == 0:
+                body.append(f'<a href="/{verse}-{index}" class="ReferentFragment"><span>{line()}</span></a><br>')
+            else:
+                body.append(f'{line()}<br>')
+        containers.append(
+            f'<div data-lyrics-container="true" class="Lyrics__Container-sc-1ynbvzw-1">[Verse {verse + 1}]<br>{"".join(body)}</div>'
+        )
+    scripts = ''.join(f'<script>window.__PRELOADED_STATE__{i} = JSON.parse("{"x" * 2000}");</script>' for i in range(20))
+    return (
+        '<!DOCTYPE html><html><head><title>Artist - Song Lyrics | Genius Lyrics</title>'
+        f'{scripts}</head><body><header>{filler[:len(filler) // 2]}</header>'
+        f'<main><div class="Lyrics__Root">{"".join(containers)}</div></main>'
+        f'<footer>{filler[len(filler) // 2:]}</footer></body></html>'
+    )
+
+
+def load_genius_fixtures() -> dict:
+    """
+    Return {name: html} for every recorded page in fixtures/genius/*.html.
+    Falls back to a generated page when no recordings have been saved.
+    """
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(GENIUS_FIXTURES_DIR, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            fixtures[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    if not fixtures:
+        fixtures['synthetic'] = make_genius_page()
+    return fixtures
+
+
+def make_inbox_page(users: int = 30, with_popup: bool = True, seed: int = 0) -> str:
+    """
+    Build a page reproducing the Instagram inbox markup read by
+    tools.ig_inbox_song_automate: one li._acaz per note, with the profile
+    picture, the song and artist elements and the note span. A third of the
+    users have a text note only, and the "Not Now" popup can be included.
+    """
+    # Imported here so the Genius fixtures don't need the Instagram settings
+    from tools.ig_inbox_song_automate import ARTIST_SPAN_CLASS, NOTE_ITEM_CLASS, NOTE_SPAN_CSS, SONG_DIV_CLASS
+
+    rng = random.Random(seed)
+    note_span_class = ' '.join(NOTE_SPAN_CSS.split('.')[1:])
+    items = []
+    for index in range(users):
+        user = f"bench_user_{index}"
+        note = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+        song = ''
+        if index % 3:
+            title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title()
+            artist = f"Bench Artist {rng.randint(1, 40)}"
+            song = (f'<div class="{SONG_DIV_CLASS}">{title}</div>'
+                    f'<span class="{ARTIST_SPAN_CLASS}">{artist}</span>')
+        items.append(
+            f'<li class="x1i10hfl {NOTE_ITEM_CLASS}"><img alt="{user}\'s profile picture" src="data:,">'
+            f'{song}<span class="{note_span_class}">{note}</span></li>'
+        )
+    popup = ''
+    if with_popup:
+        popup = '<div id="popup"><button onclick="document.getElementById(\'popup\').remove()">Not Now</button></div>'
+    return (
+        '<!DOCTYPE html><html><head><title>Inbox • Direct</title></head><body>'
+        f'{popup}<ul class="notes">{"".join(items)}</ul></body></html>'
+    )
@@ -0,0 +1,43 @@
+"""
+Offline stand-in for the ddgs package, put first on PYTHONPATH by the
+benchmarks. DDGS().text() returns generated results after a configurable
+delay instead of querying DuckDuckGo.
+
+    BENCH_DDGS_LATENCY        seconds per text() call (default 0.2)
+    BENCH_DDGS_TOTAL_RESULTS  results available per query (default 50)
+"""
+import hashlib
+import os
+import time
+
+from ddgs.exceptions import DDGSException
+
+LATENCY = float(os.getenv("BENCH_DDGS_LATENCY", 0.2))
+TOTAL_RESULTS = int(os.getenv("BENCH_DDGS_TOTAL_RESULTS", 50))
+
+
+class DDGS:
+    def __init__(self, proxy=None, timeout=5, verify=True):
+        self.timeout = timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def text(self, query, region="us-en", safesearch="moderate", timelimit=None,
+             max_results=10, page=1, backend="auto"):
+        time.sleep(LATENCY)
+        slug = hashlib.sha1(str(query).encode()).hexdigest()[:8]
+        start = (page - 1) * max_results
+        if start >= TOTAL_RESULTS:
+            raise DDGSException("No results found.")
+        return [
+            {
+                "title": f"Result {index} for {query}",
+                "href": f"https://example.com/{slug}/{index}",
+                "body": f"Snippet {index} of a generated result for {query}.",
+            }
+            for index in range(start, min(TOTAL_RESULTS, start + max_results))
+        ]
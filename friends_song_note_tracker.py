@@ -3,49 +3,168 @@ import time
 import sys
 import os
 import gc
+import json
+import random
+import signal
+import hashlib
+import argparse
+import threading
 
 # Add project root to the Python path to ensure modules are found
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
 from logging_config import setup_logging
-from tools.ig_inbox_song_automate import get_song_data
+from tools.deadline import split_partial
+from tools.ig_sessions import scrape_sessions
 from tools.simple_song_history import save_song_history_from_webhook
+from tools.song_history_store import DATA_DIR
 
 # Configure logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+STATE_FILE = os.path.join(DATA_DIR, 'tracker_state.json')
+PID_FILE = os.path.join(DATA_DIR, 'tracker.pid')
+
+# Polling interval bounds in seconds; the interval halves after a change and grows 1.5x while idle
+MIN_INTERVAL = float(os.getenv("TRACKER_MIN_INTERVAL", 15 * 60))
+MAX_INTERVAL = float(os.getenv("TRACKER_MAX_INTERVAL", 6 * 60 * 60))
+INITIAL_INTERVAL = float(os.getenv("TRACKER_INITIAL_INTERVAL", 3 * 60 * 60))
+SPEEDUP_FACTOR = float(os.getenv("TRACKER_SPEEDUP_FACTOR", 0.5))
+SLOWDOWN_FACTOR = float(os.getenv("TRACKER_SLOWDOWN_FACTOR", 1.5))
+# Random spread applied to every sleep, as a fraction of the interval
+JITTER = float(os.getenv("TRACKER_JITTER", 0.1))
+
+# Set by SIGUSR1 to start the next run immediately
+run_now = threading.Event()
+
+def snapshot_hash(song_data):
+    """Stable hash of an inbox snapshot, independent of key order."""
+    return hashlib.sha256(json.dumps(song_data, sort_keys=True).encode()).hexdigest()
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"last_hash": None, "interval": INITIAL_INTERVAL}
+
+def save_state(state):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+def next_interval(interval, changed):
+    """Poll faster after a change and back off while nothing changes, within the configured bounds."""
+    if changed:
+        interval *= SPEEDUP_FACTOR
+    elif changed is False:
+        interval *= SLOWDOWN_FACTOR
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+def with_jitter(interval):
+    return max(0.0, interval * (1 + random.uniform(-JITTER, JITTER)))
+
+def run_once(state):
+    """
+    Scrape the inbox once and save it if it differs from the previous snapshot.
+
+    A partial scrape (some accounts failed or timed out) is saved as a plain
+    update: it isn't a snapshot, so it neither marks the missing users as gone
+    nor becomes the hash the next run is compared with. A complete inbox
+    without notes is an empty snapshot: everyone took their note down.
+
+    Returns:
+        bool: True if the snapshot changed, False if it didn't, None if the scrape
+        failed or was partial.
+    """
+    logger.info("Starting song retrieval process...")
+    # Runs are usually minutes to hours apart, so a warm browser would only hold memory
+    song_data, partial = split_partial(scrape_sessions(use_pool=False))
+    if "error" in song_data:
+        logger.error(f"An error occurred during song retrieval: {song_data['error']}")
+        return None
+
+    if partial:
+        if song_data and "message" not in song_data:
+            logger.warning("Some Instagram sessions failed, saving the notes of the others as a partial update.")
+            if save_song_history_from_webhook({"users": song_data, "snapshot": False}):
+                logger.info("Partial song data saved, the next run compares against the last full snapshot.")
+            else:
+                logger.error("Failed to save song history.")
+        else:
+            logger.info("No song data from a partial scrape, nothing to save.")
+        return None
+
+    if "message" in song_data:
+        logger.info(f"{song_data['message']} Saving an empty snapshot.")
+        song_data = {}
+
+    digest = snapshot_hash(song_data)
+    if digest == state.get("last_hash"):
+        logger.info("Inbox unchanged since the last run, skipping save.")
+        return False
+
+    logger.info("Song data retrieved successfully. Saving to history...")
+    # A complete inbox is a snapshot: users missing from it have taken their note down
+    if save_song_history_from_webhook({"users": song_data, "snapshot": True}):
+        logger.info("Song history saved successfully.")
+        state["last_hash"] = digest
+        return True
+    logger.error("Failed to save song history.")
+    return None
+
+def _handle_trigger(signum, frame):
+    run_now.set()
+
 def main():
     """
     Main function to run the song retrieval and saving process in a loop.
+    Send SIGUSR1 (or run with --trigger) to start the next run immediately.
     """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(PID_FILE, 'w') as f:
+        f.write(str(os.getpid()))
+    signal.signal(signal.SIGUSR1, _handle_trigger)
+
+    state = load_state()
     while True:
+        changed = None
         try:
-            logger.info("Starting song retrieval process...")
-            song_data = get_song_data()
-
-            if song_data and "error" not in song_data and "message" not in song_data:
-                logger.info("Song data retrieved successfully. Saving to history...")
-                success = save_song_history_from_webhook(song_data)
-                if success:
-                    logger.info("Song history saved successfully.")
-                else:
-                    logger.error("Failed to save song history.")
-            elif "error" in song_data:
-                logger.error(f"An error occurred during song retrieval: {song_data['error']}")
-            else:
-                logger.info("No new song data found or message received.")
-
+            changed = run_once(state)
         except Exception as e:
             logger.error(f"An unexpected error occurred in the main loop: {e}", exc_info=True)
 
-        # Sleep for 3 hours
-        sleep_duration_hours = 3
-        sleep_duration_seconds = sleep_duration_hours * 60 * 60
-        logger.info(f"Waiting for {sleep_duration_hours} hours before the next run...")
+        state["interval"] = next_interval(state.get("interval", INITIAL_INTERVAL), changed)
+        state["last_run_at"] = time.time()
+        save_state(state)
+
+        sleep_duration_seconds = with_jitter(state["interval"])
+        logger.info(f"Waiting for {sleep_duration_seconds / 60:.1f} minutes before the next run...")
         gc.collect()
-        time.sleep(sleep_duration_seconds)
+        if run_now.wait(sleep_duration_seconds):
+            logger.info("Run triggered on demand.")
+        run_now.clear()
+
+def trigger():
+    """Ask a running tracker to start its next run now."""
+    try:
+        with open(PID_FILE, 'r') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, signal.SIGUSR1)
+        print(f"Triggered tracker (pid {pid}).")
+    except (OSError, ValueError) as e:
+        print(f"Could not trigger the tracker: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Track friends' Instagram song notes.")
+    parser.add_argument('--trigger', action='store_true', help="Make the running tracker poll immediately")
+    args = parser.parse_args()
+    if args.trigger:
+        trigger()
+    else:
+        main()
@@ -0,0 +1,18 @@
+# Loaded automatically by gunicorn when started from the project root (see run.sh).
+# Command line flags such as --workers and --bind still take precedence.
+
+
+def worker_exit(server, worker):
+    """
+    Drop queued Instagram jobs, quit the warm browsers held by the exiting
+    worker and its session scraping processes so no Chrome processes are left
+    behind, and write out song history still waiting in the write-behind queue.
+    """
+    from tools.webdriver_pool import shutdown_all_pools
+    from tools.ig_sessions import shutdown_session_pool
+    from tools.instagram_jobs import shutdown_job_executor
+    from tools.song_history_queue import flush_on_shutdown
+    shutdown_job_executor()
+    shutdown_all_pools()
+    shutdown_session_pool()
+    flush_on_shutdown()
@@ -1,17 +1,218 @@
-
+import atexit
+import copy
+import fcntl
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+
+LOG_FILE = os.getenv("LOG_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.log'))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" keeps the classic one-line format, "json" writes one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Records logged with extra={"sample": key} pass at most LOG_SAMPLE_BURST times per key and window
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", 20))
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", 60))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+_traceback_formatter = logging.Formatter()
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including the fields passed through ``extra``."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limit per-item lines.
+
+    Records carrying a ``sample`` attribute (``logger.debug(..., extra={"sample": "history_item"})``)
+    are let through at most ``burst`` times per key in every ``window`` seconds.
+    The first record of the next window reports how many were dropped.
+    """
+
+    def __init__(self, burst=LOG_SAMPLE_BURST, window=LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or self.burst <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            started, passed, dropped = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                if dropped:
+                    record.msg = f"{record.msg} ({dropped} similar '{key}' lines suppressed)"
+                started, passed, dropped = now, 0, 0
+            if passed >= self.burst:
+                self._windows[key] = (started, passed, dropped + 1)
+                return False
+            self._windows[key] = (started, passed + 1, dropped)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Unlike the base class, keep the traceback apart from the message so JSON output can put it in its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class LockedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-based rotation that several processes can share.
+
+    Every write holds an flock on "<log>.lock", so only one process rotates,
+    and a process whose file was rotated away by another reopens the new one
+    instead of writing into the renamed backup.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self._lock_file = open(f"{self.baseFilename}.lock", 'a')
+
+    def reopen_after_fork(self):
+        # flock is held per open file, which a forked child shares with its parent
+        self._lock_file = open(f"{self.baseFilename}.lock", 'a')
+        if self.stream is not None:
+            self.stream = self._open()
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            current = None
+        opened = os.fstat(self.stream.fileno())
+        if current is None or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            self.stream.close()
+            self.stream = None
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        try:
+            return os.path.getsize(self.baseFilename) >= self.maxBytes
+        except OSError:
+            return False
+
+    def emit(self, record):
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                super().emit(record)
+                if self.stream is not None:
+                    self.stream.flush()
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+def _start_listener(handlers):
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    # The writer thread doesn't survive a fork (gunicorn --preload): give the child its own
+    if _listener is not None:
+        handlers = _listener.handlers
+        for handler in handlers:
+            if isinstance(handler, LockedRotatingFileHandler):
+                handler.reopen_after_fork()
+        _queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _start_listener(handlers)
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
 
 def setup_logging():
     """
     Configures logging for the entire application to output to a file.
+
+    Callers only put records on a bounded in-memory queue; a single writer
+    thread per process formats them and writes app.log (rotated at
+    LOG_MAX_BYTES, safely across gunicorn workers) and the console.
+    Calling it again is a no-op.
     """
-    log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.log')
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()  # Keep logging to console as well
-        ]
-    )
+    global _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return
+
+        formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+        file_handler = LockedRotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        stream_handler = logging.StreamHandler()  # Keep logging to console as well
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(_queue_handler)
+        _start_listener((file_handler, stream_handler))
+
+        os.register_at_fork(after_in_child=_restart_listener_after_fork)
+        atexit.register(_stop_listener)
@@ -0,0 +1,3 @@
+#!/bin/bash
+source venv/bin/activate
+gunicorn --workers 4 --worker-class aiohttp.GunicornWebWorker --bind 0.0.0.0:5000 async_app:app
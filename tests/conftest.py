@@ -0,0 +1,146 @@
+"""
+Shared test setup.
+
+The tools read their data, metrics and log locations from the environment at
+import time, so they are pointed at a throwaway directory before anything
+from the project is imported. Tests that need a store, cache or queue of
+their own build it on pytest's tmp_path.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="song-notes-tests-")
+os.environ.setdefault("DATA_DIR", os.path.join(_scratch, "data"))
+os.environ.setdefault("METRICS_DIR", os.path.join(_scratch, "metrics"))
+os.environ.setdefault("LOG_FILE", os.path.join(_scratch, "app.log"))
+os.environ.setdefault("SESSIONID", "test-session")
+# Tests never reach Genius; keep the shared scraper from spacing requests out
+os.environ.setdefault("GENIUS_RATE_PER_SEC", "0")
+# Saving new songs must not start background lookups against Genius
+os.environ.setdefault("LYRICS_PREFETCH", "0")
+
+LYRICS_PAGE = ('<html><body><div data-lyrics-container="true">'
+               "Oh, won't you stay with me?<br/>'Cause you're all I need</div></body></html>")
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeSession:
+    """
+    Stands in for the scraper's requests.Session. ``pages`` maps URLs to
+    (status, html) or to an exception to raise, ``delays`` to seconds to
+    sleep first; any other URL is a 404.
+    """
+
+    def __init__(self, pages=None, delays=None):
+        self.pages = dict(pages or {})
+        self.delays = dict(delays or {})
+        self.requested = []
+        self.headers = {}
+
+    def get(self, url, timeout=None):
+        self.requested.append(url)
+        time.sleep(self.delays.get(url, 0))
+        page = self.pages.get(url, (404, "Not found"))
+        if isinstance(page, Exception):
+            raise page
+        return FakeResponse(*page)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def lyrics_cache(tmp_path):
+    from tools.lyrics_cache import LyricsCache
+    return LyricsCache(str(tmp_path / "lyrics_cache.db"))
+
+
+@pytest.fixture
+def make_scraper(lyrics_cache):
+    """Build LyricsScrapers on a FakeSession with a private cache and no rate limiting."""
+    from tools.get_lyrics import LyricsScraper
+    from tools.rate_limit import HostRateLimiter
+    scrapers = []
+
+    def make(pages=None, parallel=False, delays=None, rate_limiter=None, **kwargs):
+        kwargs.setdefault("cache", lyrics_cache)
+        scraper = LyricsScraper(session=FakeSession(pages, delays), rate_limiter=rate_limiter or HostRateLimiter(0),
+                                parallel=parallel, **kwargs)
+        scrapers.append(scraper)
+        return scraper
+
+    yield make
+    for scraper in scrapers:
+        scraper.close()
+
+
+@pytest.fixture
+def client():
+    """A Flask test client for the sync webhooks."""
+    from app import app
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+class FakeDDGS:
+    """Stands in for ddgs.DDGS: numbered results, ``max_results`` per page, up to ``total``."""
+    total = 25
+    delay = 0
+    calls = []
+    timeouts = []
+
+    def __init__(self, timeout=None):
+        FakeDDGS.timeouts.append(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def text(self, query, max_results=10, page=1):
+        FakeDDGS.calls.append((query, max_results, page))
+        time.sleep(self.delay)
+        start = (page - 1) * max_results
+        results = [{"title": f"r{i}", "href": f"https://example.com/{i}"}
+                   for i in range(start, min(start + max_results, self.total))]
+        if not results:
+            from ddgs.exceptions import DDGSException
+            raise DDGSException("No results found.")
+        return results
+
+
+@pytest.fixture
+def fake_ddgs(monkeypatch):
+    """Replace DDGS with FakeDDGS and start from an empty search cache."""
+    import tools.duckduckgo_search as ddg
+    FakeDDGS.calls = []
+    FakeDDGS.timeouts = []
+    FakeDDGS.delay = 0
+    monkeypatch.setattr(ddg, "DDGS", FakeDDGS)
+    monkeypatch.setattr(ddg, "_cache", ddg.SearchCache())
+    monkeypatch.setattr(ddg, "_inflight", ddg.SingleFlight())
+    monkeypatch.setattr(ddg, "STREAM_PAGE_SIZE", 10)
+    return FakeDDGS
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    """Each song-history backend, on a fresh file."""
+    from tools.song_history_store import JsonHistoryStore, SqliteHistoryStore
+    if request.param == "json":
+        return JsonHistoryStore(str(tmp_path / "songs_data.json"))
+    return SqliteHistoryStore(str(tmp_path / "songs_data.db"))
@@ -0,0 +1,96 @@
+"""The aiohttp app must answer like the Flask one; both go through webhooks.py."""
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_app
+from tools import song_history_store
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+def async_call(method, path, json=None, headers=None):
+    """One request against a fresh async_app instance; returns (status, headers, parsed JSON or None)."""
+    async def call():
+        async with TestClient(TestServer(async_app.create_app())) as client:
+            response = await client.request(method, path, json=json, headers=headers)
+            body = await response.json() if response.content_type == "application/json" else None
+            return response.status, response.headers, body
+    return asyncio.run(call())
+
+
+def flask_call(client, method, path, json=None, headers=None):
+    response = client.open(path, method=method, json=json, headers=headers)
+    return response.status_code, response.headers, response.get_json(silent=True)
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    store = song_history_store.JsonHistoryStore(str(tmp_path / "songs_data.json"))
+    monkeypatch.setattr(song_history_store, "_store", store)
+    store.save_payloads([({"alice": [note("One", "A"), note("Two", "B")]}, "2026-01-01T10:00:00")])
+    return store
+
+
+@pytest.mark.parametrize("method, path, payload", [
+    ("POST", "/webhook/search", {"max_results": 3}),
+    ("POST", "/webhook/search", {"query": "q", "max_results": "ten"}),
+    ("POST", "/webhook/search", {"query": "q", "max_results": 3, "stop_after": -1}),
+    ("POST", "/webhook/search", {"query": "q", "max_results": 3, "deadline": "soon"}),
+    ("POST", "/webhook/get_lyrics", {"artists": "Sam Smith"}),
+    ("POST", "/webhook/get_lyrics/batch", {"items": "Stay With Me"}),
+    ("POST", "/webhook/get_lyrics/batch", {"items": [], "concurrency": 0}),
+    ("POST", "/webhook/lyrics_search", {}),
+    ("POST", "/webhook/song_note", {}),
+    ("POST", "/webhook/instagram", {"async": True, "callback_url": "http://127.0.0.1/x"}),
+    ("GET", "/webhook/instagram/jobs/unknown", None),
+    ("GET", "/webhook/song_note/users/nobody", None),
+    ("GET", "/webhook/song_note/top?kind=albums", None),
+])
+def test_both_apps_refuse_bad_requests_alike(client, history, method, path, payload):
+    flask_status, _, flask_body = flask_call(client, method, path, payload)
+    async_status, _, async_body = async_call(method, path, payload)
+
+    assert flask_status in (400, 404)
+    assert (async_status, async_body) == (flask_status, flask_body)
+
+
+@pytest.mark.parametrize("path", [
+    "/webhook/song_note/users/alice",
+    "/webhook/song_note/users/alice/songs?offset=1&limit=1",
+    "/webhook/song_note/recent",
+    "/webhook/song_note/top?kind=artists",
+    "/webhook/song_note/events?limit=5",
+])
+def test_both_apps_read_the_history_alike(client, history, path):
+    flask_status, flask_headers, flask_body = flask_call(client, "GET", path)
+    async_status, async_headers, async_body = async_call("GET", path)
+
+    assert (async_status, async_body) == (flask_status, flask_body) == (200, flask_body)
+    if "events" not in path:
+        assert async_headers["ETag"] == flask_headers["ETag"]
+
+
+def test_async_history_read_answers_304(history):
+    _, headers, _ = async_call("GET", "/webhook/song_note/users/alice")
+
+    status, _, _ = async_call("GET", "/webhook/song_note/users/alice", headers={"If-None-Match": headers["ETag"]})
+
+    assert status == 304
+
+
+def test_async_song_note_saves(history):
+    status, _, body = async_call("POST", "/webhook/song_note", {"bob": [note("Three", "C")]})
+
+    assert (status, body["status"]) == (200, "success")
+    assert "bob" in history.export_data()["users"]
+
+
+def test_async_search(fake_ddgs):
+    status, _, body = async_call("POST", "/webhook/search", {"query": "q", "max_results": 3})
+
+    assert status == 200
+    assert [result["title"] for result in body] == ["r0", "r1", "r2"]
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+import requests
+
+from benchmarks import bench_webhooks
+from benchmarks.common import percentile, summarize, write_results
+from benchmarks.fake_servers import FakeUpstream
+
+
+@pytest.fixture
+def upstream():
+    server = FakeUpstream(latency=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_percentiles_use_the_nearest_rank():
+    values = list(range(1, 101))
+
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([1, 2, 3], 0.95) == 3
+    assert percentile([], 0.5) is None
+
+
+def test_summary_reports_milliseconds_and_throughput():
+    summary = summarize([0.1, 0.2, 0.3, 0.4], wall_seconds=2, errors=1)
+
+    assert summary["requests"] == 4 and summary["errors"] == 1
+    assert summary["p50_ms"] == pytest.approx(200)
+    assert summary["max_ms"] == pytest.approx(400)
+    assert summary["throughput_rps"] == 2
+
+
+def test_results_are_written_with_their_context(tmp_path):
+    path = write_results("unit", {"p50_ms": 1.0}, str(tmp_path / "unit.json"))
+
+    with open(path) as f:
+        document = json.load(f)
+    assert document["benchmark"] == "unit"
+    assert document["results"] == {"p50_ms": 1.0}
+    assert {"commit", "python", "machine", "cpus"} <= set(document)
+
+
+def test_fake_genius_pages_hold_lyrics(make_scraper, upstream):
+    scraper = make_scraper()
+    with requests.Session() as scraper.session:
+        lyrics = scraper.get_lyrics_from_url(f"{upstream.base_url}/artist-song-lyrics")
+
+    assert lyrics
+    assert upstream.requests == 1
+
+
+def test_app_writes_only_into_the_benchmark_directory(tmp_path):
+    env = bench_webhooks.app_env(str(tmp_path), "http://127.0.0.1:1", 0.2)
+
+    for name in ("DATA_DIR", "METRICS_DIR", "LOG_FILE"):
+        assert os.path.commonpath([env[name], str(tmp_path)]) == str(tmp_path)
+    assert env["GENIUS_BASE_URL"] == env["IG_BASE_URL"] == "http://127.0.0.1:1"
+    assert env["LYRICS_CACHE_ENABLED"] == "0"
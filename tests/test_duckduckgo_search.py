@@ -0,0 +1,75 @@
+import threading
+
+import tools.duckduckgo_search as ddg
+from tools.deadline import Deadline
+
+
+def test_search_results_are_cached(fake_ddgs):
+    first = ddg.search("Some  Query", 5)
+
+    assert ddg.search("some query", 3) == first[:3]
+    assert len(fake_ddgs.calls) == 1
+
+
+def test_iter_search_pages_until_the_limit(fake_ddgs):
+    results = list(ddg.iter_search("q", 15))
+
+    assert [r["title"] for r in results] == [f"r{i}" for i in range(15)]
+    assert [call[2] for call in fake_ddgs.calls] == [1, 2]
+
+
+def test_iter_search_stops_when_results_run_out(fake_ddgs):
+    results = list(ddg.iter_search("q", 100))
+
+    assert len(results) == 25
+    # The complete set answers any later request from the cache
+    assert len(list(ddg.iter_search("q", 50))) == 25
+    assert [call[2] for call in fake_ddgs.calls] == [1, 2, 3, 4]
+
+
+def test_concurrent_streams_share_page_requests(fake_ddgs):
+    fake_ddgs.delay = 0.2
+    results = []
+
+    def stream():
+        results.append(list(ddg.iter_search("Same query", 20)))
+
+    threads = [threading.Thread(target=stream) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(len(r) == 20 for r in results)
+    assert sorted(call[2] for call in fake_ddgs.calls) == [1, 2]
+
+
+def test_each_page_gets_the_time_left_as_its_timeout(fake_ddgs):
+    fake_ddgs.delay = 0.1
+
+    list(ddg.iter_search("q", 25, deadline=Deadline(2)))
+
+    assert len(fake_ddgs.timeouts) == 3
+    assert fake_ddgs.timeouts == sorted(fake_ddgs.timeouts, reverse=True)
+    assert fake_ddgs.timeouts[0] - fake_ddgs.timeouts[-1] >= 0.15
+
+
+def test_stream_stops_waiting_for_a_page_fetched_by_another_request(fake_ddgs):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_page():
+        started.set()
+        release.wait()
+        return []
+
+    leader = threading.Thread(target=ddg._inflight.do, args=(("q", 1, ddg.STREAM_PAGE_SIZE), slow_page))
+    leader.start()
+    started.wait()
+    deadline = Deadline(0.1)
+
+    try:
+        assert list(ddg.iter_search("q", 10, deadline=deadline)) == []
+        assert deadline.partial
+    finally:
+        release.set()
+        leader.join()
@@ -0,0 +1,82 @@
+import pytest
+import requests
+
+from conftest import LYRICS_PAGE
+from tools.get_lyrics import GENIUS_BASE_URL, TransientFetchError
+
+URL = f"{GENIUS_BASE_URL}/sam-smith-stay-with-me-lyrics"
+
+
+def test_found_lyrics_are_cached(make_scraper, lyrics_cache):
+    scraper = make_scraper({URL: (200, LYRICS_PAGE)})
+
+    result = scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert result["url"] == URL
+    assert "all I need" in result["lyrics"]
+    assert lyrics_cache.get("sam-smith", "stay-with-me") == result
+
+
+def test_missing_page_is_negative_cached(make_scraper, lyrics_cache):
+    scraper = make_scraper()
+
+    result = scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert result["error"].startswith("Could not find lyrics")
+    assert "transient" not in result
+    assert lyrics_cache.get("sam-smith", "stay-with-me") == result
+
+
+@pytest.mark.parametrize("failure", [
+    (500, "Internal error"),
+    (503, "Unavailable"),
+    (429, "Too many requests"),
+    requests.Timeout("read timed out"),
+    requests.ConnectionError("connection reset"),
+])
+def test_transient_failure_is_not_cached(make_scraper, lyrics_cache, failure):
+    scraper = make_scraper({URL: failure})
+
+    result = scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert result["transient"] is True
+    assert "try again later" in result["error"]
+    assert lyrics_cache.get("sam-smith", "stay-with-me") is None
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_transient_failure_of_one_candidate_doesnt_hide_another(make_scraper, parallel):
+    other = f"{GENIUS_BASE_URL}/sam%20smith-stay%20with%20me-lyrics"
+    scraper = make_scraper({URL: (502, "Bad gateway"), other: (200, LYRICS_PAGE)}, parallel=parallel)
+
+    result = scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert result["url"] == other
+    assert "transient" not in result
+
+
+def test_fetch_raises_on_transient_failure(make_scraper):
+    scraper = make_scraper({URL: (500, "Internal error")})
+
+    with pytest.raises(TransientFetchError):
+        scraper._fetch_lyrics(URL)
+    # The public helper keeps its None-on-failure contract
+    assert scraper.get_lyrics_from_url(URL) is None
+
+
+def test_shared_scraper_is_reused_within_a_process(monkeypatch):
+    import tools.get_lyrics as get_lyrics
+    monkeypatch.setattr(get_lyrics, "_shared_scraper", None)
+    monkeypatch.setattr(get_lyrics, "_shared_scraper_pid", None)
+
+    scraper = get_lyrics.get_shared_scraper()
+    try:
+        assert get_lyrics.get_shared_scraper() is scraper
+
+        # A forked worker doesn't share its parent's session
+        monkeypatch.setattr(get_lyrics, "_shared_scraper_pid", -1)
+        assert get_lyrics.get_shared_scraper() is not scraper
+    finally:
+        get_lyrics._shared_scraper.close()
+        scraper.close()
+        monkeypatch.setattr(get_lyrics, "_shared_scraper", None)
@@ -0,0 +1,67 @@
+import pytest
+
+from tools import song_history_store
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+@pytest.fixture
+def history(store, monkeypatch):
+    """Serve the read endpoints from each backend with a small history."""
+    monkeypatch.setattr(song_history_store, "_store", store)
+    store.save_payloads([({"alice": [note("One", "A"), note("Two", "A")]}, "2026-01-01T10:00:00"),
+                         ({"alice": [note("Three", "B")], "bob": [note("One", "A")]}, "2026-01-01T11:00:00")])
+    return store
+
+
+def test_user_summary(client, history):
+    response = client.get("/webhook/song_note/users/alice")
+
+    assert response.status_code == 200
+    assert response.get_json()["current-played"] == "Three by B"
+
+
+def test_unknown_user_is_404(client, history):
+    assert client.get("/webhook/song_note/users/nobody").status_code == 404
+
+
+def test_songs_are_paginated(client, history):
+    page = client.get("/webhook/song_note/users/alice/songs?offset=1&limit=1").get_json()
+
+    assert page["total"] == 3
+    assert [row["song"] for row in page["items"]] == ["Two by A"]
+
+
+def test_recent_plays_since(client, history):
+    rows = client.get("/webhook/song_note/recent?since=2026-01-01T10:30:00").get_json()
+
+    assert {(row["user"], row["song"]) for row in rows} == {("alice", "Three by B"), ("bob", "One by A")}
+
+
+def test_top_songs_and_artists(client, history):
+    assert client.get("/webhook/song_note/top?limit=1").get_json()[0]["song"] == "One by A"
+    assert client.get("/webhook/song_note/top?kind=artists&limit=1").get_json()[0]["artist"] == "A"
+
+
+def test_top_rejects_an_unknown_kind(client, history):
+    assert client.get("/webhook/song_note/top?kind=albums").status_code == 400
+
+
+def test_unchanged_history_answers_304(client, history):
+    etag = client.get("/webhook/song_note/users/alice").headers["ETag"]
+
+    assert client.get("/webhook/song_note/users/alice", headers={"If-None-Match": etag}).status_code == 304
+    # The ETag is per URL
+    assert client.get("/webhook/song_note/users/bob", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_a_save_changes_the_etag(client, history):
+    etag = client.get("/webhook/song_note/users/alice").headers["ETag"]
+
+    history.save_payloads([({"alice": [note("Four", "C")]}, "2026-01-01T12:00:00")])
+
+    response = client.get("/webhook/song_note/users/alice", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["current-played"] == "Four by C"
@@ -0,0 +1,68 @@
+import pytest
+
+from tools import ig_inbox_song_automate as inbox
+
+
+class ScriptDriver:
+    """Answers the in-page extraction script with canned entries."""
+
+    def __init__(self, entries=None, error=None):
+        self.entries = entries
+        self.error = error
+        self.scripts = 0
+
+    def execute_script(self, script, *args):
+        self.scripts += 1
+        if self.error:
+            raise self.error
+        return self.entries
+
+    def find_elements(self, by, value):
+        return []
+
+
+ENTRIES = [
+    {"alt": "alice's profile picture", "song": "Stay With Me", "artist": "Sam Smith",
+     "spans": ["Sam Smith", "on repeat"]},
+    {"alt": "bob's profile picture", "song": None, "artist": None, "spans": ["gym time"]},
+    # The song div repeating the artist isn't a song
+    {"alt": "carol's profile picture", "song": "Adele", "artist": "Adele", "spans": ["Adele"]},
+    {"alt": "dave's profile picture", "song": None, "artist": None, "spans": []},
+    None,
+]
+
+
+def test_script_extraction_applies_the_note_rules():
+    results = inbox.extract_notes(ScriptDriver(ENTRIES), mode="script")
+
+    assert results == [
+        {"user": "alice", "song": "Stay With Me", "artist": "Sam Smith", "note": "on repeat"},
+        {"user": "bob", "song": "", "artist": "", "note": "gym time"},
+    ]
+
+
+def test_script_extraction_takes_one_round_trip():
+    driver = ScriptDriver(ENTRIES)
+
+    inbox.extract_notes(driver, mode="script")
+
+    assert driver.scripts == 1
+
+
+@pytest.mark.parametrize("driver", [ScriptDriver(error=RuntimeError("script failed")), ScriptDriver("not a list")])
+def test_failing_script_falls_back_to_selectors(driver, monkeypatch):
+    calls = []
+    monkeypatch.setattr(inbox, "extract_notes_with_selectors", lambda driver, deadline=None: calls.append(driver) or [])
+
+    assert inbox.extract_notes(driver, mode="script") == []
+    assert calls == [driver]
+
+
+def test_group_results_by_user():
+    results = inbox.extract_notes(ScriptDriver(ENTRIES + [ENTRIES[0]]), mode="script")
+
+    grouped = inbox.group_results(results)
+
+    assert list(grouped) == ["alice", "bob"]
+    assert len(grouped["alice"]) == 2
+    assert inbox.group_results([]) == {"message": "No song notes found."}
@@ -0,0 +1,108 @@
+import os
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from tools import ig_sessions
+
+ALICE = [{"user": "alice", "song": "Stay With Me", "artist": "Sam Smith", "note": ""}]
+BOB = [{"user": "bob", "song": "", "artist": "", "note": "gym time"}]
+
+
+def test_sessions_are_merged_by_user():
+    merged = ig_sessions.merge_song_data({"one": {"alice": ALICE}, "two": {"alice": ALICE, "bob": BOB}})
+
+    assert merged == {"alice": ALICE, "bob": BOB}
+
+
+def test_failed_session_makes_the_merge_partial():
+    merged = ig_sessions.merge_song_data({"one": {"alice": ALICE}, "two": {"error": "login failed"}})
+
+    assert merged == {"users": {"alice": ALICE}, "partial": True}
+
+
+def test_partial_session_results_are_unwrapped():
+    merged = ig_sessions.merge_song_data({"one": {"users": {"alice": ALICE}, "partial": True}, "two": {"bob": BOB}})
+
+    assert merged == {"users": {"alice": ALICE, "bob": BOB}, "partial": True}
+
+
+def test_every_session_failing_is_an_error():
+    merged = ig_sessions.merge_song_data({"one": {"error": "login failed"}, "two": {"error": "timeout"}})
+
+    assert "error" in merged and "partial" not in merged
+
+
+class FakeExecutor:
+    """Runs submissions in-process, recording which sessions it was given."""
+
+    def __init__(self, max_workers=None, **kwargs):
+        self.max_workers = max_workers
+        self.sessions = []
+
+    def submit(self, func, session, *args):
+        self.sessions.append(session["name"])
+        future = Future()
+        future.set_result(func(session, *args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    monkeypatch.setattr(ig_sessions, "ProcessPoolExecutor", FakeExecutor)
+    monkeypatch.setattr(ig_sessions, "_executors", {})
+    monkeypatch.setattr(ig_sessions, "_executors_pid", os.getpid())
+    monkeypatch.setattr(ig_sessions, "_scrape_session",
+                        lambda session, *args: {session["name"]: [{**ALICE[0], "user": session["name"]}]})
+    monkeypatch.setattr(ig_sessions, "SESSION_WORKERS", 2)
+    yield ig_sessions._executors
+    ig_sessions.shutdown_session_pool()
+
+
+SESSIONS = [{"name": name, "sessionid": f"id-{name}"} for name in ("one", "two", "three")]
+
+
+def test_sessions_are_spread_round_robin(monkeypatch):
+    monkeypatch.setattr(ig_sessions, "SESSION_WORKERS", 2)
+
+    assert ig_sessions.session_slots(SESSIONS) == {"one": 0, "two": 1, "three": 0}
+
+
+def test_each_session_stays_in_its_process(executors):
+    ig_sessions.scrape_sessions(sessions=SESSIONS)
+    ig_sessions.scrape_sessions(sessions=SESSIONS)
+
+    assert {slot: executor.sessions for slot, executor in executors.items()} == {
+        0: ["one", "three", "one", "three"],
+        1: ["two", "two"],
+    }
+    assert all(executor.max_workers == 1 for executor in executors.values())
+
+
+@pytest.fixture
+def scraped(tmp_path, monkeypatch):
+    """Slot locks under tmp_path and a get_song_data recording the sessions it scrapes."""
+    from tools import ig_inbox_song_automate
+    monkeypatch.setattr(ig_sessions, "DATA_DIR", str(tmp_path))
+    calls = []
+    monkeypatch.setattr(ig_inbox_song_automate, "get_song_data",
+                        lambda use_pool, deadline, session, max_rss_mb: calls.append(session) or {"alice": ALICE})
+    return calls
+
+
+def test_session_is_scraped_holding_its_slot(scraped):
+    assert ig_sessions._scrape_session(SESSIONS[0], 0, False, None, 0) == {"alice": ALICE}
+    assert scraped == ["id-one"]
+
+
+def test_busy_slot_of_another_process_leaves_the_session_out(scraped):
+    expires_at = time.monotonic() + 0.1
+    with ig_sessions._slot_lock(1):
+        result = ig_sessions._scrape_session(SESSIONS[1], 1, False, expires_at, 0)
+
+    assert result == {"users": {}, "partial": True}
+    assert scraped == []
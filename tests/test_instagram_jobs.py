@@ -0,0 +1,139 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from tools import instagram_jobs as jobs
+from tools import song_history_store
+from tools.deadline import Deadline
+
+NOTES = {"alice": [{"user": "alice", "song": "Stay With Me", "artist": "Sam Smith", "note": ""}]}
+
+
+@pytest.fixture
+def ig_jobs(tmp_path, monkeypatch):
+    """Point the snapshot, lock and jobs at tmp_path and replace the scrape with a counting stub."""
+    monkeypatch.setattr(jobs, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(jobs, "SNAPSHOT_FILE", str(tmp_path / "instagram_snapshot.json"))
+    monkeypatch.setattr(jobs, "LOCK_FILE", str(tmp_path / "instagram_scrape.lock"))
+    monkeypatch.setattr(jobs, "JOBS_DIR", str(tmp_path / "instagram_jobs"))
+    monkeypatch.setattr(jobs, "_job_executor", None)
+    delay = [0]
+    scrapes = []
+
+    def fake_scrape(deadline=None):
+        scrapes.append(threading.current_thread().name)
+        time.sleep(delay[0])
+        return dict(NOTES)
+
+    fake_scrape.calls = scrapes
+    fake_scrape.delay = delay
+    monkeypatch.setattr(jobs, "scrape_sessions", fake_scrape)
+    yield fake_scrape
+    jobs.shutdown_job_executor()
+
+
+def resolving_to(address):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+    return getaddrinfo
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8080/hook",
+    "http://localhost/hook",
+    "http://10.1.2.3/hook",
+    "http://192.168.0.10/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "ftp://example.com/hook",
+    "file:///etc/passwd",
+    "not a url",
+    ["http://example.com"],
+])
+def test_internal_or_odd_callback_urls_are_refused(url):
+    assert jobs.validate_callback_url(url) is not None
+
+
+def test_public_callback_url_is_allowed(monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", resolving_to("93.184.216.34"))
+
+    assert jobs.validate_callback_url("https://hooks.example.com/done") is None
+
+
+def test_host_resolving_to_a_private_address_is_refused(monkeypatch):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", resolving_to("10.0.0.7"))
+
+    assert "non-public" in jobs.validate_callback_url("https://hooks.example.com/done")
+
+
+def test_allowlist_replaces_the_address_check(monkeypatch):
+    monkeypatch.setattr(jobs, "CALLBACK_ALLOWED_HOSTS", {"n8n.internal"})
+
+    assert jobs.validate_callback_url("http://n8n.internal:5678/webhook") is None
+    assert jobs.validate_callback_url("https://hooks.example.com/done") is not None
+
+
+def test_async_request_with_internal_callback_is_rejected(client, ig_jobs):
+    response = client.post("/webhook/instagram", json={"async": True, "callback_url": "http://127.0.0.1:5000/x"})
+
+    assert response.status_code == 400
+    assert ig_jobs.calls == []
+
+
+def test_jobs_run_on_a_bounded_pool(ig_jobs, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 1)
+    ig_jobs.delay[0] = 0.05
+    submitted = [jobs.submit_job() for _ in range(3)]
+
+    for job in submitted:
+        for _ in range(100):
+            if jobs.get_job(job["id"])["status"] == "done":
+                break
+            time.sleep(0.02)
+
+    assert [jobs.get_job(job["id"])["result"] for job in submitted] == [NOTES] * 3
+    assert len(set(ig_jobs.calls)) == 1
+
+
+def test_recent_snapshot_is_served_without_scraping(ig_jobs):
+    assert jobs.get_song_data_coalesced() == NOTES
+
+    assert jobs.get_song_data_coalesced(max_age=60) == NOTES
+    assert len(ig_jobs.calls) == 1
+
+
+def test_concurrent_callers_share_one_scrape(ig_jobs):
+    ig_jobs.delay[0] = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(jobs.get_song_data_coalesced())) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+
+    assert results == [NOTES] * 3
+    assert len(ig_jobs.calls) == 1
+
+
+def test_partial_result_keeps_the_flag_out_of_the_users(ig_jobs):
+    jobs.get_song_data_coalesced()
+    with jobs._scrape_lock():
+        data = jobs.get_song_data_coalesced(max_age=0, deadline=Deadline(0.1))
+
+    assert data == {"users": NOTES, "partial": True}
+
+
+def test_partial_result_can_be_saved_as_song_notes(client, ig_jobs, store, monkeypatch):
+    monkeypatch.setattr(song_history_store, "_store", store)
+    jobs.get_song_data_coalesced()
+    with jobs._scrape_lock():
+        data = jobs.get_song_data_coalesced(max_age=0, deadline=Deadline(0.1))
+
+    response = client.post("/webhook/song_note", json=data)
+
+    assert response.status_code == 200
+    assert store.songs_played("alice")["total"] == 1
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import queue
+import sys
+
+import logging_config
+from logging_config import DroppingQueueHandler, JsonFormatter, LockedRotatingFileHandler, SamplingFilter
+
+
+def record(msg="hello %s", args=("world",), level=logging.INFO, **extra):
+    entry = logging.LogRecord("tests", level, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+def test_json_lines_carry_the_extra_fields():
+    line = json.loads(JsonFormatter().format(record(user="alice", took=0.5)))
+
+    assert line["message"] == "hello world"
+    assert line["level"] == "INFO" and line["logger"] == "tests"
+    assert line["user"] == "alice" and line["took"] == 0.5
+
+
+def test_json_keeps_the_traceback_apart():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        entry = record(exc_info=sys.exc_info())
+
+    line = json.loads(JsonFormatter().format(entry))
+
+    assert line["message"] == "hello world"
+    assert "ValueError: boom" in line["exc_info"]
+
+
+def test_sampled_lines_are_capped_per_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    sampler = SamplingFilter(burst=2, window=10)
+
+    passed = [sampler.filter(record(sample="item")) for _ in range(5)]
+    now[0] = 11
+    next_window = record("item %s", ("6",), sample="item")
+
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(next_window)
+    assert "3 similar 'item' lines suppressed" in next_window.getMessage()
+    assert sampler.filter(record())
+
+
+def test_full_queue_drops_records_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(DroppingQueueHandler, "dropped", 0)
+    handler = DroppingQueueHandler(queue.Queue(1))
+
+    handler.handle(record())
+    handler.handle(record())
+
+    assert handler.queue.qsize() == 1
+    assert DroppingQueueHandler.dropped == 1
+    assert handler.queue.get().getMessage() == "hello world"
+
+
+def test_file_rotates_past_max_bytes(tmp_path):
+    path = str(tmp_path / "app.log")
+    handler = LockedRotatingFileHandler(path, maxBytes=50, backupCount=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for number in range(10):
+        handler.handle(record(f"line {number} " + "x" * 20, None))
+    handler.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["app.log", "app.log.1", "app.log.2", "app.log.lock"]
+
+
+def test_writer_follows_a_rotation_done_by_another_process(tmp_path):
+    path = str(tmp_path / "app.log")
+    handler = LockedRotatingFileHandler(path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler.handle(record("before", None))
+    os.rename(path, path + ".1")
+
+    handler.handle(record("after", None))
+    handler.close()
+
+    with open(path) as f:
+        assert f.read() == "after\n"
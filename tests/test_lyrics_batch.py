@@ -0,0 +1,65 @@
+import pytest
+
+import tools.get_lyrics as get_lyrics
+
+
+@pytest.fixture
+def batch_calls(monkeypatch):
+    calls = []
+
+    def fake_batch(items, concurrency=None, deadline=None):
+        calls.append(concurrency)
+        return [{"error": "stub"} for _ in items]
+
+    monkeypatch.setattr(get_lyrics, "get_lyrics_batch", fake_batch)
+    return calls
+
+
+ITEMS = [{"artists": "Sam Smith", "song_name": "Stay With Me"}]
+
+
+@pytest.mark.parametrize("concurrency", ["fast", [], {}, 0, -2, 1.5, True])
+def test_invalid_concurrency_is_rejected(client, batch_calls, concurrency):
+    response = client.post("/webhook/get_lyrics/batch", json={"items": ITEMS, "concurrency": concurrency})
+
+    assert response.status_code == 400
+    assert "concurrency" in response.get_json()["error"]
+    assert batch_calls == []
+
+
+@pytest.mark.parametrize("concurrency, expected", [
+    (None, get_lyrics.BATCH_MAX_CONCURRENCY),
+    (2, 2),
+    ("3", 3),
+    (10_000, get_lyrics.BATCH_MAX_CONCURRENCY),
+])
+def test_concurrency_is_clamped(client, batch_calls, concurrency, expected):
+    payload = {"items": ITEMS}
+    if concurrency is not None:
+        payload["concurrency"] = concurrency
+
+    response = client.post("/webhook/get_lyrics/batch", json=payload)
+
+    assert response.status_code == 200
+    assert batch_calls == [expected]
+
+
+def test_too_many_items_are_rejected(client, batch_calls):
+    response = client.post("/webhook/get_lyrics/batch", json={"items": ITEMS * (get_lyrics.BATCH_MAX_ITEMS + 1)})
+
+    assert response.status_code == 400
+
+
+def test_batch_keeps_item_order(make_scraper, monkeypatch):
+    from conftest import LYRICS_PAGE
+    scraper = make_scraper({f"{get_lyrics.GENIUS_BASE_URL}/adele-hello-lyrics": (200, LYRICS_PAGE)},
+                           delays={f"{get_lyrics.GENIUS_BASE_URL}/adele-hello-lyrics": 0.05})
+    monkeypatch.setattr(get_lyrics, "get_shared_scraper", lambda: scraper)
+
+    results = get_lyrics.get_lyrics_batch([{"artists": "Adele", "song_name": "Hello"},
+                                           {"artists": "Nobody", "song_name": "Nothing"},
+                                           {"song_name": "No artist"}], 3)
+
+    assert "lyrics" in results[0]
+    assert results[1]["error"].startswith("Could not find lyrics")
+    assert results[2] == {"error": "Missing artists or song_name parameter"}
@@ -0,0 +1,45 @@
+from tools.lyrics_cache import LyricsCache
+
+FOUND = {"lyrics": "la la", "artist": "A", "song": "S", "url": "https://genius.com/a-s-lyrics"}
+MISSING = {"error": "Could not find lyrics"}
+
+
+def test_round_trip(lyrics_cache):
+    lyrics_cache.set("a", "s", FOUND)
+
+    assert lyrics_cache.get("a", "s") == FOUND
+    assert lyrics_cache.get("a", "other") is None
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    cache = LyricsCache(str(tmp_path / "cache.db"), ttl=100, negative_ttl=10)
+    now = 1_000_000.0
+    monkeypatch.setattr("tools.lyrics_cache.time.time", lambda: now)
+    cache.set("a", "found", FOUND)
+    cache.set("a", "missing", MISSING)
+
+    now += 50
+    assert cache.get("a", "found") == FOUND
+    assert cache.get("a", "missing") is None
+
+
+def test_negative_ttl_zero_disables_negative_caching(tmp_path):
+    cache = LyricsCache(str(tmp_path / "cache.db"), negative_ttl=0)
+    cache.set("a", "s", MISSING)
+
+    assert cache.get("a", "s") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = LyricsCache(str(tmp_path / "cache.db"), max_entries=2)
+    clock = iter(range(1_000_000, 1_000_100))
+    monkeypatch.setattr("tools.lyrics_cache.time.time", lambda: float(next(clock)))
+    cache.set("a", "1", FOUND)
+    cache.set("a", "2", FOUND)
+    cache.get("a", "1")
+
+    cache.set("a", "3", FOUND)
+
+    assert cache.get("a", "1") == FOUND
+    assert cache.get("a", "2") is None
+    assert cache.get("a", "3") == FOUND
@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.bench_lyrics_extraction import extract_baseline
+from benchmarks.fixtures import make_genius_page
+
+PAGES = {
+    "generated": make_genius_page(verses=3, filler_nodes=200),
+    "nested": ('<html><body><div data-lyrics-container="true">[Chorus]<br/>'
+               '<a href="/x"><span>Oh, won\'t you <i>stay</i></span></a> with me?<br/>'
+               '<div><p>\'Cause you\'re all I need</p></div></div>'
+               '<div data-lyrics-container="true">This ain\'t love<br>it\'s clear to see</div></body></html>'),
+    "class fallback": ('<html><body><div class="Lyrics__Container">First line<br/>Second line</div>'
+                       '<div class="other">Not lyrics</div></body></html>'),
+}
+
+
+@pytest.mark.parametrize("page", PAGES.values(), ids=PAGES.keys())
+def test_engines_extract_the_same_lyrics(make_scraper, page):
+    lxml_scraper = make_scraper(parser="lxml")
+    soup_scraper = make_scraper(parser="soup")
+
+    lyrics = lxml_scraper.extract_lyrics(page)
+
+    assert lyrics
+    assert soup_scraper.extract_lyrics(page) == lyrics
+    assert extract_baseline(soup_scraper, page) == lyrics
+
+
+def test_section_headers_are_removed(make_scraper):
+    lyrics = make_scraper().extract_lyrics(PAGES["nested"])
+
+    assert "[Chorus]" not in lyrics
+    assert lyrics.splitlines()[0] == "Oh, won't youstaywith me?"
+
+
+def test_page_without_lyrics(make_scraper):
+    assert make_scraper().extract_lyrics("<html><body><p>Nothing here</p></body></html>") is None
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import LYRICS_PAGE
+from tools import lyrics_index
+from tools.get_lyrics import GENIUS_BASE_URL
+from tools.lyrics_cache import LyricsCache
+from tools.lyrics_index import LyricsIndex
+
+URL = f"{GENIUS_BASE_URL}/sam-smith-stay-with-me-lyrics"
+
+
+def found(url, lyrics="la la la"):
+    return {"lyrics": lyrics, "artist": "A", "song": "S", "url": url}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LyricsIndex(str(tmp_path / "lyrics_index.db"))
+
+
+def test_lyrics_are_found_by_a_line(make_scraper, index):
+    scraper = make_scraper({URL: (200, LYRICS_PAGE)}, index=index)
+    scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    matches = index.search("won't you stay with me")
+
+    assert [match["url"] for match in matches] == [URL]
+
+
+def test_cache_hits_leave_the_index_alone(make_scraper, index, monkeypatch):
+    scraper = make_scraper({URL: (200, LYRICS_PAGE)}, index=index)
+    scraper.get_lyrics("Sam Smith", "Stay With Me")
+    added = []
+    monkeypatch.setattr(index, "add", lambda *args: added.append(args))
+
+    scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert added == []
+
+
+def test_remove_drops_pages_and_their_stats(index):
+    index.add("A", "S", "https://genius.com/a-lyrics", "la la la")
+    index.add("B", "T", "https://genius.com/b-lyrics", "na na")
+
+    assert index.remove(["https://genius.com/a-lyrics", "https://genius.com/unknown-lyrics"]) == 1
+    assert index.stats()["documents"] == 1
+    assert index.search("la la") == []
+
+
+def test_pages_evicted_from_the_cache_leave_the_index(tmp_path, make_scraper, index):
+    cache = LyricsCache(str(tmp_path / "cache.db"), max_entries=1)
+    scraper = make_scraper(index=index, cache=cache)
+    scraper.remember("a", "1", found("https://genius.com/a-lyrics", "la la la"))
+
+    scraper.remember("b", "2", found("https://genius.com/b-lyrics", "na na na"))
+
+    assert index.search("la la la") == []
+    assert [match["url"] for match in index.search("na na na")] == ["https://genius.com/b-lyrics"]
+
+
+def test_page_still_cached_under_another_key_stays_indexed(tmp_path, make_scraper, index):
+    cache = LyricsCache(str(tmp_path / "cache.db"), max_entries=2)
+    scraper = make_scraper(index=index, cache=cache)
+    scraper.remember("the-beatles", "help", found("https://genius.com/a-lyrics"))
+    scraper.remember("beatles", "help", found("https://genius.com/a-lyrics"))
+
+    scraper.remember("b", "2", found("https://genius.com/b-lyrics", "na na na"))
+
+    assert index.stats()["documents"] == 2
+
+
+def test_live_search_remembers_the_pages_it_fetches(make_scraper, index, lyrics_cache, monkeypatch):
+    from tools import duckduckgo_search, get_lyrics
+    scraper = make_scraper({URL: (200, LYRICS_PAGE)}, index=index)
+    monkeypatch.setattr(lyrics_index, "get_default_index", lambda: index)
+    monkeypatch.setattr(get_lyrics, "get_shared_scraper", lambda: scraper)
+    monkeypatch.setattr(duckduckgo_search, "search", lambda query, max_results, deadline=None: [
+        {"title": "Sam Smith – Stay With Me Lyrics | Genius Lyrics", "href": URL}])
+
+    matches = lyrics_index.search_live("all I need")
+
+    assert [match["url"] for match in matches] == [URL]
+    assert lyrics_cache.get("sam-smith", "stay-with-me")["url"] == URL
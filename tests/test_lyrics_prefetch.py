@@ -0,0 +1,41 @@
+import queue
+
+import pytest
+
+from tools import lyrics_prefetch, simple_song_history, song_events, song_history_store
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+@pytest.fixture
+def prefetched(store, monkeypatch):
+    """Save into each backend and record what is handed to the prefetcher."""
+    monkeypatch.setattr(song_history_store, "_store", store)
+    calls = []
+    monkeypatch.setattr(simple_song_history, "prefetch", lambda songs: calls.append(list(songs)) or 0)
+    return calls
+
+
+@pytest.mark.parametrize("events_enabled", [True, False])
+def test_new_songs_are_prefetched_with_or_without_events(prefetched, events_enabled, monkeypatch, tmp_path):
+    monkeypatch.setattr(simple_song_history, "EVENTS_ENABLED", events_enabled)
+    monkeypatch.setattr(song_events, "_event_log", song_events.EventLog(str(tmp_path / "song_events.db")))
+
+    simple_song_history.save_song_history_from_webhook({"alice": [note("One", "A"), note("Two", "B")]})
+    simple_song_history.save_song_history_from_webhook({"alice": [note("Two", "B"), note("Three", "C")]})
+
+    assert prefetched == [[("A", "One"), ("B", "Two")], [("C", "Three")]]
+
+
+def test_prefetch_skips_pairs_already_queued(monkeypatch):
+    monkeypatch.setattr(lyrics_prefetch, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(lyrics_prefetch, "get_default_cache", lambda: object())
+    monkeypatch.setattr(lyrics_prefetch, "_start_workers", lambda: None)
+    monkeypatch.setattr(lyrics_prefetch, "_queue", queue.Queue(maxsize=2))
+    monkeypatch.setattr(lyrics_prefetch, "_pending", set())
+
+    assert lyrics_prefetch.prefetch([("A", "One"), ("A", "One"), ("", "Note only")]) == 1
+    assert lyrics_prefetch.prefetch([("A", "One"), ("B", "Two"), ("C", "Three")]) == 1
+    assert lyrics_prefetch.queue_depth() == 2
@@ -0,0 +1,104 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import LYRICS_PAGE
+from tools.async_lyrics import AsyncLyricsClient
+from tools.get_lyrics import GENIUS_BASE_URL, strip_featured_artists
+from tools.rate_limit import HostRateLimiter
+
+FULL = f"{GENIUS_BASE_URL}/sam-smith-stay-with-me-lyrics"
+QUOTED = f"{GENIUS_BASE_URL}/sam%20smith-stay%20with%20me-lyrics"
+SHORT = f"{GENIUS_BASE_URL}/sam-smith-stay-lyrics"
+
+
+@pytest.mark.parametrize("song, expected", [
+    ("Stay With Me", "Stay With Me"),
+    ("Without Me", "Without Me"),
+    ("Dance (with Jane Doe)", "Dance"),
+    ("Dance [With Jane Doe]", "Dance"),
+    ("Dance feat. Jane Doe", "Dance"),
+    ("Dance (ft. Jane Doe)", "Dance"),
+    ("Dance featuring Jane Doe (Remix)", "Dance (Remix)"),
+])
+def test_strip_featured_artists_song(song, expected):
+    assert list(strip_featured_artists("Sam Smith", song)) == [("Sam Smith", expected)]
+
+
+def test_strip_featured_artists_keeps_lead_artist():
+    assert list(strip_featured_artists("Sam Smith feat. Jane Doe", "Song")) == [("Sam Smith", "Song")]
+    assert list(strip_featured_artists("Sam Smith & Jane Doe", "Song")) == [("Sam Smith", "Song")]
+
+
+def test_candidates_keep_with_in_titles(make_scraper):
+    assert SHORT not in make_scraper().candidate_urls("Sam Smith", "Stay With Me")
+
+
+def test_parallel_probe_prefers_the_best_ranked_candidate(make_scraper):
+    # The top candidate is slower than a lower-ranked one that also has lyrics
+    scraper = make_scraper({FULL: (200, LYRICS_PAGE), QUOTED: (200, LYRICS_PAGE.replace("stay", "go"))},
+                           parallel=True, delays={FULL: 0.2})
+
+    result = scraper.get_lyrics("Sam Smith", "Stay With Me")
+
+    assert result["url"] == FULL
+
+
+def test_parallel_probe_falls_back_to_a_lower_ranked_candidate(make_scraper):
+    scraper = make_scraper({QUOTED: (200, LYRICS_PAGE)}, parallel=True, delays={FULL: 0.1})
+
+    assert scraper.get_lyrics("Sam Smith", "Stay With Me")["url"] == QUOTED
+
+
+def test_parallel_probes_dont_spend_tokens_of_later_lookups(make_scraper):
+    # Burst of 2, then one request every 1.5s: each lookup should only use the token of its hit
+    limiter = HostRateLimiter(1 / 1.5, 2)
+    scraper = make_scraper({FULL: (200, LYRICS_PAGE), f"{GENIUS_BASE_URL}/adele-hello-lyrics": (200, LYRICS_PAGE)},
+                           parallel=True, rate_limiter=limiter, cache=None, delays={FULL: 0.05})
+
+    timings = []
+    for artist, song in [("Sam Smith", "Stay With Me"), ("Adele", "Hello")]:
+        start = time.perf_counter()
+        assert "lyrics" in scraper.get_lyrics(artist, song)
+        timings.append(time.perf_counter() - start)
+
+    assert max(timings) < 0.5
+    assert QUOTED not in scraper.session.requested
+
+
+def test_cancelled_probe_takes_no_token(make_scraper):
+    import threading
+    limiter = HostRateLimiter(1, 1)
+    scraper = make_scraper(rate_limiter=limiter)
+    cancelled = threading.Event()
+    cancelled.set()
+
+    assert scraper.get_lyrics_from_url(FULL, cancelled) is None
+    assert limiter.poll(FULL) == 0
+    assert scraper.session.requested == []
+
+
+def test_async_parallel_probe_prefers_the_best_ranked_candidate(make_scraper, monkeypatch):
+    scraper = make_scraper(parallel=True)
+    delays = {FULL: 0.2, QUOTED: 0}
+    fetched = []
+
+    async def fake_fetch(self, url, deadline=None, speculative=None):
+        await asyncio.sleep(delays.get(url, 0))
+        fetched.append(url)
+        return "lyrics of " + url if url in delays else None
+
+    monkeypatch.setattr(AsyncLyricsClient, "_fetch_lyrics", fake_fetch)
+
+    async def run():
+        client = AsyncLyricsClient(scraper)
+        try:
+            return await client.get_lyrics("Sam Smith", "Stay With Me")
+        finally:
+            await client.close()
+
+    result = asyncio.run(run())
+
+    assert result["url"] == FULL
+    assert QUOTED in fetched
@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools import metrics
+
+
+@pytest.fixture
+def fresh_metrics(tmp_path, monkeypatch):
+    """Empty in-memory metrics and metric files on tmp_path, without a flusher thread."""
+    for name in ("_counters", "_gauges", "_histograms", "_types"):
+        monkeypatch.setattr(metrics, name, {})
+    monkeypatch.setattr(metrics, "_flusher_pid", os.getpid())
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "RETIRED_FILE", str(tmp_path / "retired.json"))
+    return tmp_path
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def write_process_file(directory, pid, counters=(), gauges=(), histograms=()):
+    with open(directory / f"{pid}.json", "w") as f:
+        json.dump({"pid": pid, "types": {}, "counters": list(counters), "gauges": list(gauges),
+                   "histograms": list(histograms)}, f)
+
+
+def test_histogram_is_rendered_cumulatively(fresh_metrics):
+    for value in (0.004, 0.02, 0.02, 500):
+        metrics.observe("tool_phase_seconds", value, buckets=(0.01, 0.05), phase="genius_fetch")
+
+    text = metrics.render()
+
+    assert "# TYPE tool_phase_seconds histogram" in text
+    assert 'tool_phase_seconds_bucket{phase="genius_fetch",le="0.01"} 1' in text
+    assert 'tool_phase_seconds_bucket{phase="genius_fetch",le="0.05"} 3' in text
+    assert 'tool_phase_seconds_bucket{phase="genius_fetch",le="+Inf"} 4' in text
+    assert 'tool_phase_seconds_count{phase="genius_fetch"} 4' in text
+
+
+def test_timed_works_as_decorator_and_block(fresh_metrics):
+    @metrics.timed("tool_phase_seconds", phase="ddgs_query")
+    def search():
+        with metrics.timed("tool_phase_seconds", phase="ddgs_page"):
+            pass
+
+    search()
+    search()
+
+    assert metrics.collect().histograms[("tool_phase_seconds", '{"phase": "ddgs_query"}')]["count"] == 2
+    assert metrics.collect().histograms[("tool_phase_seconds", '{"phase": "ddgs_page"}')]["count"] == 2
+
+
+def test_label_values_are_escaped(fresh_metrics):
+    metrics.inc("http_requests_total", route='/a"b\\c')
+
+    assert 'http_requests_total{route="/a\\"b\\\\c"} 1' in metrics.render()
+
+
+def test_counters_of_other_processes_are_summed(fresh_metrics):
+    metrics.inc("cache_requests_total", cache="lyrics", result="hit")
+    labels = json.dumps({"cache": "lyrics", "result": "hit"}, sort_keys=True)
+    write_process_file(fresh_metrics, os.getppid(), counters=[["cache_requests_total", labels, 2]])
+
+    assert metrics.collect().counters[("cache_requests_total", labels)] == 3
+
+
+def test_exited_processes_are_retired_without_losing_counts(fresh_metrics):
+    labels = json.dumps({"cache": "lyrics", "result": "miss"}, sort_keys=True)
+    dead = exited_pid()
+    write_process_file(fresh_metrics, dead, counters=[["cache_requests_total", labels, 5]],
+                       gauges=[["http_requests_in_flight", "{}", 3, 1.0, "sum"],
+                               ["song_history_file_bytes", "{}", 100, 1.0, "last"]])
+
+    first = metrics.collect()
+    second = metrics.collect()
+
+    assert not (fresh_metrics / f"{dead}.json").exists()
+    assert first.counters[("cache_requests_total", labels)] == 5
+    assert second.counters[("cache_requests_total", labels)] == 5
+    # In-flight requests of an exited worker are gone; the last file size is still the last one written
+    assert ("http_requests_in_flight", "{}") not in second.gauges
+    assert second.gauges[("song_history_file_bytes", "{}")][0] == 100
+
+
+def test_newest_last_value_gauge_wins(fresh_metrics):
+    metrics.set_gauge("song_history_file_bytes", 200)
+    write_process_file(fresh_metrics, os.getppid(), gauges=[["song_history_file_bytes", "{}", 100, 1.0, "last"]])
+
+    assert metrics.collect().gauges[("song_history_file_bytes", "{}")][0] == 200
+
+
+def test_metrics_endpoint(client, fresh_metrics):
+    client.get("/webhook/tools")
+
+    response = client.get("/metrics")
+
+    assert response.mimetype == "text/plain"
+    assert 'http_requests_total{method="GET",route="/webhook/tools",status="200"} 1' in response.get_data(as_text=True)
@@ -0,0 +1,92 @@
+import pytest
+
+from tools.rate_limit import HostRateLimiter, SharedTokenBucket, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.monotonic for the rate limiter."""
+    now = [100.0]
+    monkeypatch.setattr("tools.rate_limit.time.monotonic", lambda: now[0])
+    monkeypatch.setattr("tools.rate_limit.time.sleep", lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+
+def test_burst_is_free_then_requests_are_spaced(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_tokens_refill_over_time(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.reserve()
+
+    clock[0] += 1
+
+    assert bucket.reserve() == 0
+
+
+def test_reserve_gives_up_past_max_wait_without_taking_a_token(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.reserve()
+
+    assert bucket.reserve(max_wait=0.5) is None
+    assert bucket.reserve(max_wait=1) == pytest.approx(1.0)
+
+
+def test_zero_rate_disables_limiting(clock):
+    bucket = TokenBucket(rate=0)
+
+    assert all(bucket.reserve() == 0 for _ in range(10))
+
+
+def test_acquire_sleeps_for_the_wait(clock):
+    limiter = HostRateLimiter(rate=1, burst=1)
+    start = clock[0]
+
+    assert limiter.acquire("https://genius.com/a")
+    assert limiter.acquire("https://genius.com/b")
+
+    assert clock[0] - start == pytest.approx(1.0)
+
+
+def test_hosts_have_separate_buckets(clock):
+    limiter = HostRateLimiter(rate=1, burst=1)
+    limiter.reserve("https://genius.com/a")
+
+    assert limiter.reserve("https://example.com/a") == 0
+    assert limiter.bucket("https://genius.com/b") is limiter.bucket("genius.com")
+
+
+def test_poll_takes_a_token_only_when_enough_are_left(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+
+    assert bucket.poll(spare=1) == 0
+    assert bucket.poll(spare=1) == pytest.approx(1.0)
+    assert bucket.poll() == 0
+    # Nothing was held while the speculative caller waited
+    assert bucket.poll() == pytest.approx(1.0)
+
+
+def test_limiters_sharing_a_state_dir_share_the_rate(clock, tmp_path):
+    # One limiter per gunicorn worker, all pointing at the same directory
+    workers = [HostRateLimiter(rate=2, burst=2, state_dir=str(tmp_path)) for _ in range(3)]
+
+    waits = [limiter.reserve("https://genius.com/a") for limiter in workers]
+    waits.append(workers[0].reserve("https://genius.com/b"))
+
+    assert waits == [0, 0, pytest.approx(0.5), pytest.approx(1.0)]
+    assert workers[1].reserve("https://example.com/a") == 0
+
+
+def test_shared_bucket_from_before_a_reboot_starts_full(clock, tmp_path):
+    path = str(tmp_path / "genius.com.json")
+    SharedTokenBucket(path, rate=1).reserve()
+
+    clock[0] = 5.0
+
+    assert SharedTokenBucket(path, rate=1).reserve() == 0
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from tools import registry as registry_module
+from tools.registry import ToolRegistry
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tool_modules(tmp_path, monkeypatch):
+    """Importable throwaway modules: ``counted_tool`` takes a moment to import, ``broken_tool`` fails to."""
+    (tmp_path / "counted_tool.py").write_text("import time\ntime.sleep(0.05)\n")
+    (tmp_path / "broken_tool.py").write_text("raise ImportError('missing optional dependency')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ("counted_tool", "broken_tool"):
+        sys.modules.pop(name, None)
+
+
+def test_tool_is_imported_on_first_use(tool_modules):
+    tools = ToolRegistry({"counted": "counted_tool"})
+
+    assert "counted_tool" not in sys.modules
+    module = tools.tool("counted")
+
+    assert module is sys.modules["counted_tool"]
+    assert tools.tool("counted") is module
+    assert tools.report()["tools"]["counted"]["loaded"] is True
+
+
+def test_concurrent_first_uses_import_once(tool_modules, monkeypatch):
+    imports = []
+    real_import = registry_module.importlib.import_module
+    monkeypatch.setattr(registry_module.importlib, "import_module", lambda name: imports.append(name) or real_import(name))
+    tools = ToolRegistry({"counted": "counted_tool"})
+
+    threads = [threading.Thread(target=tools.tool, args=("counted",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert imports == ["counted_tool"]
+
+
+def test_unknown_tool_raises_key_error():
+    with pytest.raises(KeyError):
+        ToolRegistry({}).tool("lyrics")
+
+
+def test_warm_up_skips_a_broken_tool(tool_modules):
+    tools = ToolRegistry({"broken": "broken_tool", "counted": "counted_tool"})
+
+    tools.warm_up()
+
+    report = tools.report()["tools"]
+    assert report["broken"] == {"loaded": False, "module": "broken_tool"}
+    assert report["counted"]["loaded"] is True
+    assert report["counted"]["import_seconds"] >= 0.05
+
+
+@pytest.mark.parametrize("warmup, expected", [("", set()), ("counted", {"counted"}), ("all", {"counted", "other"})])
+def test_warm_up_from_env(tool_modules, monkeypatch, warmup, expected):
+    monkeypatch.setattr(registry_module, "WARMUP", warmup)
+    tools = ToolRegistry({"counted": "counted_tool", "other": "json"})
+
+    tools.warm_up_from_env()
+
+    assert {name for name, tool in tools.report()["tools"].items() if tool["loaded"]} == expected
+
+
+def test_app_starts_without_the_heavy_tools():
+    script = ("import json, sys, app; "
+              "print(json.dumps([name for name in ('tools.get_lyrics', 'tools.duckduckgo_search', "
+              "'tools.instagram_jobs', 'selenium') if name in sys.modules]))")
+
+    completed = subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, capture_output=True, text=True,
+                               check=True)
+
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == []
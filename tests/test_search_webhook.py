@@ -0,0 +1,38 @@
+import json
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_search_returns_a_list(client, fake_ddgs):
+    response = client.post("/webhook/search", json={"query": "q", "max_results": 3})
+
+    assert response.status_code == 200
+    assert [r["title"] for r in response.get_json()] == ["r0", "r1", "r2"]
+
+
+def test_search_requires_a_query(client, fake_ddgs):
+    assert client.post("/webhook/search", json={"max_results": 3}).status_code == 400
+
+
+def test_streamed_search_is_ndjson(client, fake_ddgs):
+    response = client.post("/webhook/search", json={"query": "q", "max_results": 15, "stream": True})
+
+    assert response.mimetype == "application/x-ndjson"
+    assert [r["title"] for r in ndjson(response)] == [f"r{i}" for i in range(15)]
+
+
+def test_stop_after_ends_the_stream_early(client, fake_ddgs):
+    response = client.post("/webhook/search", json={"query": "q", "max_results": 25, "stop_after": 4, "stream": True})
+
+    assert len(ndjson(response)) == 4
+    assert [call[2] for call in fake_ddgs.calls] == [1]
+
+
+def test_stream_reports_errors_in_band(client, fake_ddgs, monkeypatch):
+    monkeypatch.setattr(fake_ddgs, "total", 0)
+
+    lines = ndjson(client.post("/webhook/search", json={"query": "q", "max_results": 5, "stream": True}))
+
+    assert list(lines[-1]) == ["error"]
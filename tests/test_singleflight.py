@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from tools.singleflight import SingleFlight
+
+
+def lead(flight, key, result):
+    """Start a leader for ``key`` that runs until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def fn():
+        started.set()
+        release.wait()
+        return result
+
+    thread = threading.Thread(target=flight.do, args=(key, fn))
+    thread.start()
+    started.wait()
+    return release, thread
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    release, thread = lead(flight, "k", "shared")
+    results = []
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", lambda: "own")))
+    follower.start()
+
+    release.set()
+    follower.join()
+    thread.join()
+
+    assert results == ["shared"]
+
+
+def test_follower_gives_up_after_its_timeout():
+    flight = SingleFlight()
+    release, thread = lead(flight, "k", "shared")
+
+    try:
+        with pytest.raises(TimeoutError):
+            flight.do("k", lambda: "own", timeout=0.05)
+    finally:
+        release.set()
+        thread.join()
+
+    assert flight.do("k", lambda: "own") == "own"
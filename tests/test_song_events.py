@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from tools import song_events, song_history_store
+from tools.simple_song_history import save_song_history_from_webhook
+from tools.song_events import EventLog, SnapshotDiffer
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+def presence(events):
+    return [(event["type"], event["user"]) for event in events
+            if event["type"] in ("user_appeared", "user_disappeared")]
+
+
+@pytest.fixture
+def event_log(store, tmp_path, monkeypatch):
+    """Save through the webhook path into each backend, with events in a fresh log."""
+    monkeypatch.setattr(song_history_store, "_store", store)
+    log = EventLog(str(tmp_path / "song_events.db"))
+    monkeypatch.setattr(song_events, "_event_log", log)
+    return log
+
+
+def test_snapshot_diff_reports_presence():
+    differ = SnapshotDiffer()
+    differ.snapshot_users = {"alice", "bob"}
+
+    differ.observe({"alice": None, "carol": None}, {"alice": [note("One", "A")], "carol": []}, "t", snapshot=True)
+
+    assert presence(differ.events) == [("user_appeared", "carol"), ("user_disappeared", "bob")]
+    assert differ.snapshot_users == {"alice", "carol"}
+
+
+def test_plain_payload_leaves_presence_alone():
+    differ = SnapshotDiffer()
+    differ.snapshot_users = {"alice", "bob"}
+    state = {"current-played": "", "known-songs": set(), "known-notes": set()}
+
+    differ.observe({"alice": state}, {"alice": [note("One", "A")]}, "t")
+
+    assert presence(differ.events) == []
+    assert [event["type"] for event in differ.events] == ["new_song", "current_song_changed"]
+    assert differ.snapshot_users == {"alice", "bob"}
+
+
+def test_saved_snapshots_are_diffed_against_each_other(event_log):
+    save_song_history_from_webhook({"users": {"alice": [note("One", "A")], "bob": []}, "snapshot": True})
+    save_song_history_from_webhook({"users": {"alice": [note("One", "A", "hi")]}, "snapshot": True})
+
+    events = event_log.read()["events"]
+    assert presence(events) == [("user_appeared", "alice"), ("user_appeared", "bob"), ("user_disappeared", "bob")]
+    assert [event["type"] for event in events if event["user"] == "alice"][-1] == "new_note"
+    assert event_log.snapshot_users() == ["alice"]
+
+
+def test_partial_payload_does_not_make_users_disappear(event_log):
+    save_song_history_from_webhook({"users": {"alice": [], "bob": []}, "snapshot": True})
+    save_song_history_from_webhook({"users": {"alice": [note("One", "A")]}, "partial": True})
+
+    assert presence(event_log.read()["events"]) == [("user_appeared", "alice"), ("user_appeared", "bob")]
+    assert event_log.snapshot_users() == ["alice", "bob"]
+
+
+def test_concurrent_snapshots_are_diffed_in_order(event_log):
+    save_song_history_from_webhook({"users": {"alice": [], "bob": []}, "snapshot": True})
+
+    def save(users):
+        save_song_history_from_webhook({"users": {user: [] for user in users}, "snapshot": True})
+
+    threads = [threading.Thread(target=save, args=(["alice"] if n % 2 else ["alice", "bob"],)) for n in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each save sees the snapshot the one before it recorded, so bob's events alternate
+    bob = [kind for kind, user in presence(event_log.read(limit=500)["events"]) if user == "bob"]
+    assert all(first != second for first, second in zip(bob, bob[1:]))
+
+
+def test_empty_snapshot_makes_everyone_disappear(event_log):
+    save_song_history_from_webhook({"users": {"alice": [note("One", "A")]}, "snapshot": True})
+
+    assert save_song_history_from_webhook({"users": {}, "snapshot": True})
+
+    assert presence(event_log.read()["events"])[-1] == ("user_disappeared", "alice")
+    assert event_log.snapshot_users() == []
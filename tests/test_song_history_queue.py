@@ -0,0 +1,86 @@
+import pytest
+
+from tools import song_history_queue as queue
+from tools import song_history_store
+from tools.simple_song_history import validate_payload
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+@pytest.fixture
+def song_queue(tmp_path, monkeypatch):
+    """The queue files on tmp_path, a JSON store behind them and no background flusher."""
+    queue_file = str(tmp_path / "song_note_queue.jsonl")
+    monkeypatch.setattr(queue, "QUEUE_FILE", queue_file)
+    monkeypatch.setattr(queue, "PROCESSING_FILE", f"{queue_file}.processing")
+    monkeypatch.setattr(queue, "ATTEMPTS_FILE", f"{queue_file}.processing.attempts")
+    monkeypatch.setattr(queue, "QUEUE_LOCK_FILE", f"{queue_file}.lock")
+    monkeypatch.setattr(queue, "FLUSH_LOCK_FILE", f"{queue_file}.flush.lock")
+    monkeypatch.setattr(queue, "STATE_FILE", str(tmp_path / "song_note_queue_state.json"))
+    monkeypatch.setattr(queue, "DEAD_LETTER_FILE", str(tmp_path / "song_note_queue.dead.jsonl"))
+    monkeypatch.setattr(queue, "MAX_FLUSH_ATTEMPTS", 2)
+    monkeypatch.setattr(queue, "start_flusher", lambda: None)
+    store = song_history_store.JsonHistoryStore(str(tmp_path / "songs_data.json"))
+    monkeypatch.setattr(song_history_store, "_store", store)
+    return store
+
+
+@pytest.mark.parametrize("payload", [
+    {"alice": [{"song": 1, "artist": "A"}]},
+    {"alice": [{"song": "One", "artist": ["A"]}]},
+    {"alice": [{"song": "One", "artist": "A", "note": {"text": "hi"}}]},
+    {"alice": [{"song": "One"}]},
+    {"alice": "One by A"},
+    [],
+])
+def test_malformed_payloads_are_rejected(payload):
+    assert validate_payload(payload) is not None
+
+
+def test_valid_payload_passes():
+    assert validate_payload({"alice": [note("One", "A", "hi"), {"song": "", "artist": "", "note": None}]}) is None
+
+
+def test_queued_payloads_are_flushed_in_one_write(song_queue):
+    queue.enqueue({"alice": [note("One", "A")]})
+    queue.enqueue({"alice": [note("Two", "A")]})
+
+    assert queue.flush() == 2
+    assert song_queue.export_data()["users"]["alice"]["songs-played"] == ["One by A", "Two by A"]
+    assert queue.queue_status()["depth"] == 0
+
+
+def test_failed_flush_keeps_the_batch(song_queue, monkeypatch):
+    monkeypatch.setattr(queue, "save_song_history_batch", lambda batch: False)
+    queue.enqueue({"alice": [note("One", "A")]})
+
+    assert queue.flush() == 0
+    assert queue.queue_status()["depth"] == 1
+
+
+def test_batch_that_keeps_failing_is_dead_lettered(song_queue, monkeypatch):
+    def save(batch):
+        # One poisoned payload fails the whole batch
+        if any("mallory" in payload for payload, _ in batch):
+            return False
+        song_queue.save_payloads(batch)
+        return True
+
+    monkeypatch.setattr(queue, "save_song_history_batch", save)
+    queue.enqueue({"alice": [note("One", "A")]})
+    queue.enqueue({"mallory": [note("Bad", "X")]})
+    queue.enqueue({"bob": [note("Two", "B")]})
+
+    assert queue.flush() == 0
+    assert queue.flush() == 2
+
+    status = queue.queue_status()
+    assert status["depth"] == 0
+    assert status["dead_letters"] == 1
+    assert set(song_queue.export_data()["users"]) == {"alice", "bob"}
+
+    # The next batch starts its attempts from scratch
+    queue.enqueue({"carol": [note("Three", "C")]})
+    assert queue.flush() == 1
@@ -0,0 +1,117 @@
+import threading
+
+from tools import song_history_store
+from tools.song_history_store import JsonHistoryStore, SqliteHistoryStore
+
+
+def note(song, artist, text=""):
+    return {"song": song, "artist": artist, "note": text}
+
+
+class RecordingObserver:
+    def __init__(self):
+        self.calls = []
+        self.states = []
+
+    def begin(self):
+        self.calls.append("begin")
+
+    def observe(self, states, users, seen_at, snapshot):
+        self.calls.append(("observe", sorted(users), snapshot))
+        self.states.append(states)
+
+    def finish(self):
+        self.calls.append("finish")
+
+
+def test_payloads_are_merged_without_duplicates(store):
+    store.save_payload({"alice": [note("Stay With Me", "Sam Smith", "on repeat")]})
+    store.save_payload({"alice": [note("Stay With Me", "Sam Smith", "on repeat"), note("Hello", "Adele")],
+                        "bob": [note("", "", "gym time")]})
+
+    users = store.export_data()["users"]
+
+    assert users["alice"]["songs-played"] == ["Stay With Me by Sam Smith", "Hello by Adele"]
+    assert users["alice"]["current-played"] == "Hello by Adele"
+    assert users["alice"]["notes"] == ["on repeat"]
+    assert users["bob"]["notes"] == ["gym time"]
+
+
+def test_batch_is_applied_in_order(store):
+    store.save_payloads([({"alice": [note("One", "A")]}, "2026-01-01T10:00:00"),
+                         ({"alice": [note("Two", "A")]}, "2026-01-01T11:00:00"),
+                         ({"alice": [note("One", "A")]}, "2026-01-01T12:00:00")])
+
+    songs = {row["song"]: row for row in store.songs_played("alice")["items"]}
+
+    assert songs["One by A"]["plays"] == 2
+    assert songs["One by A"]["first-seen"] == "2026-01-01T10:00:00"
+    assert songs["One by A"]["last-seen"] == "2026-01-01T12:00:00"
+    assert songs["Two by A"]["plays"] == 1
+
+
+def test_concurrent_saves_lose_nothing(store):
+    def save(user):
+        for index in range(10):
+            store.save_payload({user: [note(f"Song {index}", "A")]})
+
+    threads = [threading.Thread(target=save, args=(f"user{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    users = store.export_data()["users"]
+    assert all(len(users[f"user{n}"]["songs-played"]) == 10 for n in range(4))
+
+
+def test_json_history_imports_into_sqlite(tmp_path):
+    source = JsonHistoryStore(str(tmp_path / "songs_data.json"))
+    source.save_payloads([({"alice": [note("One", "A", "hi")], "bob": [note("Two", "B")]}, "2026-01-01T10:00:00")])
+    target = SqliteHistoryStore(str(tmp_path / "songs_data.db"))
+
+    target.import_data(source.export_data())
+
+    assert target.export_data() == source.export_data()
+
+
+def test_json_index_is_built_once_across_saves(tmp_path, monkeypatch):
+    built = []
+    original = song_history_store.UserHistoryIndex.__init__
+    monkeypatch.setattr(song_history_store.UserHistoryIndex, "__init__",
+                        lambda self, entry: built.append(entry) or original(self, entry))
+    store = JsonHistoryStore(str(tmp_path / "songs_data.json"))
+    observer = RecordingObserver()
+
+    store.save_payload({"alice": [note("One", "A")]})
+    store.save_payloads([({"alice": [note("One", "A")]}, None)], observer=observer)
+
+    assert len(built) == 1
+    assert observer.states == [{"alice": {"current-played": "One by A", "known-songs": {"One by A"},
+                                          "known-notes": set()}}]
+
+
+def test_json_index_is_reloaded_after_an_outside_write(tmp_path):
+    path = str(tmp_path / "songs_data.json")
+    store = JsonHistoryStore(path)
+    store.save_payload({"alice": [note("One", "A")]})
+
+    JsonHistoryStore(path).save_payload({"alice": [note("Two", "A")]})
+    store.save_payload({"alice": [note("Three", "A")]})
+
+    assert store.export_data()["users"]["alice"]["songs-played"] == ["One by A", "Two by A", "Three by A"]
+
+
+def test_observer_sees_each_payload_and_its_snapshot_flag(store):
+    observer = RecordingObserver()
+
+    store.save_payloads([({"users": {"alice": [note("One", "A")]}, "snapshot": True}, None),
+                         ({"bob": [note("Two", "B")]}, None)], observer=observer)
+
+    assert observer.calls == ["begin", ("observe", ["alice"], True), ("observe", ["bob"], False), "finish"]
+    assert set(store.export_data()["users"]) == {"alice", "bob"}
+
+
+def test_save_returns_the_songs_new_to_each_user(store):
+    assert store.save_payload({"alice": [note("One", "A"), note("", "", "just a note")]}) == [("A", "One"), ("", "")]
+    assert store.save_payloads([({"alice": [note("One", "A")], "bob": [note("One", "A")]}, None)]) == [("A", "One")]
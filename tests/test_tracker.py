@@ -0,0 +1,114 @@
+import pytest
+
+import friends_song_note_tracker as tracker
+
+NOTES = {"alice": [{"user": "alice", "song": "Stay With Me", "artist": "Sam Smith", "note": ""}]}
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """run_once against a canned scrape, recording what gets saved."""
+    scraped = [dict(NOTES)]
+    saved = []
+    monkeypatch.setattr(tracker, "scrape_sessions", lambda use_pool=False: dict(scraped[0]))
+    monkeypatch.setattr(tracker, "save_song_history_from_webhook", lambda data: saved.append(data) or True)
+
+    def run_once(state):
+        return tracker.run_once(state)
+
+    run_once.scraped = scraped
+    run_once.saved = saved
+    return run_once
+
+
+def test_snapshot_hash_ignores_key_order():
+    assert tracker.snapshot_hash({"a": 1, "b": 2}) == tracker.snapshot_hash({"b": 2, "a": 1})
+
+
+@pytest.mark.parametrize("changed, expected", [(True, 1000), (False, 3000), (None, 2000)])
+def test_interval_adapts_to_changes(changed, expected, monkeypatch):
+    monkeypatch.setattr(tracker, "MIN_INTERVAL", 100)
+    monkeypatch.setattr(tracker, "MAX_INTERVAL", 10000)
+
+    assert tracker.next_interval(2000, changed) == expected
+
+
+def test_interval_stays_within_bounds(monkeypatch):
+    monkeypatch.setattr(tracker, "MIN_INTERVAL", 900)
+    monkeypatch.setattr(tracker, "MAX_INTERVAL", 3600)
+
+    assert tracker.next_interval(1000, True) == 900
+    assert tracker.next_interval(3000, False) == 3600
+
+
+def test_jitter_spreads_around_the_interval(monkeypatch):
+    monkeypatch.setattr(tracker, "JITTER", 0.1)
+
+    assert all(900 <= tracker.with_jitter(1000) <= 1100 for _ in range(50))
+
+
+def test_unchanged_snapshot_is_not_saved(run):
+    state = {"last_hash": None}
+
+    assert run(state) is True
+    assert run(state) is False
+    assert run.saved == [{"users": NOTES, "snapshot": True}]
+
+
+def test_changed_snapshot_is_saved(run):
+    state = {"last_hash": None}
+    run(state)
+    run.scraped[0] = {"alice": [{**NOTES["alice"][0], "note": "on repeat"}]}
+
+    assert run(state) is True
+    assert len(run.saved) == 2
+
+
+def test_failed_scrape_keeps_the_interval(run):
+    run.scraped[0] = {"error": "login failed"}
+
+    assert run({"last_hash": None}) is None
+    assert run.saved == []
+
+
+def test_state_survives_a_restart(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracker, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(tracker, "STATE_FILE", str(tmp_path / "tracker_state.json"))
+
+    assert tracker.load_state()["last_hash"] is None
+    tracker.save_state({"last_hash": "abc", "interval": 1234})
+
+    assert tracker.load_state() == {"last_hash": "abc", "interval": 1234}
+
+
+def test_partial_scrape_is_not_saved_as_a_snapshot(run):
+    run.scraped[0] = {"users": NOTES, "partial": True}
+
+    run({"last_hash": None})
+
+    assert run.saved == [{"users": NOTES, "snapshot": False}]
+
+
+def test_partial_scrape_doesnt_become_the_last_snapshot(run):
+    state = {"last_hash": None}
+    run.scraped[0] = {"users": NOTES, "partial": True}
+    assert run(state) is None
+
+    run.scraped[0] = dict(NOTES)
+
+    assert run(state) is True
+    assert run.saved[-1] == {"users": NOTES, "snapshot": True}
+
+
+def test_empty_inbox_is_saved_as_an_empty_snapshot(run):
+    state = {"last_hash": None}
+    run(state)
+    run.scraped[0] = {"message": "No song notes found."}
+
+    assert run(state) is True
+    assert run.saved[-1] == {"users": {}, "snapshot": True}
+    assert state["last_hash"] == tracker.snapshot_hash({})
+    assert run(state) is False
+
+    run.scraped[0] = dict(NOTES)
+    assert run(state) is True
@@ -0,0 +1,125 @@
+import os
+import time
+
+import pytest
+
+from tools.webdriver_pool import MemoryLimitExceeded, WebDriverPool, memory_limit
+
+
+class FakeDriver:
+    def __init__(self, healthy=True, pid=None):
+        self.healthy = healthy
+        self.quit_calls = 0
+        self.service = type("Service", (), {"process": type("Process", (), {"pid": pid})()})()
+
+    def execute_script(self, script):
+        if not self.healthy:
+            raise RuntimeError("browser is gone")
+        return 1
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault("max_rss_mb", 0)
+        pool = WebDriverPool(FakeDriver, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def test_drivers_are_reused(pool):
+    drivers = pool(size=1)
+
+    with drivers.driver() as first:
+        first.bootstrapped = True
+    with drivers.driver() as second:
+        pass
+
+    assert second is first
+    assert second.uses == 2
+
+
+def test_driver_is_discarded_when_the_block_raises(pool):
+    drivers = pool(size=1)
+
+    with pytest.raises(ValueError):
+        with drivers.driver() as broken:
+            raise ValueError("scrape failed")
+    with drivers.driver() as replacement:
+        pass
+
+    assert replacement is not broken
+    assert broken.driver.quit_calls == 1
+
+
+def test_driver_is_recycled_after_max_uses(pool):
+    drivers = pool(size=1, max_uses=2)
+    seen = []
+    for _ in range(3):
+        with drivers.driver() as pooled:
+            seen.append(pooled)
+
+    assert seen[0] is seen[1] and seen[2] is not seen[0]
+    assert seen[0].driver.quit_calls == 1
+
+
+def test_unhealthy_idle_driver_is_replaced(pool):
+    drivers = pool(size=1)
+    with drivers.driver() as first:
+        pass
+    first.driver.healthy = False
+
+    with drivers.driver() as second:
+        pass
+
+    assert second is not first
+
+
+def test_acquire_times_out_when_every_driver_is_busy(pool):
+    drivers = pool(size=1)
+    busy = drivers.acquire()
+
+    with pytest.raises(TimeoutError):
+        drivers.acquire(timeout=0.05)
+    drivers.release(busy)
+
+
+def test_shutdown_quits_idle_drivers_and_refuses_new_ones(pool):
+    drivers = pool(size=2)
+    with drivers.driver() as pooled:
+        pass
+
+    drivers.shutdown()
+
+    assert pooled.driver.quit_calls == 1
+    with pytest.raises(RuntimeError):
+        drivers.acquire()
+
+
+def test_memory_limit_quits_the_browser(monkeypatch):
+    monkeypatch.setattr("tools.webdriver_pool.process_tree_rss_mb", lambda pid: 2048.0)
+    driver = FakeDriver(pid=os.getpid())
+
+    with pytest.raises(MemoryLimitExceeded):
+        with memory_limit(driver, 1024, interval=0.01):
+            time.sleep(0.1)
+
+    assert driver.quit_calls == 1
+
+
+def test_memory_limit_of_zero_disables_the_watchdog():
+    driver = FakeDriver(pid=os.getpid())
+
+    with memory_limit(driver, 0):
+        pass
+
+    assert driver.quit_calls == 0
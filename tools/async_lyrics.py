@@ -0,0 +1,262 @@
+"""
+Genius lyrics lookups on asyncio, for the aiohttp serving mode (async_app.py).
+
+AsyncLyricsClient wraps a LyricsScraper: URL candidates, validation, the
+lyrics cache and the per-host rate limiter are the scraper's, only the HTTP
+fetches go through aiohttp. Candidate URLs are probed concurrently on the
+event loop instead of on a thread pool, and HTML parsing, which is CPU-bound,
+runs on a small bounded executor so it doesn't stall other requests.
+"""
+import asyncio
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from tools.deadline import Deadline, remaining_timeout
+from tools.get_lyrics import NOT_FOUND_STATUSES, PROBE_POLL_INTERVAL, TransientFetchError
+from tools.metrics import cache_result, timed
+
+logger = logging.getLogger(__name__)
+
+ASYNC_PARSE_WORKERS = int(os.getenv("ASYNC_PARSE_WORKERS", 2))
+# Simultaneous connections to Genius per process; the rate limiter still spaces the requests out
+ASYNC_LYRICS_CONNECTIONS = int(os.getenv("ASYNC_LYRICS_CONNECTIONS", 16))
+
+
+class AsyncLyricsClient:
+    def __init__(self, scraper, parse_executor: Optional[ThreadPoolExecutor] = None,
+                 connections: int = ASYNC_LYRICS_CONNECTIONS):
+        """
+        Args:
+            scraper: The LyricsScraper providing URLs, parsing, cache and rate limiter
+            parse_executor: Executor for HTML parsing and cache access; a private one is created otherwise
+            connections: Connection limit of the aiohttp session
+        """
+        self.scraper = scraper
+        self.connections = connections
+        self._owns_executor = parse_executor is None
+        self.executor = parse_executor or ThreadPoolExecutor(max_workers=ASYNC_PARSE_WORKERS,
+                                                             thread_name_prefix="lyrics-parse")
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=self.scraper.timeout),
+                headers={'User-Agent': self.scraper.session.headers.get('User-Agent', '')},
+            )
+        return self._session
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def get_lyrics_from_url(self, url: str, deadline: Optional[Deadline] = None) -> Optional[str]:
+        """Async counterpart of LyricsScraper.get_lyrics_from_url."""
+        try:
+            return await self._fetch_lyrics(url, deadline)
+        except TransientFetchError as e:
+            logger.error(f"Request failed: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return None
+
+    async def _fetch_lyrics(self, url: str, deadline: Optional[Deadline] = None,
+                            speculative: Optional[Callable[[], int]] = None) -> Optional[str]:
+        """Async counterpart of LyricsScraper._fetch_lyrics; raises TransientFetchError the same way."""
+        logger.debug("Fetching lyrics from: %s", url, extra={"sample": "genius_fetch"})
+        if speculative is None:
+            wait = self.scraper.rate_limiter.reserve(url, None if deadline is None else deadline.remaining())
+            if wait is None:
+                deadline.mark_partial("lyrics", "Genius rate limit wait exceeds the remaining budget")
+                return None
+            if wait:
+                await asyncio.sleep(wait)
+        elif not await self._wait_for_turn(url, deadline, speculative):
+            return None
+        timeout = aiohttp.ClientTimeout(total=remaining_timeout(deadline, self.scraper.timeout))
+        try:
+            with timed("tool_phase_seconds", phase="genius_fetch"):
+                async with self._get_session().get(url, timeout=timeout) as response:
+                    status = response.status
+                    html = await response.text() if status < 400 else None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if deadline is not None and deadline.expired:
+                deadline.mark_partial("lyrics", f"request to {url} failed ({e!r})")
+                return None
+            raise TransientFetchError(f"request to {url} failed: {e!r}") from e
+        if status in NOT_FOUND_STATUSES:
+            logger.info(f"No Genius page at {url}")
+            return None
+        if status >= 400:
+            raise TransientFetchError(f"{url} answered HTTP {status}")
+
+        with timed("tool_phase_seconds", phase="genius_parse"):
+            return await self._run(self.scraper.extract_lyrics, html)
+
+    async def _wait_for_turn(self, url: str, deadline: Optional[Deadline],
+                             speculative: Callable[[], int]) -> bool:
+        """
+        Async counterpart of LyricsScraper._wait_for_turn: no token is held while
+        waiting, so a probe task cancelled in the meantime costs nothing.
+        """
+        while True:
+            spare = self.scraper.spare_tokens(speculative())
+            wait = self.scraper.rate_limiter.poll(url, spare)
+            if not wait:
+                return True
+            if not spare and deadline is not None and wait > deadline.remaining():
+                deadline.mark_partial("lyrics", "Genius rate limit wait exceeds the remaining budget")
+                return False
+            await asyncio.sleep(min(wait, PROBE_POLL_INTERVAL))
+
+    async def _probe(self, url: str, deadline: Optional[Deadline] = None,
+                     speculative: Optional[Callable[[], int]] = None) -> Tuple[Optional[str], bool]:
+        """Fetch one candidate URL. Returns (lyrics, transient failure)."""
+        try:
+            return await self._fetch_lyrics(url, deadline, speculative), False
+        except TransientFetchError as e:
+            logger.warning(f"Request failed: {e}")
+            return None, True
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return None, False
+
+    async def get_lyrics(self, artist: str, song_name: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Async counterpart of LyricsScraper.get_lyrics, sharing its cache."""
+        error, clean_artist, clean_song = self.scraper.prepare_lookup(artist, song_name)
+        if error:
+            return error
+
+        cache = self.scraper.cache
+        if cache is not None:
+            cached = await self._run(cache.get, clean_artist, clean_song)
+            cache_result("lyrics", cached is not None)
+            if cached is not None:
+                logger.info(f"Lyrics cache hit for {clean_artist}/{clean_song}")
+                return cached
+
+        urls = self.scraper.candidate_urls(artist, song_name)
+        if self.scraper.parallel and len(urls) > 1:
+            url, lyrics, transient = await self._probe_parallel(urls, deadline)
+        else:
+            url, lyrics, transient = await self._probe_sequential(urls, deadline)
+        result = self.scraper.lyrics_result(artist, song_name, urls, url, lyrics,
+                                            deadline is not None and deadline.partial, transient)
+
+        await self._run(self.scraper.remember, clean_artist, clean_song, result)
+        return result
+
+    async def _probe_sequential(self, urls: List[str],
+                                deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[str], bool]:
+        transient = False
+        for index, url in enumerate(urls):
+            if deadline is not None and not deadline.check("lyrics"):
+                break
+            if index:
+                logger.info(f"Trying alternative URL format: {url}")
+            lyrics, failed = await self._probe(url, deadline)
+            transient = transient or failed
+            if lyrics:
+                return url, lyrics, False
+        return None, None, transient
+
+    async def _probe_parallel(self, urls: List[str],
+                              deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Fetch all candidate URLs at once and return the best-ranked one with lyrics,
+        ranked the same way as LyricsScraper._probe_parallel.
+        """
+        tasks: List[asyncio.Future] = []
+        for index, url in enumerate(urls):
+            earlier = tasks[:index]
+            tasks.append(asyncio.ensure_future(
+                self._probe(url, deadline, lambda earlier=earlier: sum(not task.done() for task in earlier))))
+        pending = set(tasks)
+        transient = False
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=None if deadline is None else deadline.remaining(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    deadline.mark_partial("lyrics", f"{len(pending)} candidate URLs still loading")
+                    return None, None, transient
+                # Candidates ranked below a hit can't win any more
+                for index, task in enumerate(tasks):
+                    if task in done and not task.cancelled() and task.result()[0]:
+                        for later in tasks[index + 1:]:
+                            later.cancel()
+                        pending.difference_update(tasks[index + 1:])
+                        break
+                transient = False
+                for index, task in enumerate(tasks):
+                    if not task.done():
+                        break
+                    lyrics, failed = task.result() if not task.cancelled() else (None, False)
+                    transient = transient or failed
+                    if lyrics:
+                        return urls[index], lyrics, False
+            return None, None, transient
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _get_batch_item_lyrics(self, item: Any, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        if not isinstance(item, dict) or 'artists' not in item or 'song_name' not in item:
+            return {"error": "Missing artists or song_name parameter"}
+        try:
+            return await self.get_lyrics(item['artists'], item['song_name'], None if deadline is None else deadline.child())
+        except Exception as e:
+            logger.error(f"Batch item failed: {e}", exc_info=True)
+            return {"error": str(e)}
+
+    async def iter_lyrics_batch(self, items: List[Any], concurrency: int,
+                                deadline: Optional[Deadline] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Yield (index, result) in completion order, resolving at most ``concurrency`` songs at a time.
+        Items still unresolved when the deadline runs out are yielded with a partial error.
+        """
+        if not items:
+            return
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(index, item):
+            async with semaphore:
+                return index, await self._get_batch_item_lyrics(item, deadline)
+
+        logger.info(f"Resolving lyrics batch of {len(items)} items with concurrency {concurrency}")
+        tasks = [asyncio.ensure_future(one(index, item)) for index, item in enumerate(items)]
+        unresolved = set(range(len(items)))
+        try:
+            try:
+                for next_done in asyncio.as_completed(tasks, timeout=None if deadline is None else deadline.remaining()):
+                    index, result = await next_done
+                    unresolved.discard(index)
+                    yield index, result
+            except asyncio.TimeoutError:
+                deadline.mark_partial("lyrics_batch", f"{len(unresolved)} of {len(items)} items unresolved")
+                for index in sorted(unresolved):
+                    yield index, {"error": "Deadline reached before this item was resolved", "partial": True}
+        finally:
+            # The consumer may stop early (e.g. a streaming client disconnected)
+            for task in tasks:
+                task.cancel()
+
+    async def get_lyrics_batch(self, items: List[Any], concurrency: int,
+                               deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = [{} for _ in items]
+        async for index, result in self.iter_lyrics_batch(items, concurrency, deadline):
+            results[index] = result
+        return results
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
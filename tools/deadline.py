@@ -0,0 +1,125 @@
+"""
+Per-request deadline budgets.
+
+A caller with a hard timeout of its own sends the budget it can still wait,
+in seconds, as the "X-Request-Deadline" header or the "deadline" payload
+field. The tools turn the remaining budget into the timeouts of their
+upstream calls (DDGS, Genius requests, rate limiter waits, driver pool,
+page loads and WebDriverWait) and, once it is spent, stop and return what
+they have so far. Such results carry "partial": true; Instagram notes, a
+mapping of usernames, come as {"users": {...}, "partial": true} so the flag
+never sits among the usernames (see partial_result).
+
+DEADLINE_MARGIN seconds are kept back from every budget for building and
+sending the response.
+"""
+import os
+import time
+import logging
+from typing import Optional
+
+from tools import metrics
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "X-Request-Deadline"
+DEADLINE_FIELD = "deadline"
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN", 0.25))
+DEADLINE_MAX = float(os.getenv("DEADLINE_MAX", 600))
+# Upstream calls get at least this long, so a nearly spent budget doesn't turn into "no timeout"
+MIN_TIMEOUT = 0.05
+
+
+class Deadline:
+    """The time left for one request, shared by every thread working on it."""
+
+    def __init__(self, budget: float, parent: Optional["Deadline"] = None):
+        """
+        Args:
+            budget: Seconds from now until the caller stops waiting
+            parent: Deadline this one was derived from, see child()
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget if parent is None else parent.expires_at
+        self.partial = False
+        self._parent = parent
+
+    def child(self) -> "Deadline":
+        """Same expiry, but its own partial flag: for one item of a batch. Marking it also marks this one."""
+        return Deadline(self.budget, parent=self)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, default: Optional[float] = None) -> float:
+        """``default`` capped to the remaining budget, for use as an upstream timeout."""
+        remaining = max(self.remaining(), MIN_TIMEOUT)
+        return remaining if default is None else min(default, remaining)
+
+    def mark_partial(self, tool: str, reason: str = "deadline reached"):
+        """Record that ``tool`` stopped early; the response will be marked partial."""
+        if self.partial:
+            return
+        logger.info(f"{tool}: {reason} after {self.budget - self.remaining():.2f}s of a {self.budget:.2f}s budget, "
+                    f"returning partial results")
+        metrics.inc("deadline_exceeded_total", tool=tool)
+        self.partial = True
+        if self._parent is not None:
+            self._parent.partial = True
+
+    def check(self, tool: str) -> bool:
+        """True while there is budget left; marks the result partial otherwise."""
+        if self.expired:
+            self.mark_partial(tool)
+            return False
+        return True
+
+
+def partial_result(data: dict) -> dict:
+    """
+    Mark a result partial. A mapping of users to their notes is wrapped in a
+    {"users": ..., "partial": True} envelope, which /webhook/song_note accepts;
+    errors, messages and envelopes just get the flag.
+    """
+    if "error" in data or "message" in data or isinstance(data.get("users"), dict):
+        return {**data, "partial": True}
+    return {"users": data, "partial": True}
+
+
+def split_partial(data: dict):
+    """The inverse of partial_result: returns (data without the envelope and flag, partial)."""
+    partial = bool(data.get("partial"))
+    if isinstance(data.get("users"), dict):
+        return data["users"], partial
+    return {key: value for key, value in data.items() if key != "partial"}, partial
+
+
+def remaining_timeout(deadline: Optional[Deadline], default: Optional[float]) -> Optional[float]:
+    """``default``, capped to the remaining budget when there is a deadline."""
+    return default if deadline is None else deadline.timeout(default)
+
+
+def parse_deadline(header_value=None, payload_value=None) -> Optional[Deadline]:
+    """
+    Build the Deadline of a request from its header or payload value (the payload wins).
+
+    Returns:
+        None when the request carries no deadline
+
+    Raises:
+        ValueError: if the value isn't a positive number of seconds
+    """
+    value = payload_value if payload_value is not None else header_value
+    if value is None or value == "":
+        return None
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        budget = None
+    if budget is None or not budget > 0:
+        raise ValueError(f"Deadline must be a positive number of seconds, got {value!r}")
+    return Deadline(max(min(budget, DEADLINE_MAX) - DEADLINE_MARGIN, MIN_TIMEOUT))
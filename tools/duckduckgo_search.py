@@ -1,17 +1,194 @@
 from ddgs import DDGS
+from ddgs.exceptions import DDGSException
+from collections import OrderedDict
+import os
+import re
+import threading
+import time
+from typing import Iterator, Optional
 import logging
 
+from tools.deadline import Deadline, remaining_timeout
+from tools.metrics import cache_result, timed
+from tools.singleflight import SingleFlight
+
 logger = logging.getLogger(__name__)
 
-def search(query, max_results: int):
+CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 300))
+CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 512))
+STREAM_PAGE_SIZE = int(os.getenv("SEARCH_STREAM_PAGE_SIZE", 10))
+# Timeout of DDGS' upstream requests; a request deadline can only shorten it
+DDGS_TIMEOUT = float(os.getenv("SEARCH_DDGS_TIMEOUT", 5))
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case the query and collapse whitespace so trivially different queries share a cache entry."""
+    return re.sub(r'\s+', ' ', str(query)).strip().lower()
+
+
+class SearchCache:
     """
-    This function performs a DuckDuckGo search and returns the results.
+    In-process TTL cache of search results.
+
+    Only the largest result set per query is kept: it also answers requests for
+    fewer results, and when DDGS returned fewer results than asked for, it is
+    known to be complete and answers larger requests as well.
     """
-    logging.info(f"Search with query: {query}")
+
+    def __init__(self, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str, max_results: int):
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                return None
+            fetched_for, results, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[query]
+                return None
+            if max_results > fetched_for and len(results) >= fetched_for:
+                # Cached set was cut off at its own max_results, it can't answer a bigger request
+                return None
+            self._entries.move_to_end(query)
+            return results[:max_results]
+
+    def set(self, query: str, max_results: int, results: list):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None and entry[0] > max_results and entry[2] > time.monotonic():
+                return
+            self._entries[query] = (max_results, list(results), time.monotonic() + self.ttl)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = SearchCache()
+_inflight = SingleFlight()
+
+
+def _search_live(query, max_results: int):
     results = []
-    with DDGS() as ddgs:
+    with timed("tool_phase_seconds", phase="ddgs_query"), DDGS(timeout=DDGS_TIMEOUT) as ddgs:
         for r in ddgs.text(query, max_results=max_results):
             results.append(r)
-
     return results
 
+
+def search(query, max_results: int, deadline: Optional[Deadline] = None):
+    """
+    This function performs a DuckDuckGo search and returns the results.
+    Recent results are served from cache, and concurrent identical searches
+    share a single upstream query.
+
+    With a deadline, results are fetched page by page and whatever was found
+    when it runs out is returned (deadline.partial is set in that case).
+    """
+    if deadline is not None:
+        return list(iter_search(query, max_results, deadline=deadline))
+
+    logging.info(f"Search with query: {query}")
+    key = normalize_query(query)
+
+    cached = _cache.get(key, max_results)
+    cache_result("search", cached is not None)
+    if cached is not None:
+        logger.info(f"Search cache hit for {key!r}")
+        return list(cached)
+
+    def run():
+        results = _search_live(query, max_results)
+        _cache.set(key, max_results, results)
+        return results
+
+    return list(_inflight.do((key, max_results), run))
+
+
+def iter_search(query, max_results: int, stop_after: Optional[int] = None,
+                time_budget: Optional[float] = None, deadline: Optional[Deadline] = None) -> Iterator[dict]:
+    """
+    Yield search results as soon as they are available.
+
+    Results are requested from DDGS one page at a time, so the first page can
+    be used while later pages are still loading.
+
+    Args:
+        query: The search query
+        max_results: Maximum number of results to yield
+        stop_after: Stop after this many results (early termination)
+        time_budget: Don't request another page once this many seconds have passed
+        deadline: Request deadline; bounds DDGS' timeout and the wait for a page
+            another stream is already fetching, and no page is requested once it
+            is reached (the results so far are then marked partial)
+    """
+    logging.info(f"Streaming search with query: {query}")
+    key = normalize_query(query)
+    limit = min(max_results, stop_after) if stop_after else max_results
+    if limit <= 0:
+        return
+
+    cached = _cache.get(key, limit)
+    cache_result("search", cached is not None)
+    if cached is not None:
+        logger.info(f"Search cache hit for {key!r}")
+        yield from cached
+        return
+
+    started = time.monotonic()
+    seen = set()
+    collected = []
+    exhausted = False
+    page = 1
+    while len(collected) < limit:
+        if time_budget is not None and time.monotonic() - started >= time_budget:
+            logger.info(f"Search time budget of {time_budget}s spent after {len(collected)} results")
+            break
+        if deadline is not None and not deadline.check("search"):
+            break
+        def fetch_page(page=page):
+            # A client per page, so each page's timeout is capped to what is left of the deadline
+            with timed("tool_phase_seconds", phase="ddgs_page"), \
+                    DDGS(timeout=remaining_timeout(deadline, DDGS_TIMEOUT)) as ddgs:
+                return list(ddgs.text(query, max_results=STREAM_PAGE_SIZE, page=page))
+
+        try:
+            # Concurrent streams of the same query share each page's upstream request
+            page_results = _inflight.do((key, page, STREAM_PAGE_SIZE), fetch_page,
+                                        None if deadline is None else deadline.remaining())
+        except TimeoutError:
+            if deadline is None:
+                raise
+            deadline.mark_partial("search", f"page {page} still loading for another request")
+            break
+        except DDGSException as e:
+            if deadline is not None and deadline.expired:
+                # Most likely the shortened timeout; keep what the earlier pages found
+                deadline.mark_partial("search", f"page {page} failed ({e})")
+                break
+            if collected:
+                # DDGS raises when a page comes back empty
+                logger.info(f"No more search results after page {page - 1}: {e}")
+                exhausted = True
+                break
+            raise
+        new_results = [r for r in page_results if r.get('href') not in seen]
+        if not new_results:
+            exhausted = True
+            break
+        for r in new_results:
+            seen.add(r.get('href'))
+            collected.append(r)
+            yield r
+            if len(collected) >= limit:
+                break
+        page += 1
+
+    if len(collected) >= limit or exhausted:
+        # Complete for this limit (or for any limit, when DDGS ran out of results)
+        _cache.set(key, limit if not exhausted else max(limit, len(collected) + 1), collected)
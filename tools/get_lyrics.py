@@ -1,33 +1,140 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import html as lxml_html
+import os
 import re
-import time
+import threading
 from urllib.parse import quote
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError, wait, as_completed
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List, Tuple
 import logging
 from fake_useragent import UserAgent
+from tools.deadline import Deadline, remaining_timeout
+from tools.lyrics_cache import DATA_DIR, LyricsCache, get_default_cache
+from tools.lyrics_index import LyricsIndex, get_default_index
+from tools.metrics import cache_result, timed
+from tools.rate_limit import HostRateLimiter
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Connection pool and politeness settings shared by every scraper in a worker
+POOL_CONNECTIONS = int(os.getenv("LYRICS_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(os.getenv("LYRICS_POOL_MAXSIZE", 16))
+# Overridable so benchmarks can point the scraper at a local stand-in
+GENIUS_BASE_URL = os.getenv("GENIUS_BASE_URL", "https://genius.com").rstrip("/")
+GENIUS_RATE_PER_SEC = float(os.getenv("GENIUS_RATE_PER_SEC", 1 / 1.5))
+GENIUS_BURST = float(os.getenv("GENIUS_BURST", 2))
+# The Genius rate holds for all worker processes together: their buckets live here ("" keeps them per process)
+GENIUS_RATE_STATE_DIR = os.getenv("GENIUS_RATE_STATE_DIR", os.path.join(DATA_DIR, 'rate_limits'))
+PARALLEL_PROBE = os.getenv("LYRICS_PARALLEL_PROBE", "1") == "1"
+PROBE_WORKERS = int(os.getenv("LYRICS_PROBE_WORKERS", 8))
+# How often a probe waiting for the rate limiter checks whether it has been cancelled or moved up
+PROBE_POLL_INTERVAL = float(os.getenv("LYRICS_PROBE_POLL_INTERVAL", 0.1))
+LYRICS_PARSER = os.getenv("LYRICS_PARSER", "lxml")
+BATCH_MAX_CONCURRENCY = int(os.getenv("LYRICS_BATCH_MAX_CONCURRENCY", 8))
+BATCH_MAX_ITEMS = int(os.getenv("LYRICS_BATCH_MAX_ITEMS", 100))
+
+# Genius answers these for pages that don't exist; any other failure says nothing about the song
+NOT_FOUND_STATUSES = (404, 410)
+
+LYRICS_CONTAINER_STRAINER = SoupStrainer('div', attrs={'data-lyrics-container': 'true'})
+
+# XPath equivalents of the BeautifulSoup selectors, tried in the same order
+LXML_SELECTORS = [
+    "//div[@data-lyrics-container='true']",
+    "//div[contains(@class, 'lyrics')]",
+    "//div[contains(@class, 'Lyrics')]",
+]
+
+
+# Candidate generators turn an (artist, song) pair into alternative pairs whose
+# Genius slugs are worth probing. Register new ones with register_candidate_generator.
+CandidateGenerator = Callable[[str, str], Iterable[Tuple[str, str]]]
+
+def strip_featured_artists(artist: str, song_name: str) -> Iterable[Tuple[str, str]]:
+    """Drop "feat. X" / "ft. X" / "(with X)" parts and keep only the lead artist."""
+    # A bare "with" is part of plenty of titles ("Stay With Me"), so it only counts inside brackets
+    featured = re.compile(r'\s*(?:[\(\[]\s*(?:feat\.?|ft\.?|featuring|with)\s+[^\)\]]*[\)\]]'
+                          r'|\b(?:feat\.?|ft\.?|featuring)\s+[^\(\)\[\]]*?(?=\s*[\(\[]|$))', re.IGNORECASE)
+    lead_artist = re.split(r'\s*[,&]\s*', featured.sub('', artist), maxsplit=1)[0]
+    yield lead_artist.strip(), featured.sub('', song_name).strip()
+
+def strip_leading_the(artist: str, song_name: str) -> Iterable[Tuple[str, str]]:
+    """Try the artist without a leading "The"."""
+    yield re.sub(r'^the\s+', '', artist, flags=re.IGNORECASE), song_name
+
+def strip_remix_suffix(artist: str, song_name: str) -> Iterable[Tuple[str, str]]:
+    """Drop " - Remastered 2011", "(Remix)", "(Live)" style suffixes from the song name."""
+    suffix = re.compile(r'\s*(?:-\s*|[\(\[])[^\(\[]*\b(?:remix|remaster(?:ed)?|live|version|edit|mix)\b[^\)\]]*[\)\]]?\s*$', re.IGNORECASE)
+    yield artist, suffix.sub('', song_name)
+
+CANDIDATE_GENERATORS: List[CandidateGenerator] = [
+    strip_featured_artists,
+    strip_remix_suffix,
+    strip_leading_the,
+]
+
+def register_candidate_generator(generator: CandidateGenerator):
+    """Add a slug variant generator. Variants are probed after the built-in ones."""
+    CANDIDATE_GENERATORS.append(generator)
+
+
+class TransientFetchError(Exception):
+    """Genius didn't give a usable answer (timeout, connection error, 429, 5xx); the page may well exist."""
+
+
+def create_session() -> requests.Session:
+    """Create a requests session with a connection pool sized for concurrent lyrics fetches."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        'User-Agent': UserAgent().random
+    })
+    return session
+
+
 class LyricsScraper:
-    def __init__(self, timeout: int = 10, delay: float = 1.5):
+    def __init__(self, timeout: int = 10, delay: float = 1.5, cache: Optional[LyricsCache] = None,
+                 session: Optional[requests.Session] = None, rate_limiter: Optional[HostRateLimiter] = None,
+                 parallel: bool = PARALLEL_PROBE, parser: str = LYRICS_PARSER,
+                 index: Optional[LyricsIndex] = None):
         """
         Initialize the lyrics scraper.
         
         Args:
             timeout: Request timeout in seconds
-            delay: Delay between requests to be respectful
+            delay: Minimum spacing between requests to the same host once the burst is spent,
+                used when no rate_limiter is given
+            cache: Optional cache consulted before scraping and filled afterwards
+            session: Optional shared session; a new pooled session is created otherwise
+            rate_limiter: Optional shared per-host rate limiter
+            parallel: Fetch all candidate URLs concurrently instead of one after the other
+            parser: Extraction engine, 'lxml' (fast path) or 'soup' (legacy BeautifulSoup walk)
+            index: Optional full-text index every retrieved lyrics text is added to;
+                with a cache too, pages the cache evicts are dropped from it
         """
         self.timeout = timeout
         self.delay = delay
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': UserAgent.random
-        })
+        self.cache = cache
+        self._owns_session = session is None
+        self.session = session if session is not None else create_session()
+        if rate_limiter is None:
+            rate_limiter = HostRateLimiter(1 / delay if delay > 0 else 0)
+        self.rate_limiter = rate_limiter
+        self.parallel = parallel
+        self.parser = parser
+        self.index = index
+        if cache is not None and index is not None:
+            # The index holds what the cache remembered, so it forgets what the cache drops
+            cache.on_evict = index.remove
+        self._probe_executor = None
+        self._executor_lock = threading.Lock()
     
-    def _clean_text_for_url(self, text: str) -> str:
+    @staticmethod
+    def _clean_text_for_url(text: str) -> str:
         """Clean and format text for use in URLs."""
         # Remove special characters and replace spaces with hyphens
         cleaned = re.sub(r'[^\w\s-]', '', text.lower())
@@ -78,22 +185,15 @@ class LyricsScraper:
         
         return '\n'.join(non_empty_lines)
     
-    def get_lyrics_from_url(self, url: str) -> Optional[str]:
-        """
-        Extract lyrics from a given Genius URL.
+    def _extract_with_soup(self, html: str) -> List[str]:
+        """Extract the text of every lyrics container with BeautifulSoup (legacy engine)."""
+        # Only build the tree for the lyrics containers; the full page is parsed
+        # only when Genius' data attribute is missing and the class selectors are needed
+        soup = BeautifulSoup(html, 'html.parser', parse_only=LYRICS_CONTAINER_STRAINER)
+        lyrics_containers = soup.select("div[data-lyrics-container='true']")
         
-        Args:
-            url: The Genius URL to scrape
-            
-        Returns:
-            The lyrics text or None if not found
-        """
-        try:
-            logger.info(f"Fetching lyrics from: {url}")
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
+        if not lyrics_containers:
+            soup = BeautifulSoup(html, 'html.parser')
             
             # Try multiple selectors as Genius may change their structure
             selectors = [
@@ -102,73 +202,263 @@ class LyricsScraper:
                 "div[class*='Lyrics']"
             ]
             
-            lyrics_containers = []
             for selector in selectors:
                 lyrics_containers = soup.select(selector)
                 if lyrics_containers:
                     break
+        
+        return [self._extract_lyrics_content(container) for container in lyrics_containers]
+    
+    def _extract_with_lxml(self, html: str) -> List[str]:
+        """Extract the text of every lyrics container with lxml's C parser and an iterative walk."""
+        tree = lxml_html.fromstring(html)
+        
+        lyrics_containers = []
+        for xpath in LXML_SELECTORS:
+            lyrics_containers = tree.xpath(xpath)
+            if lyrics_containers:
+                break
+        
+        return [self._extract_lyrics_content_iterative(container) for container in lyrics_containers]
+    
+    @staticmethod
+    def _extract_lyrics_content_iterative(lyrics_container) -> str:
+        """
+        Same output as _extract_lyrics_content for an lxml element, using an
+        explicit stack instead of recursion.
+        """
+        lyrics_parts = []
+        stack = [lyrics_container]
+        
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                text = node.strip()
+                if text:
+                    lyrics_parts.append(text)
+                continue
+            if not isinstance(node.tag, str):
+                # Comments and processing instructions carry no lyrics
+                continue
+            if node.tag == 'br' and node is not lyrics_container:
+                lyrics_parts.append('\n')
+                continue
             
-            if not lyrics_containers:
-                logger.warning("No lyrics containers found on the page")
-                return None
-            
-            # Extract and combine lyrics from all containers
-            all_lyrics = []
-            for container in lyrics_containers:
-                lyrics_content = self._extract_lyrics_content(container)
-                if lyrics_content:
-                    all_lyrics.append(lyrics_content)
-            
-            if not all_lyrics:
-                logger.warning("No lyrics content found in containers")
-                return None
+            # Push text, children and their tails in reverse so they pop in document order
+            entries = []
+            if node.text:
+                entries.append(node.text)
+            for child in node:
+                entries.append(child)
+                if child.tail:
+                    entries.append(child.tail)
+            stack.extend(reversed(entries))
+        
+        return ''.join(lyrics_parts)
+    
+    def extract_lyrics(self, html: str) -> Optional[str]:
+        """
+        Extract and clean lyrics from a Genius page.
+        
+        The lxml engine is used unless parser='soup' was requested; if lxml
+        fails on a page the legacy BeautifulSoup extractor is used instead.
+        
+        Args:
+            html: The page HTML
             
-            combined_lyrics = '\n'.join(all_lyrics)
-            cleaned_lyrics = self._clean_lyrics(combined_lyrics)
+        Returns:
+            The lyrics text or None if not found
+        """
+        if self.parser == 'lxml':
+            try:
+                all_lyrics = self._extract_with_lxml(html)
+            except Exception as e:
+                logger.warning(f"lxml extraction failed, falling back to BeautifulSoup: {e}")
+                all_lyrics = self._extract_with_soup(html)
+        else:
+            all_lyrics = self._extract_with_soup(html)
+        
+        if not all_lyrics:
+            logger.warning("No lyrics containers found on the page")
+            return None
+        
+        # Combine lyrics from all containers
+        all_lyrics = [lyrics_content for lyrics_content in all_lyrics if lyrics_content]
+        
+        if not all_lyrics:
+            logger.warning("No lyrics content found in containers")
+            return None
+        
+        combined_lyrics = '\n'.join(all_lyrics)
+        cleaned_lyrics = self._clean_lyrics(combined_lyrics)
+        
+        if cleaned_lyrics:
+            logger.info("Successfully extracted lyrics")
+            return cleaned_lyrics
+        else:
+            logger.warning("Lyrics were empty after cleaning")
+            return None
+    
+    def get_lyrics_from_url(self, url: str, cancelled: Optional[threading.Event] = None,
+                            deadline: Optional[Deadline] = None) -> Optional[str]:
+        """
+        Extract lyrics from a given Genius URL.
+        
+        Args:
+            url: The Genius URL to scrape
+            cancelled: Optional event; when set before the request goes out, the fetch is skipped
+            deadline: Optional request deadline; caps the rate limiter wait and the request timeout
             
-            if cleaned_lyrics:
-                logger.info("Successfully extracted lyrics")
-                return cleaned_lyrics
-            else:
-                logger.warning("Lyrics were empty after cleaning")
-                return None
-                
-        except requests.RequestException as e:
+        Returns:
+            The lyrics text or None if not found
+        """
+        try:
+            return self._fetch_lyrics(url, cancelled, deadline)
+        except TransientFetchError as e:
             logger.error(f"Request failed: {e}")
             return None
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
             return None
     
-    def get_lyrics(self, artist: str, song_name: str) -> Dict[str, Any]:
+    def _fetch_lyrics(self, url: str, cancelled: Optional[threading.Event] = None,
+                      deadline: Optional[Deadline] = None,
+                      speculative: Optional[Callable[[], int]] = None) -> Optional[str]:
+        """
+        get_lyrics_from_url, but failures that say nothing about the page raise.
+
+        Args:
+            speculative: Optional count of better-ranked candidates still being
+                fetched; while there are any, this fetch only takes a spare token (see spare_tokens)
+
+        Returns:
+            The lyrics text, or None if the page doesn't exist or has no lyrics
+            (or the fetch was skipped)
+
+        Raises:
+            TransientFetchError: on timeouts, connection errors and HTTP errors other than 404/410
+        """
+        logger.debug("Fetching lyrics from: %s", url, extra={"sample": "genius_fetch"})
+        if cancelled is None:
+            if not self.rate_limiter.acquire(url, max_wait=None if deadline is None else deadline.remaining()):
+                deadline.mark_partial("lyrics", "Genius rate limit wait exceeds the remaining budget")
+                return None
+        elif not self._wait_for_turn(url, cancelled, deadline, speculative):
+            return None
+        try:
+            with timed("tool_phase_seconds", phase="genius_fetch"):
+                response = self.session.get(url, timeout=remaining_timeout(deadline, self.timeout))
+        except requests.RequestException as e:
+            if deadline is not None and deadline.expired:
+                deadline.mark_partial("lyrics", f"request to {url} failed ({e})")
+                return None
+            raise TransientFetchError(f"request to {url} failed: {e}") from e
+        if response.status_code in NOT_FOUND_STATUSES:
+            logger.info(f"No Genius page at {url}")
+            return None
+        if response.status_code >= 400:
+            raise TransientFetchError(f"{url} answered HTTP {response.status_code}")
+        
+        with timed("tool_phase_seconds", phase="genius_parse"):
+            return self.extract_lyrics(response.text)
+    
+    @staticmethod
+    def spare_tokens(better_pending: int) -> int:
+        """
+        Rate limiter tokens a speculative probe has to leave over: one for each
+        better-ranked candidate still loading, plus one for the next lookup.
+        """
+        return better_pending + 1 if better_pending else 0
+    
+    def _wait_for_turn(self, url: str, cancelled: threading.Event, deadline: Optional[Deadline] = None,
+                       speculative: Optional[Callable[[], int]] = None) -> bool:
+        """
+        Wait for a rate limiter token without holding one, so a probe cancelled
+        while it waits costs nothing. Returns False if the fetch should be skipped.
+        """
+        while True:
+            if cancelled.is_set():
+                logger.info(f"Skipping cancelled fetch: {url}")
+                return False
+            spare = self.spare_tokens(speculative() if speculative is not None else 0)
+            wait = self.rate_limiter.poll(url, spare)
+            if not wait:
+                return True
+            if not spare and deadline is not None and wait > deadline.remaining():
+                deadline.mark_partial("lyrics", "Genius rate limit wait exceeds the remaining budget")
+                return False
+            cancelled.wait(min(wait, PROBE_POLL_INTERVAL))
+    
+    def get_lyrics(self, artist: str, song_name: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         Get lyrics for a song by artist and song name.
         
         Args:
             artist: The artist name
             song_name: The song name
+            deadline: Optional request deadline; when it runs out before lyrics
+                are found, the error result is marked partial and not cached
             
         Returns:
             Dictionary with either 'lyrics' or 'error' key
         """
+        error, clean_artist, clean_song = self.prepare_lookup(artist, song_name)
+        if error:
+            return error
+        
+        if self.cache is not None:
+            cached = self.cache.get(clean_artist, clean_song)
+            cache_result("lyrics", cached is not None)
+            if cached is not None:
+                logger.info(f"Lyrics cache hit for {clean_artist}/{clean_song}")
+                return cached
+        
+        result = self._scrape_lyrics(artist, song_name, clean_artist, clean_song, deadline)
+        self.remember(clean_artist, clean_song, result)
+        return result
+    
+    def remember(self, clean_artist: str, clean_song: str, result: Dict[str, Any]):
+        """
+        Store a fresh lookup result in the cache and, if it has lyrics, in the full-text index.
+        Lookups cut short by a deadline or by a Genius hiccup aren't remembered, so the next one tries again.
+        """
+        if result.get("partial") or result.get("transient"):
+            return
+        if self.cache is not None:
+            self.cache.set(clean_artist, clean_song, result)
+        self.index_result(result)
+    
+    def index_result(self, result: Dict[str, Any]):
+        """Add a result's lyrics to the full-text index (a no-op for pages already indexed)."""
+        if self.index is not None and "lyrics" in result:
+            self.index.add(result["artist"], result["song"], result["url"], result["lyrics"])
+    
+    def prepare_lookup(self, artist: str, song_name: str) -> Tuple[Optional[Dict[str, Any]], str, str]:
+        """
+        Validate a lookup and build its cache key.
+
+        Returns:
+            (error, clean_artist, clean_song); error is the result to return when the input is unusable
+        """
         if not artist or not song_name:
-            return {"error": "Artist and song name are required"}
+            return {"error": "Artist and song name are required"}, "", ""
         
         # Clean and format the artist and song name for the URL
         clean_artist = self._clean_text_for_url(artist)
         clean_song = self._clean_text_for_url(song_name)
         
         if not clean_artist or not clean_song:
-            return {"error": "Unable to format artist or song name for URL"}
-        
-        # Construct the Genius URL
-        url = f"https://genius.com/{clean_artist}-{clean_song}-lyrics"
-        
-        # Add delay to be respectful to the server
-        time.sleep(self.delay)
-        
-        lyrics = self.get_lyrics_from_url(url)
-        
+            return {"error": "Unable to format artist or song name for URL"}, "", ""
+        return None, clean_artist, clean_song
+    
+    @staticmethod
+    def lyrics_result(artist: str, song_name: str, urls: List[str], url: Optional[str], lyrics: Optional[str],
+                      partial: bool = False, transient: bool = False) -> Dict[str, Any]:
+        """
+        The response for a lookup that probed ``urls`` and found ``lyrics`` at ``url`` (or nothing).
+        ``partial`` means the deadline ran out before every URL was tried, ``transient``
+        that some URL couldn't be fetched (see TransientFetchError).
+        """
         if lyrics:
             return {
                 "lyrics": lyrics,
@@ -176,49 +466,244 @@ class LyricsScraper:
                 "song": song_name,
                 "url": url
             }
-        else:
-            # Try alternative URL format if the first one fails
-            alt_url = f"https://genius.com/{quote(artist.lower())}-{quote(song_name.lower())}-lyrics"
-            logger.info(f"Trying alternative URL format: {alt_url}")
-            
-            time.sleep(self.delay)
-            lyrics = self.get_lyrics_from_url(alt_url)
-            
-            if lyrics:
-                return {
-                    "lyrics": lyrics,
-                    "artist": artist,
-                    "song": song_name,
-                    "url": alt_url
-                }
-            
+        
+        if partial:
             return {
-                "error": f"Could not find lyrics for '{song_name}' by '{artist}'. Tried URLs: {url}, {alt_url}"
+                "error": f"Deadline reached before lyrics for '{song_name}' by '{artist}' were found",
+                "partial": True
             }
+        
+        if transient:
+            return {
+                "error": f"Genius could not be reached for '{song_name}' by '{artist}', try again later",
+                "transient": True
+            }
+        
+        return {
+            "error": f"Could not find lyrics for '{song_name}' by '{artist}'. Tried URLs: {', '.join(urls)}"
+        }
+    
+    def candidate_urls(self, artist: str, song_name: str) -> List[str]:
+        """
+        Build the ordered, de-duplicated list of Genius URLs to try for a song.
+
+        The cleaned slug and the legacy quote()-based URL come first, followed by
+        slugs for every variant produced by CANDIDATE_GENERATORS.
+        """
+        urls = [
+            f"{GENIUS_BASE_URL}/{self._clean_text_for_url(artist)}-{self._clean_text_for_url(song_name)}-lyrics",
+            f"{GENIUS_BASE_URL}/{quote(artist.lower())}-{quote(song_name.lower())}-lyrics",
+        ]
+        for generator in CANDIDATE_GENERATORS:
+            try:
+                variants = list(generator(artist, song_name))
+            except Exception as e:
+                logger.warning(f"Candidate generator {getattr(generator, '__name__', generator)} failed: {e}")
+                continue
+            for variant_artist, variant_song in variants:
+                clean_artist = self._clean_text_for_url(variant_artist)
+                clean_song = self._clean_text_for_url(variant_song)
+                if clean_artist and clean_song:
+                    urls.append(f"{GENIUS_BASE_URL}/{clean_artist}-{clean_song}-lyrics")
+        return list(dict.fromkeys(urls))
+    
+    def _scrape_lyrics(self, artist: str, song_name: str, clean_artist: str, clean_song: str,
+                       deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+        """Scrape Genius for the lyrics, trying every candidate URL until one yields lyrics."""
+        urls = self.candidate_urls(artist, song_name)
+        
+        if self.parallel and len(urls) > 1:
+            url, lyrics, transient = self._probe_parallel(urls, deadline)
+        else:
+            url, lyrics, transient = self._probe_sequential(urls, deadline)
+        
+        return self.lyrics_result(artist, song_name, urls, url, lyrics,
+                                  deadline is not None and deadline.partial, transient)
+    
+    def _probe(self, url: str, cancelled: Optional[threading.Event] = None, deadline: Optional[Deadline] = None,
+               speculative: Optional[Callable[[], int]] = None) -> Tuple[Optional[str], bool]:
+        """Fetch one candidate URL. Returns (lyrics, transient failure)."""
+        try:
+            return self._fetch_lyrics(url, cancelled, deadline, speculative), False
+        except TransientFetchError as e:
+            logger.warning(f"Request failed: {e}")
+            return None, True
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return None, False
+    
+    def _probe_sequential(self, urls: List[str], deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[str], bool]:
+        """Try candidate URLs one after the other. Returns (url, lyrics, whether any fetch failed transiently)."""
+        transient = False
+        for index, url in enumerate(urls):
+            if deadline is not None and not deadline.check("lyrics"):
+                break
+            if index:
+                logger.info(f"Trying alternative URL format: {url}")
+            lyrics, failed = self._probe(url, deadline=deadline)
+            transient = transient or failed
+            if lyrics:
+                return url, lyrics, False
+        return None, None, transient
+    
+    def _probe_parallel(self, urls: List[str], deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Fetch all candidate URLs at once and return the best-ranked one that yields lyrics.
+
+        A candidate's lyrics are only accepted once every candidate ranked above it
+        has come back empty. Candidates ranked below a hit are cancelled, and while
+        better-ranked ones are still loading they only take spare rate limiter tokens.
+        """
+        cancels = [threading.Event() for _ in urls]
+        finished = [threading.Event() for _ in urls]
+
+        def probe(index: int, url: str) -> Tuple[Optional[str], bool]:
+            try:
+                result = self._probe(url, cancels[index], deadline,
+                                     lambda: sum(not event.is_set() for event in finished[:index]))
+                if result[0]:
+                    for cancel in cancels[index + 1:]:
+                        cancel.set()
+                return result
+            finally:
+                finished[index].set()
+
+        executor = self._get_probe_executor()
+        futures = [executor.submit(probe, index, url) for index, url in enumerate(urls)]
+        pending = set(futures)
+        transient = False
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=None if deadline is None else deadline.remaining(),
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    deadline.mark_partial("lyrics", f"{len(pending)} candidate URLs still loading")
+                    return None, None, transient
+                # Walk the candidates in rank order up to the first one still loading
+                transient = False
+                for index, future in enumerate(futures):
+                    if not future.done():
+                        break
+                    lyrics, failed = future.result() if not future.cancelled() else (None, False)
+                    transient = transient or failed
+                    if lyrics:
+                        return urls[index], lyrics, False
+            return None, None, transient
+        finally:
+            # Losing probes that haven't started are dropped, waiting ones stop before taking a token
+            for cancel in cancels:
+                cancel.set()
+            for future in pending:
+                future.cancel()
+    
+    def _get_probe_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._probe_executor is None:
+                self._probe_executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="lyrics-probe")
+            return self._probe_executor
     
     def close(self):
-        """Close the session."""
-        self.session.close()
+        """Close the session if this scraper created it."""
+        if self._probe_executor is not None:
+            self._probe_executor.shutdown(wait=False, cancel_futures=True)
+            self._probe_executor = None
+        if self._owns_session:
+            self.session.close()
+
+_shared_scraper = None
+_shared_scraper_pid = None
+_shared_scraper_lock = threading.Lock()
+
+def get_shared_scraper() -> LyricsScraper:
+    """
+    Return the long-lived scraper of the current worker process.
+
+    It keeps one pooled session and one per-host rate limiter, so keep-alive
+    connections are reused across webhook calls. The limiter's buckets are
+    files in GENIUS_RATE_STATE_DIR, so GENIUS_RATE_PER_SEC holds for all
+    worker processes together. A forked worker builds its
+    own instance instead of sharing sockets with its parent.
+    """
+    global _shared_scraper, _shared_scraper_pid
+    pid = os.getpid()
+    with _shared_scraper_lock:
+        if _shared_scraper is None or _shared_scraper_pid != pid:
+            _shared_scraper = LyricsScraper(
+                cache=get_default_cache(),
+                rate_limiter=HostRateLimiter(GENIUS_RATE_PER_SEC, GENIUS_BURST, GENIUS_RATE_STATE_DIR or None),
+                index=get_default_index(),
+            )
+            _shared_scraper_pid = pid
+        return _shared_scraper
 
 # Convenience functions for backward compatibility
 def get_lyrics_from_url(url: str) -> Optional[str]:
     """Legacy function for backward compatibility."""
-    scraper = LyricsScraper()
-    try:
-        return scraper.get_lyrics_from_url(url)
-    finally:
-        scraper.close()
+    return get_shared_scraper().get_lyrics_from_url(url)
 
-def get_lyrics(artist: str, song_name: str) -> Dict[str, Any]:
-    """Legacy function for backward compatibility."""
-    scraper = LyricsScraper()
+def get_lyrics(artist: str, song_name: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """Legacy function for backward compatibility. Results are served from the shared lyrics cache when possible."""
+    return get_shared_scraper().get_lyrics(artist, song_name, deadline)
+
+def _get_batch_item_lyrics(scraper: LyricsScraper, item: Any, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """Resolve one batch item, turning bad input or unexpected failures into a per-item error."""
+    if not isinstance(item, dict) or 'artists' not in item or 'song_name' not in item:
+        return {"error": "Missing artists or song_name parameter"}
     try:
-        return scraper.get_lyrics(artist, song_name)
-    finally:
-        scraper.close()
+        return scraper.get_lyrics(item['artists'], item['song_name'], None if deadline is None else deadline.child())
+    except Exception as e:
+        logger.error(f"Batch item failed: {e}", exc_info=True)
+        return {"error": str(e)}
+
+def iter_lyrics_batch(items: List[Any], concurrency: Optional[int] = None,
+                      deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Resolve lyrics for many songs concurrently.
+
+    Args:
+        items: List of {"artists": ..., "song_name": ...} dictionaries
+        concurrency: Number of songs resolved at the same time, capped at BATCH_MAX_CONCURRENCY
+        deadline: Optional request deadline; items still unresolved when it
+            runs out are yielded right away with a partial error
+
+    Yields:
+        (index, result) tuples in completion order. Politeness towards Genius is
+        still enforced by the shared per-host rate limiter.
+    """
+    if not items:
+        return
+    scraper = get_shared_scraper()
+    workers = max(1, min(concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY, len(items)))
+    logger.info(f"Resolving lyrics batch of {len(items)} items with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lyrics-batch") as executor:
+        futures = {executor.submit(_get_batch_item_lyrics, scraper, item, deadline): index
+                   for index, item in enumerate(items)}
+        unresolved = set(futures.values())
+        try:
+            try:
+                for future in as_completed(futures, timeout=None if deadline is None else deadline.remaining()):
+                    unresolved.discard(futures[future])
+                    yield futures[future], future.result()
+            except FuturesTimeoutError:
+                deadline.mark_partial("lyrics_batch", f"{len(unresolved)} of {len(items)} items unresolved")
+                for index in sorted(unresolved):
+                    yield index, {"error": "Deadline reached before this item was resolved", "partial": True}
+        finally:
+            # The consumer may stop early (e.g. a streaming client disconnected)
+            for future in futures:
+                future.cancel()
+
+def get_lyrics_batch(items: List[Any], concurrency: Optional[int] = None,
+                     deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+    """Resolve lyrics for many songs concurrently and return the results in input order."""
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    for index, result in iter_lyrics_batch(items, concurrency, deadline):
+        results[index] = result
+    return results
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     scraper = LyricsScraper()
     
     try:
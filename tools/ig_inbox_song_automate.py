@@ -3,13 +3,18 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from dotenv import load_dotenv
 from fake_useragent import UserAgent
 import os
 import time
+import threading
 import logging
 
+from tools.deadline import partial_result, remaining_timeout
+from tools.metrics import timed
+from tools.webdriver_pool import WebDriverPool, memory_limit
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -17,15 +22,43 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 session_id = os.getenv("SESSIONID")
 
-if not session_id or session_id == "your_session_id_here":
+SESSION_CONFIGURED = bool(session_id) and session_id != "your_session_id_here"
+if not SESSION_CONFIGURED and not os.getenv("IG_SESSIONS"):
+    # Only the Instagram scrape needs it; don't take the rest of the app down at import
     logging.error("Please set your SESSIONID in the .env file.")
-    exit()
 
-def get_song_data():
+POOL_SIZE = int(os.getenv("IG_DRIVER_POOL_SIZE", 1))
+POOL_MAX_USES = int(os.getenv("IG_DRIVER_MAX_USES", 50))
+POOL_MAX_RSS_MB = float(os.getenv("IG_DRIVER_MAX_RSS_MB", 1024))
+POOL_IDLE_TIMEOUT = float(os.getenv("IG_DRIVER_IDLE_TIMEOUT", 1800))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("IG_DRIVER_ACQUIRE_TIMEOUT", 120))
+# A warm browser already dismissed the notification popup, so don't wait long for it
+WARM_POPUP_WAIT = float(os.getenv("IG_WARM_POPUP_WAIT", 3))
+# Chrome's own default; a request deadline can only shorten it
+PAGE_LOAD_TIMEOUT = float(os.getenv("IG_PAGE_LOAD_TIMEOUT", 300))
+# Quit a browser whose process tree grows beyond this during a scrape (0 = no limit)
+CHROME_MAX_RSS_MB = float(os.getenv("IG_CHROME_MAX_RSS_MB", 0))
+
+EXTRACTION_MODE = os.getenv("IG_EXTRACTION_MODE", "script")
+# Inbox markup, overridable for when Instagram renames its classes
+NOTE_ITEM_CLASS = os.getenv("IG_NOTE_ITEM_CLASS", "_acaz")
+SONG_DIV_CLASS = os.getenv("IG_SONG_DIV_CLASS", "x6s0dn4 x78zum5 x1n2onr6")
+ARTIST_SPAN_CLASS = os.getenv("IG_ARTIST_SPAN_CLASS", "x1lliihq x6ikm8r x10wlt62 x1n2onr6 xlyipyv xuxw1ft x1roi4f4")
+NOTE_SPAN_CSS = os.getenv("IG_NOTE_SPAN_CSS", "span.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6")
+
+# Overridable so benchmarks can point the browser at a local copy of the inbox
+IG_BASE_URL = os.getenv("IG_BASE_URL", "https://www.instagram.com").rstrip("/")
+INSTAGRAM_URL = f"{IG_BASE_URL}/"
+INBOX_URL = f"{IG_BASE_URL}/direct/inbox/"
+# The session cookie only applies to Instagram's domain; elsewhere it is scoped to the current host
+COOKIE_DOMAIN = os.getenv("IG_COOKIE_DOMAIN", ".instagram.com" if "instagram.com" in IG_BASE_URL else "")
+
+@timed("tool_phase_seconds", phase="chrome_launch")
+def create_driver():
     logging.info("Initializing WebDriver...")
     # Initialize WebDriver
     chrome_options = Options()
-    chrome_options.add_argument(f'user-agent={UserAgent.random}')
+    chrome_options.add_argument(f'user-agent={UserAgent().random}')
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--disable-web-security")
     chrome_options.add_argument("--allow-running-insecure-content")
@@ -36,125 +69,311 @@ def get_song_data():
     chrome_options.add_argument('--window-size=1920,1080')
     driver = webdriver.Chrome(options=chrome_options)
     logging.info("WebDriver initialized.")
+    return driver
+
+@timed("tool_phase_seconds", phase="instagram_login")
+def login(driver, deadline=None, session=None):
+    logging.info("Navigating to instagram.com...")
+    # Go to instagram.com first
+    driver.set_page_load_timeout(remaining_timeout(deadline, PAGE_LOAD_TIMEOUT))
+    driver.get(INSTAGRAM_URL)
+    logging.info("Adding session cookie...")
+    # A warm browser may still be logged in to another account
+    driver.delete_all_cookies()
+    # Add sessionid cookie to log in
+    cookie = {
+        "name": "sessionid",
+        "value": session or session_id,
+    }
+    if COOKIE_DOMAIN:
+        cookie["domain"] = COOKIE_DOMAIN
+    driver.add_cookie(cookie)
 
+@timed("tool_phase_seconds", phase="inbox_navigation")
+def open_inbox(driver, popup_wait=30, deadline=None):
+    """
+    Open the inbox and wait for it. With a deadline, every wait is capped to
+    the remaining budget; once it is spent, whatever loaded so far is used.
+    """
+    logging.info("Navigating to inbox...")
+    # Go to the inbox
+    driver.set_page_load_timeout(remaining_timeout(deadline, PAGE_LOAD_TIMEOUT))
     try:
-        logging.info("Navigating to instagram.com...")
-        # Go to instagram.com first
-        driver.get("https://www.instagram.com/")
-        logging.info("Adding session cookie...")
-        # Add sessionid cookie to log in
-        driver.add_cookie({
-            "name": "sessionid",
-            "value": session_id,
-            "domain": ".instagram.com",
-        })
-
-        logging.info("Navigating to inbox...")
-        # Go to the inbox
-        driver.get("https://www.instagram.com/direct/inbox/")
-        wait = WebDriverWait(driver, 30)
-
-        # Handle "Turn on Notifications" popup
-        try:
-            not_now_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[text()='Not Now']")))
-            not_now_button.click()
-            logging.info("Dismissed notification popup.")
-            time.sleep(3) # Wait for inbox to load
-        except:
-            logging.info("No notification popup found or an error occurred.")
+        driver.get(INBOX_URL)
+    except TimeoutException:
+        if deadline is None or not deadline.expired:
+            raise
+        deadline.mark_partial("instagram", "inbox page still loading")
+        return
 
+    # Handle "Turn on Notifications" popup
+    try:
+        not_now_button = WebDriverWait(driver, remaining_timeout(deadline, popup_wait)).until(EC.element_to_be_clickable((By.XPATH, "//button[text()='Not Now']")))
+        not_now_button.click()
+        logging.info("Dismissed notification popup.")
+        time.sleep(remaining_timeout(deadline, 3)) # Wait for inbox to load
+    except:
+        logging.info("No notification popup found or an error occurred.")
 
-        wait.until(EC.url_contains("inbox"))
-        logging.info("Successfully navigated to Instagram inbox.")
+    try:
+        WebDriverWait(driver, remaining_timeout(deadline, 30)).until(EC.url_contains("inbox"))
+    except TimeoutException:
+        if deadline is None or not deadline.expired:
+            raise
+        deadline.mark_partial("instagram", "inbox not ready")
+        return
+    logging.info("Successfully navigated to Instagram inbox.")
 
-        results = []
+def _build_result(user_name, song_title, artist_name, note_text):
+    """Apply the song/note validity rules to the raw values read from one inbox entry."""
+    if song_title and (not song_title or song_title == artist_name):
+        song_title = None # Invalid song
 
-        logging.info("Searching for song notes...")
-        try:
-            song_notes = driver.find_elements(By.XPATH, "//li[contains(@class, '_acaz')]")
-            logging.info(f"Found {len(song_notes)} potential song notes.")
+    if not song_title and not note_text:
+        return None
+
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        log_message = f"Found for user {user_name}:"
+        if song_title:
+            log_message += f" song='{song_title}' by '{artist_name}'"
+        if note_text:
+            log_message += f" note='{note_text}'"
+        logging.debug(log_message, extra={"sample": "inbox_note"})
+
+    return {"user": user_name, "song": song_title or "", "artist": artist_name or "", "note": note_text}
 
-            for note in song_notes:
+def _pick_note_text(span_texts, artist_name):
+    for text in span_texts:
+        # The artist name is also in a span with similar classes, so we exclude it.
+        if text and text != artist_name:
+            return text
+    return ""
+
+def extract_notes_with_selectors(driver, deadline=None):
+    results = []
+
+    logging.info("Searching for song notes...")
+    try:
+        song_notes = driver.find_elements(By.XPATH, f"//li[contains(@class, '{NOTE_ITEM_CLASS}')]")
+        logging.info(f"Found {len(song_notes)} potential song notes.")
+
+        for note in song_notes:
+            # Every entry costs several WebDriver round trips; keep what we have once the budget is spent
+            if deadline is not None and not deadline.check("instagram"):
+                break
+            try:
+                # Get user name from img alt text
+                user_img = note.find_element(By.TAG_NAME, "img")
+                alt_text = user_img.get_attribute("alt")
+                # The alt text is usually "USERNAME's profile picture"
+                user_name = alt_text.split("'s profile picture")[0]
+
+                song_title = None
+                artist_name = None
                 try:
-                    # Get user name from img alt text
-                    user_img = note.find_element(By.TAG_NAME, "img")
-                    alt_text = user_img.get_attribute("alt")
-                    # The alt text is usually "USERNAME's profile picture"
-                    user_name = alt_text.split("'s profile picture")[0]
-
-                    song_title = None
-                    artist_name = None
-                    try:
-                        # Get song and artist
-                        song_div = note.find_element(By.XPATH, ".//div[@class='x6s0dn4 x78zum5 x1n2onr6']")
-                        song_title = song_div.text.strip()
-
-                        artist_span = note.find_element(By.XPATH, ".//span[@class='x1lliihq x6ikm8r x10wlt62 x1n2onr6 xlyipyv xuxw1ft x1roi4f4']")
-                        artist_name = artist_span.text.strip()
-                    except NoSuchElementException:
-                        pass # Not a song note
-
-                    # Get note
-                    note_text = ""
-                    try:
-                        # This selector is more flexible and finds spans that HAVE these classes, among others.
-                        potential_note_spans = note.find_elements(By.CSS_SELECTOR, "span.x1lliihq.x6ikm8r.x10wlt62.x1n2onr6")
-                        for span in potential_note_spans:
-                            text = span.text.strip()
-                            # The artist name is also in a span with similar classes, so we exclude it.
-                            if text and text != artist_name:
-                                note_text = text
-                                break
-                    except Exception:
-                        note_text = "" # Keep it safe
-
-                    if song_title and (not song_title or song_title == artist_name):
-                        song_title = None # Invalid song
-
-                    if not song_title and not note_text:
-                        continue
-
-                    result = {"user": user_name, "song": song_title or "", "artist": artist_name or "", "note": note_text}
-                    results.append(result)
-                    
-                    log_message = f"Found for user {user_name}:"
-                    if song_title:
-                        log_message += f" song='{song_title}' by '{artist_name}'"
-                    if note_text:
-                        log_message += f" note='{note_text}'"
-                    logging.info(log_message)
+                    # Get song and artist
+                    song_div = note.find_element(By.XPATH, f".//div[@class='{SONG_DIV_CLASS}']")
+                    song_title = song_div.text.strip()
 
+                    artist_span = note.find_element(By.XPATH, f".//span[@class='{ARTIST_SPAN_CLASS}']")
+                    artist_name = artist_span.text.strip()
                 except NoSuchElementException:
-                    # If an element is not found, it's likely not a song note, so skip it.
-                    continue
-                except Exception as e:
-                    logging.warning(f"Could not process a note: {e}")
-                    continue
+                    pass # Not a song note
+
+                # Get note
+                note_text = ""
+                try:
+                    # This selector is more flexible and finds spans that HAVE these classes, among others.
+                    potential_note_spans = note.find_elements(By.CSS_SELECTOR, NOTE_SPAN_CSS)
+                    note_text = _pick_note_text((span.text.strip() for span in potential_note_spans), artist_name)
+                except Exception:
+                    note_text = "" # Keep it safe
+
+                result = _build_result(user_name, song_title, artist_name, note_text)
+                if result:
+                    results.append(result)
 
+            except NoSuchElementException:
+                # If an element is not found, it's likely not a song note, so skip it.
+                continue
+            except Exception as e:
+                logging.warning(f"Could not process a note: {e}")
+                continue
+
+    except Exception as e:
+        logging.error(f"An error occurred while searching for songs: {e}")
+
+    return results
+
+# Collects the raw values of every inbox entry in one round trip; the
+# song/note rules are applied in Python so both extraction modes agree.
+EXTRACT_NOTES_SCRIPT = """
+const [itemClass, songClass, artistClass, noteCss] = arguments;
+const exact = (root, tag, cls) =>
+    Array.from(root.getElementsByTagName(tag)).find(el => el.getAttribute('class') === cls) || null;
+return Array.from(document.querySelectorAll(`li[class*='${itemClass}']`)).map(li => {
+    const img = li.querySelector('img');
+    if (!img) return null;
+    let song = null, artist = null;
+    const songDiv = exact(li, 'div', songClass);
+    if (songDiv) {
+        song = songDiv.innerText.trim();
+        const artistSpan = exact(li, 'span', artistClass);
+        if (artistSpan) artist = artistSpan.innerText.trim();
+    }
+    return {
+        alt: img.getAttribute('alt'),
+        song: song,
+        artist: artist,
+        spans: Array.from(li.querySelectorAll(noteCss)).map(span => span.innerText.trim()),
+    };
+});
+"""
+
+def extract_notes_with_script(driver):
+    logging.info("Searching for song notes with in-page script...")
+    entries = driver.execute_script(EXTRACT_NOTES_SCRIPT, NOTE_ITEM_CLASS, SONG_DIV_CLASS, ARTIST_SPAN_CLASS, NOTE_SPAN_CSS)
+    if not isinstance(entries, list):
+        raise ValueError(f"Unexpected script result: {entries!r}")
+    logging.info(f"Found {len(entries)} potential song notes.")
+
+    results = []
+    for entry in entries:
+        if not entry or entry.get("alt") is None:
+            continue
+        # The alt text is usually "USERNAME's profile picture"
+        user_name = entry["alt"].split("'s profile picture")[0]
+        artist_name = entry.get("artist")
+        note_text = _pick_note_text(entry.get("spans") or [], artist_name)
+        result = _build_result(user_name, entry.get("song"), artist_name, note_text)
+        if result:
+            results.append(result)
+    return results
+
+@timed("tool_phase_seconds", phase="note_extraction")
+def extract_notes(driver, mode=None, deadline=None):
+    """
+    Extract the notes shown in the inbox.
+
+    Args:
+        mode: 'script' collects every note with a single execute_script call and
+            falls back to the selectors on failure; 'selectors' walks each entry
+            with WebDriver lookups. Defaults to IG_EXTRACTION_MODE.
+        deadline: Optional request deadline; the selectors walk stops when it runs out
+    """
+    mode = mode or EXTRACTION_MODE
+    started = time.perf_counter()
+    if mode == "script":
+        try:
+            results = extract_notes_with_script(driver)
         except Exception as e:
-            logging.error(f"An error occurred while searching for songs: {e}")
+            logging.warning(f"In-page extraction failed, falling back to selectors: {e}")
+            mode = "selectors"
+            results = extract_notes_with_selectors(driver, deadline)
+    else:
+        results = extract_notes_with_selectors(driver, deadline)
+    logging.info(f"Extracted {len(results)} notes in {(time.perf_counter() - started) * 1000:.0f} ms using {mode} mode.")
+    return results
+
+def group_results(results):
+    # Process and print results
+    if results:
+        logging.info(f"Found {len(results)} songs. Grouping by user...")
+        grouped_results = {}
+        for result in results:
+            user = result["user"]
+            if user not in grouped_results:
+                grouped_results[user] = []
+            grouped_results[user].append(result)
 
+        logging.info("Finished processing all songs.")
+        return grouped_results
+    else:
+        logging.info("No song notes found.")
+        return {"message": "No song notes found."}
+
+_driver_pool = None
+_driver_pool_pid = None
+_driver_pool_lock = threading.Lock()
+
+def get_driver_pool():
+    """Return this process' pool of warm, logged-in browsers (a forked worker gets its own)."""
+    global _driver_pool, _driver_pool_pid
+    with _driver_pool_lock:
+        if _driver_pool is None or _driver_pool_pid != os.getpid():
+            _driver_pool = WebDriverPool(
+                create_driver,
+                size=POOL_SIZE,
+                max_uses=POOL_MAX_USES,
+                max_rss_mb=POOL_MAX_RSS_MB,
+                idle_timeout=POOL_IDLE_TIMEOUT,
+                name="instagram",
+            )
+            _driver_pool_pid = os.getpid()
+        return _driver_pool
+
+def _scrape_with_pool(deadline=None, session=None, max_rss_mb=0):
+    session = session or session_id
+    try:
+        with get_driver_pool().driver(timeout=remaining_timeout(deadline, POOL_ACQUIRE_TIMEOUT)) as pooled:
+            driver = pooled.driver
+            with memory_limit(driver, max_rss_mb, name="instagram"):
+                # bootstrapped holds the session the browser is logged in with
+                if pooled.bootstrapped != session:
+                    login(driver, deadline, session)
+                    open_inbox(driver, deadline=deadline)
+                    pooled.bootstrapped = session
+                else:
+                    logging.info("Reusing warm WebDriver, refreshing inbox...")
+                    open_inbox(driver, popup_wait=WARM_POPUP_WAIT, deadline=deadline)
+                return extract_notes(driver, deadline=deadline)
+    except TimeoutError:
+        # Only the pool raises the builtin TimeoutError (Selenium has its own TimeoutException)
+        if deadline is not None and deadline.expired:
+            deadline.mark_partial("instagram", "no browser became free")
+        raise
+
+def _scrape_cold(deadline=None, session=None, max_rss_mb=0):
+    driver = create_driver()
+    try:
+        with memory_limit(driver, max_rss_mb, name="instagram"):
+            login(driver, deadline, session)
+            open_inbox(driver, deadline=deadline)
+            return extract_notes(driver, deadline=deadline)
+    finally:
         driver.quit()
         logging.info("WebDriver quit.")
 
-        # Process and print results
-        if results:
-            logging.info(f"Found {len(results)} songs. Grouping by user...")
-            grouped_results = {}
-            for result in results:
-                user = result["user"]
-                if user not in grouped_results:
-                    grouped_results[user] = []
-                grouped_results[user].append(result)
-
-            logging.info("Finished processing all songs.")
-            return grouped_results
-        else:
-            logging.info("No song notes found.")
-            return {"message": "No song notes found."}
+def get_song_data(use_pool=None, deadline=None, session=None, max_rss_mb=None):
+    """
+    Scrape the song notes from the Instagram inbox, grouped by user.
+
+    Args:
+        use_pool: Reuse a warm browser from the driver pool. Defaults to True
+            unless IG_DRIVER_POOL_SIZE is 0; False launches and quits a fresh browser.
+        deadline: Optional request deadline (tools.deadline). Pool, page load and
+            wait timeouts are capped to what is left of it; when it runs out the
+            notes extracted so far are returned marked partial (tools.deadline.partial_result).
+        session: sessionid cookie of the account to scrape; defaults to SESSIONID.
+            tools.ig_sessions scrapes several accounts at once.
+        max_rss_mb: Quit the browser mid-scrape if it uses more memory than this.
+            Defaults to IG_CHROME_MAX_RSS_MB; 0 disables the limit.
+    """
+    if not session and not SESSION_CONFIGURED:
+        return {"error": "SESSIONID is not set, please set it in the .env file."}
+    if use_pool is None:
+        use_pool = POOL_SIZE > 0
+    if max_rss_mb is None:
+        max_rss_mb = CHROME_MAX_RSS_MB
+
+    try:
+        scrape = _scrape_with_pool if use_pool else _scrape_cold
+        data = group_results(scrape(deadline, session, max_rss_mb))
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
-        return {"error": str(e)}
-
+        data = {"error": str(e)}
 
+    if deadline is not None and deadline.partial:
+        data = partial_result(data)
+    return data
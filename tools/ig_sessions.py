@@ -0,0 +1,309 @@
+"""
+Scraping the inboxes of several Instagram accounts per cycle.
+
+One inbox only shows the notes of that account's friends, so IG_SESSIONS can
+list the sessionid cookies of every account we track, either as a JSON list
+of {"name": ..., "sessionid": ...} objects or as comma-separated sessionids.
+Without it, the single SESSIONID from .env is used and scraped in this
+process, as before.
+
+With several accounts, each one is scraped by get_song_data in one of
+IG_SESSION_WORKERS worker slots, processes with browsers of their own, and
+every browser is quit when its process tree grows beyond IG_SESSION_MAX_RSS_MB.
+Each account is pinned to one slot (see session_slots), so its warm browsers
+stay logged in to it instead of every process logging in to every account in
+turn. Every gunicorn worker (and the tracker) starts its own slot processes,
+but a slot scrapes only while holding a host-wide lock under DATA_DIR, so at
+most IG_SESSION_WORKERS scrapes run at once on the host. Idle warm browsers
+are still kept per process.
+The per-user results are merged into one payload, so the song history sees
+a single snapshot per cycle.
+"""
+import os
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+import multiprocessing
+from multiprocessing import util
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+from tools import metrics
+from tools.deadline import Deadline, MIN_TIMEOUT, partial_result, split_partial
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+
+# Scrapes running at once on the host, whatever the number of processes asking for them
+SESSION_WORKERS = int(os.getenv("IG_SESSION_WORKERS", 2))
+# Memory limit of each worker's browser process tree, enforced by a watchdog during the scrape
+SESSION_MAX_RSS_MB = float(os.getenv("IG_SESSION_MAX_RSS_MB", 1536))
+# "spawn" starts the workers without the threads and sockets of the gunicorn worker or tracker
+START_METHOD = os.getenv("IG_SESSION_START_METHOD", "spawn")
+# Kept back from a request deadline for the workers to send their notes back and for merging them
+RESULT_MARGIN = float(os.getenv("IG_SESSION_RESULT_MARGIN", 0.5))
+
+# Worker slot -> single-process pool; a slot always scrapes the same accounts
+_executors = {}
+_executors_pid = None
+_executor_lock = threading.Lock()
+
+
+def load_sessions(value=None):
+    """
+    Parse the session configs of IG_SESSIONS (or ``value``), falling back to SESSIONID.
+
+    Returns:
+        list: {"name", "sessionid"} dicts, empty if no session is configured
+
+    Raises:
+        ValueError: if an entry has no sessionid or two entries share a name
+    """
+    value = (os.getenv("IG_SESSIONS", "") if value is None else value).strip()
+    if not value:
+        session_id = os.getenv("SESSIONID")
+        if not session_id or session_id == "your_session_id_here":
+            return []
+        return [{"name": "default", "sessionid": session_id}]
+
+    if value.startswith("["):
+        configs = json.loads(value)
+    else:
+        configs = [item.strip() for item in value.split(",") if item.strip()]
+
+    sessions = []
+    for number, config in enumerate(configs, 1):
+        if isinstance(config, str):
+            config = {"sessionid": config}
+        if not isinstance(config, dict) or not config.get("sessionid"):
+            raise ValueError(f"Entry {number} needs a sessionid")
+        name = str(config.get("name") or f"session{number}")
+        if any(session["name"] == name for session in sessions):
+            raise ValueError(f"Session name '{name}' is used twice")
+        sessions.append({"name": name, "sessionid": config["sessionid"]})
+    return sessions
+
+
+def merge_song_data(results, partial=False):
+    """
+    Merge the grouped results of several accounts into one payload grouped by user.
+
+    A user who is friends with more than one of the accounts shows up in each
+    inbox; every distinct (song, artist, note) of theirs is kept once, in the
+    order first seen. Accounts whose scrape failed are left out and make the
+    payload partial; only when none succeeded is the result an error.
+
+    Args:
+        results (dict): get_song_data results by session name
+        partial (bool): Mark the payload partial regardless, e.g. after a deadline
+
+    Returns:
+        dict: The notes by user, an error or a message; partial payloads come in the
+        envelope of tools.deadline.partial_result
+    """
+    merged = {}
+    seen = {}
+    errors = {}
+    for name, data in results.items():
+        data, session_partial = split_partial(data)
+        partial = partial or session_partial
+        if "error" in data:
+            errors[name] = data["error"]
+            continue
+        for user, notes in data.items():
+            # Skips the "message" of an empty inbox
+            if not isinstance(notes, list):
+                continue
+            user_seen = seen.setdefault(user, set())
+            for note in notes:
+                key = (note.get("song"), note.get("artist"), note.get("note"))
+                if key not in user_seen:
+                    user_seen.add(key)
+                    merged.setdefault(user, []).append(note)
+
+    if errors:
+        logger.error(f"{len(errors)} of {len(results)} Instagram sessions failed: "
+                     + "; ".join(f"{name}: {error}" for name, error in errors.items()))
+    if not results:
+        data = {"error": "No Instagram session finished scraping in time"}
+    elif len(errors) == len(results):
+        data = {"error": "; ".join(f"{name}: {error}" for name, error in errors.items())}
+    elif merged:
+        logger.info(f"Merged notes of {len(merged)} users from {len(results) - len(errors)} Instagram sessions.")
+        data = merged
+    else:
+        data = {"message": "No song notes found."}
+
+    if partial or (errors and len(errors) < len(results)):
+        data = partial_result(data)
+    return data
+
+
+def _init_worker():
+    from logging_config import setup_logging
+    from tools.webdriver_pool import shutdown_all_pools
+    setup_logging()
+    # atexit doesn't run in forked workers; multiprocessing's own finalizers do, whatever the start method
+    util.Finalize(None, shutdown_all_pools, exitpriority=10)
+
+
+@contextmanager
+def _slot_lock(slot, timeout=None):
+    """
+    Host-wide lock of a worker slot, so the slot processes of every gunicorn
+    worker take turns. Yields False, without the lock, if it wasn't free
+    within ``timeout`` seconds.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(os.path.join(DATA_DIR, f"ig_session_slot{slot}.lock"), 'a') as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            give_up_at = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= give_up_at:
+                        yield False
+                        return
+                    time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _scrape_session(session, slot, use_pool, expires_at, max_rss_mb):
+    """Runs in a worker process: scrape one account's inbox once its slot is free."""
+    from tools.ig_inbox_song_automate import get_song_data
+    deadline = None
+    if expires_at is not None:
+        # time.monotonic() is system-wide on Linux, so the parent's expiry holds here
+        deadline = Deadline(max(expires_at - time.monotonic(), MIN_TIMEOUT))
+    with _slot_lock(slot, None if deadline is None else deadline.remaining()) as locked:
+        if not locked:
+            logger.warning(f"Slot {slot} stayed busy, Instagram session {session['name']} was not scraped.")
+            return partial_result({})
+        logger.info(f"Scraping Instagram session {session['name']}...")
+        return get_song_data(use_pool, deadline, session["sessionid"], max_rss_mb)
+
+
+def session_slots(sessions):
+    """
+    Assign every session to a worker slot, round robin over IG_SESSION_WORKERS.
+
+    Sessions sharing a slot are scraped one after the other by the same
+    process. The assignment only depends on the order of the configured
+    sessions, so an account lands in the same process every cycle.
+
+    Returns:
+        dict: session name -> slot number
+    """
+    workers = max(1, SESSION_WORKERS)
+    return {session["name"]: number % workers for number, session in enumerate(sessions)}
+
+
+def _get_executor(slot):
+    """Return the scraping process of ``slot`` in this process (a forked worker gets its own)."""
+    global _executors, _executors_pid
+    with _executor_lock:
+        if _executors_pid != os.getpid():
+            _executors = {}
+            _executors_pid = os.getpid()
+        executor = _executors.get(slot)
+        if executor is None:
+            executor = _executors[slot] = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context(START_METHOD),
+                initializer=_init_worker,
+            )
+        return executor
+
+
+def _discard_executor(slot, executor):
+    """Drop a slot whose process died, so the next cycle starts a fresh one."""
+    with _executor_lock:
+        if _executors.get(slot) is executor:
+            del _executors[slot]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_session_pool():
+    """Stop this process' scraping processes; they quit their browsers on the way out."""
+    global _executors
+    with _executor_lock:
+        executors, _executors = _executors, {}
+        if _executors_pid != os.getpid():
+            return
+    for executor in executors.values():
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_session_pool)
+
+
+def scrape_sessions(use_pool=None, deadline=None, sessions=None):
+    """
+    Scrape the inbox of every configured account, grouped by user.
+
+    Args:
+        use_pool: Passed on to get_song_data; with several accounts, each worker
+            process keeps its own warm browsers, logged in to the accounts pinned to it.
+        deadline: Optional request deadline (tools.deadline). Accounts still
+            being scraped when it runs out are left out and the payload is
+            marked partial.
+        sessions: Session configs to scrape instead of load_sessions()
+
+    Returns:
+        dict: One payload in the shape of get_song_data's, see merge_song_data
+    """
+    try:
+        sessions = load_sessions() if sessions is None else sessions
+    except ValueError as e:
+        return {"error": f"IG_SESSIONS is invalid: {e}"}
+    if not sessions:
+        return {"error": "SESSIONID is not set, please set it in the .env file."}
+
+    if len(sessions) == 1:
+        from tools.ig_inbox_song_automate import get_song_data
+        return get_song_data(use_pool, deadline, sessions[0]["sessionid"])
+
+    slots = session_slots(sessions)
+    expires_at = None if deadline is None else deadline.expires_at - RESULT_MARGIN
+    logger.info(f"Scraping {len(sessions)} Instagram sessions with up to {SESSION_WORKERS} processes...")
+    executors = {session["name"]: _get_executor(slots[session["name"]]) for session in sessions}
+    futures = {executors[session["name"]].submit(_scrape_session, session, slots[session["name"]], use_pool,
+                                                 expires_at, SESSION_MAX_RSS_MB): session["name"]
+               for session in sessions}
+    done, _ = wait(futures, timeout=None if deadline is None else deadline.remaining())
+
+    results = {}
+    for future, name in futures.items():
+        if future not in done:
+            future.cancel()
+            deadline.mark_partial("instagram", f"session {name} still scraping")
+            metrics.inc("instagram_session_scrapes_total", session=name, outcome="timeout")
+            continue
+        try:
+            results[name] = future.result()
+        except BrokenProcessPool as e:
+            _discard_executor(slots[name], executors[name])
+            results[name] = {"error": f"Scraping process exited unexpectedly: {e}"}
+        except Exception as e:
+            results[name] = {"error": str(e)}
+        metrics.inc("instagram_session_scrapes_total", session=name,
+                    outcome="error" if "error" in results[name] else "ok")
+
+    return merge_song_data(results, partial=deadline is not None and deadline.partial)
@@ -0,0 +1,292 @@
+import fcntl
+import ipaddress
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+from tools.deadline import partial_result
+from tools.ig_sessions import scrape_sessions
+from tools.metrics import cache_result
+
+logger = logging.getLogger(__name__)
+
+# Define the project's root directory by going up two levels from the current file
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+SNAPSHOT_FILE = os.path.join(DATA_DIR, 'instagram_snapshot.json')
+LOCK_FILE = os.path.join(DATA_DIR, 'instagram_scrape.lock')
+JOBS_DIR = os.path.join(DATA_DIR, 'instagram_jobs')
+
+# Serve a snapshot up to this many seconds old instead of scraping (0 = always scrape)
+SNAPSHOT_MAX_AGE = float(os.getenv("IG_SNAPSHOT_MAX_AGE", 0))
+JOB_TTL = int(os.getenv("IG_JOB_TTL", 24 * 60 * 60))
+CALLBACK_TIMEOUT = float(os.getenv("IG_CALLBACK_TIMEOUT", 10))
+# Comma-separated hosts callbacks may go to; when empty, any host resolving to public addresses only
+CALLBACK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("IG_CALLBACK_ALLOWED_HOSTS", "").split(",")
+                          if host.strip()}
+# Async jobs running at once per process; more wait in the executor's queue
+JOB_WORKERS = int(os.getenv("IG_JOB_WORKERS", 2))
+
+_job_executor = None
+_job_executor_pid = None
+_job_executor_lock = threading.Lock()
+
+
+def _write_json_atomic(path, data):
+    """Write JSON through a temporary file and rename it, so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+@contextmanager
+def _scrape_lock(timeout=None):
+    """
+    Exclusive lock shared by every worker process (and thread) on this host.
+    Yields False, without the lock, if it wasn't free within ``timeout`` seconds.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(LOCK_FILE, 'a') as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            give_up_at = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= give_up_at:
+                        yield False
+                        return
+                    time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_snapshot():
+    """
+    Return the scrape snapshot, or None if nothing was scraped yet.
+
+    "taken_at"/"data" hold the last successful scrape, "attempted_at"/"attempt"
+    the last scrape whatever its outcome.
+    """
+    return _read_json(SNAPSHOT_FILE)
+
+
+def _fresh(snapshot, max_age):
+    return bool(snapshot and "data" in snapshot and max_age and time.time() - snapshot["taken_at"] <= max_age)
+
+
+def get_song_data_coalesced(max_age=None, deadline=None):
+    """
+    Return inbox song data of every configured account (tools.ig_sessions),
+    launching at most one scrape at a time across workers.
+
+    A recent successful snapshot (no older than ``max_age`` seconds) is returned
+    without opening a browser. Callers that arrive while another worker is
+    scraping wait for it and share its result instead of starting their own.
+
+    With a deadline (tools.deadline), a caller still waiting for another
+    worker's scrape when it runs out gets the last good snapshot marked
+    partial, and its own scrape returns the notes extracted so far.
+    Partial results are never shared with other callers.
+    """
+    max_age = SNAPSHOT_MAX_AGE if max_age is None else float(max_age)
+    requested_at = time.time()
+
+    snapshot = read_snapshot()
+    if _fresh(snapshot, max_age):
+        logger.info("Serving Instagram data from recent snapshot.")
+        cache_result("instagram_snapshot", True)
+        return snapshot["data"]
+
+    with _scrape_lock(None if deadline is None else deadline.remaining()) as locked:
+        if not locked:
+            deadline.mark_partial("instagram", "another worker is still scraping")
+            if snapshot and "data" in snapshot:
+                return partial_result(snapshot["data"])
+            return {"error": "Deadline reached while another worker was scraping", "partial": True}
+
+        snapshot = read_snapshot() or {}
+        if snapshot.get("attempted_at", 0) >= requested_at:
+            logger.info("Another worker finished a scrape while we waited, sharing its result.")
+            cache_result("instagram_snapshot", True)
+            return snapshot["attempt"]
+        if _fresh(snapshot, max_age):
+            cache_result("instagram_snapshot", True)
+            return snapshot["data"]
+
+        cache_result("instagram_snapshot", False)
+        data = scrape_sessions(deadline=deadline)
+        if data.get("partial"):
+            return data
+        now = time.time()
+        snapshot.update(attempted_at=now, attempt=data)
+        if "error" not in data:
+            snapshot.update(taken_at=now, data=data)
+        _write_json_atomic(SNAPSHOT_FILE, snapshot)
+        return data
+
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _cleanup_jobs():
+    if not os.path.isdir(JOBS_DIR):
+        return
+    cutoff = time.time() - JOB_TTL
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def validate_callback_url(url):
+    """
+    Check that a job's callback_url may be POSTed to, so callers can't make
+    the service reach internal addresses.
+
+    Only http(s) URLs qualify, to a host in IG_CALLBACK_ALLOWED_HOSTS when
+    that is set and otherwise to a host whose every address is public.
+
+    Returns:
+        str: Why the URL is refused, or None if it is allowed
+    """
+    if not isinstance(url, str):
+        return "callback_url must be a string"
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return "callback_url is not a valid URL"
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return "callback_url must be an http or https URL"
+
+    host = parts.hostname.lower()
+    if CALLBACK_ALLOWED_HOSTS:
+        return None if host in CALLBACK_ALLOWED_HOSTS else f"callback_url host {host} is not allowed"
+
+    try:
+        infos = socket.getaddrinfo(host, port or (443 if parts.scheme == "https" else 80), proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        return f"callback_url host {host} can't be resolved"
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            return f"callback_url host {host} resolves to a non-public address"
+    return None
+
+
+def _get_job_executor():
+    """Return this process' bounded pool of job threads (a forked worker gets its own)."""
+    global _job_executor, _job_executor_pid
+    with _job_executor_lock:
+        if _job_executor is None or _job_executor_pid != os.getpid():
+            _job_executor = ThreadPoolExecutor(max_workers=max(1, JOB_WORKERS), thread_name_prefix="instagram-job")
+            _job_executor_pid = os.getpid()
+        return _job_executor
+
+
+def _run_job(job, max_age, callback_url):
+    job = {**job, "status": "running", "started_at": time.time()}
+    _write_json_atomic(_job_path(job["id"]), job)
+    try:
+        data = get_song_data_coalesced(max_age)
+        job.update(status="done", result=data)
+    except Exception as e:
+        logger.error(f"Instagram job {job['id']} failed: {e}", exc_info=True)
+        job.update(status="failed", error=str(e))
+    job["finished_at"] = time.time()
+    _write_json_atomic(_job_path(job["id"]), job)
+
+    if callback_url:
+        # Checked again: the host may resolve differently by now
+        error = validate_callback_url(callback_url)
+        if error:
+            logger.error(f"Not delivering Instagram job {job['id']}: {error}")
+            return
+        try:
+            # Redirects could point anywhere, so they aren't followed
+            requests.post(callback_url, json=job, timeout=CALLBACK_TIMEOUT, allow_redirects=False)
+            logger.info(f"Delivered Instagram job {job['id']} to {callback_url}")
+        except requests.RequestException as e:
+            logger.error(f"Callback for Instagram job {job['id']} failed: {e}")
+
+
+def submit_job(max_age=None, callback_url=None):
+    """
+    Queue a scrape on this process' job threads and return the queued job.
+    Any worker can report its status through get_job().
+
+    Raises:
+        ValueError: if callback_url is refused by validate_callback_url
+    """
+    if callback_url:
+        error = validate_callback_url(callback_url)
+        if error:
+            raise ValueError(error)
+    _cleanup_jobs()
+    job = {"id": uuid.uuid4().hex, "status": "queued", "created_at": time.time(), "pid": os.getpid()}
+    _write_json_atomic(_job_path(job["id"]), job)
+    _get_job_executor().submit(_run_job, job, max_age, callback_url)
+    return job
+
+
+def shutdown_job_executor():
+    """Stop taking jobs; queued ones are dropped and show up as failed once this worker has exited."""
+    global _job_executor
+    with _job_executor_lock:
+        executor, _job_executor = _job_executor, None
+        if executor is None or _job_executor_pid != os.getpid():
+            return
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_job(job_id):
+    """Return the job with the given id, or None if it is unknown."""
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+        return None
+    job = _read_json(_job_path(job_id))
+    if job and job["status"] in ("queued", "running") and not _pid_alive(job["pid"]):
+        job.update(status="failed", error="The worker running this job exited.")
+    return job
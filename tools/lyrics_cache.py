@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import time
+import logging
+from contextlib import closing
+from typing import Optional, Dict, Any, Iterator, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Define the project's root directory by going up two levels from the current file
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+CACHE_FILE = os.getenv("LYRICS_CACHE_PATH", os.path.join(DATA_DIR, 'lyrics_cache.db'))
+
+# Found lyrics rarely change, misses are only remembered briefly so new pages get picked up
+DEFAULT_TTL = int(os.getenv("LYRICS_CACHE_TTL", 7 * 24 * 60 * 60))
+DEFAULT_NEGATIVE_TTL = int(os.getenv("LYRICS_CACHE_NEGATIVE_TTL", 15 * 60))
+DEFAULT_MAX_ENTRIES = int(os.getenv("LYRICS_CACHE_MAX_ENTRIES", 5000))
+
+
+class LyricsCache:
+    """
+    SQLite-backed lyrics cache shared by every process that points at the same file.
+
+    Entries are keyed on the URL-cleaned artist/song pair. Hits refresh the
+    entry's access time so eviction drops the least recently used rows once
+    the cache grows past ``max_entries``.
+
+    ``on_evict``, if set, is called with the URLs of found lyrics that left the
+    cache (expired or evicted) and no other entry still points to, after the
+    write has been committed.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl: int = DEFAULT_TTL,
+                 negative_ttl: int = DEFAULT_NEGATIVE_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            path: Location of the SQLite database file
+            ttl: Seconds a found result stays valid
+            negative_ttl: Seconds a "not found" result stays valid
+            max_entries: Maximum number of rows kept before LRU eviction
+        """
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.on_evict: Optional[Callable[[List[str]], None]] = None
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per operation keeps the cache safe to use
+        # from several threads and from forked gunicorn workers.
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            logger.info(f"Cache directory not found. Creating directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lyrics_cache (
+                    artist_key TEXT NOT NULL,
+                    song_key TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    found INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (artist_key, song_key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_lyrics_cache_access ON lyrics_cache (last_access)")
+
+    def get(self, artist_key: str, song_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Returns:
+            The cached result dictionary, or None on a miss or expired entry
+        """
+        now = time.time()
+        evicted = []
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT result, expires_at FROM lyrics_cache WHERE artist_key = ? AND song_key = ?",
+                    (artist_key, song_key)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] > now:
+                    conn.execute(
+                        "UPDATE lyrics_cache SET last_access = ? WHERE artist_key = ? AND song_key = ?",
+                        (now, artist_key, song_key)
+                    )
+                    return json.loads(row[0])
+                evicted = self._delete(conn, "artist_key = ? AND song_key = ?", (artist_key, song_key))
+        except sqlite3.Error as e:
+            logger.warning(f"Lyrics cache lookup failed: {e}")
+            return None
+        self._notify_evicted(evicted)
+        return None
+
+    def set(self, artist_key: str, song_key: str, result: Dict[str, Any]):
+        """
+        Store a result. Results carrying 'lyrics' use the regular TTL,
+        anything else is treated as a miss and uses the negative TTL.
+        """
+        now = time.time()
+        found = "lyrics" in result
+        ttl = self.ttl if found else self.negative_ttl
+        if ttl <= 0:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO lyrics_cache "
+                    "(artist_key, song_key, result, found, expires_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    (artist_key, song_key, json.dumps(result), int(found), now + ttl, now)
+                )
+                evicted = self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Lyrics cache store failed: {e}")
+            return
+        self._notify_evicted(evicted)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        """Drop expired rows, then the least recently used ones past max_entries. Returns the evicted URLs."""
+        evicted = self._delete(conn, "expires_at <= ?", (now,))
+        if self.max_entries <= 0:
+            return evicted
+        (count,) = conn.execute("SELECT COUNT(*) FROM lyrics_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            evicted += self._delete(
+                conn, "rowid IN (SELECT rowid FROM lyrics_cache ORDER BY last_access ASC LIMIT ?)", (overflow,))
+            logger.info(f"Evicted {overflow} least recently used lyrics cache entries")
+        return evicted
+
+    def _delete(self, conn: sqlite3.Connection, where: str, params: tuple) -> List[str]:
+        """Delete the rows matching ``where``; returns the URLs of their lyrics if anyone listens for evictions."""
+        urls = []
+        if self.on_evict is not None:
+            urls = [url for (url,) in conn.execute(
+                f"SELECT json_extract(result, '$.url') FROM lyrics_cache WHERE found = 1 AND {where}", params)]
+        conn.execute(f"DELETE FROM lyrics_cache WHERE {where}", params)
+        if not urls:
+            return []
+        # Several artist/song spellings can resolve to the same page; keep it while one of them is cached
+        placeholders = ", ".join("?" * len(urls))
+        kept = {url for (url,) in conn.execute(
+            f"SELECT json_extract(result, '$.url') FROM lyrics_cache "
+            f"WHERE found = 1 AND json_extract(result, '$.url') IN ({placeholders})", urls)}
+        return [url for url in dict.fromkeys(urls) if url and url not in kept]
+
+    def _notify_evicted(self, urls: List[str]):
+        if not urls or self.on_evict is None:
+            return
+        try:
+            self.on_evict(urls)
+        except Exception as e:
+            logger.warning(f"Lyrics cache eviction callback failed: {e}")
+
+    def found_results(self) -> Iterator[Dict[str, Any]]:
+        """Every unexpired result that has lyrics, e.g. to build the full-text index from."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT result FROM lyrics_cache WHERE found = 1 AND expires_at > ?",
+                                (time.time(),)).fetchall()
+        for (result,) in rows:
+            yield json.loads(result)
+
+    def clear(self):
+        """Remove every cached entry."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM lyrics_cache")
+
+
+_default_cache = None
+
+
+def get_default_cache() -> Optional[LyricsCache]:
+    """
+    Return the process-wide cache configured from the environment,
+    or None when caching is disabled with LYRICS_CACHE_ENABLED=0.
+    """
+    global _default_cache
+    if os.getenv("LYRICS_CACHE_ENABLED", "1") == "0":
+        return None
+    if _default_cache is None:
+        _default_cache = LyricsCache()
+    return _default_cache
@@ -0,0 +1,413 @@
+"""
+Local full-text index over every lyrics text the scraper has fetched.
+
+LyricsScraper adds each page it resolves and caches to an inverted index in
+SQLite, and drops the pages its lyrics cache evicts, so the index stays
+about the size of the cache: one row per lyrics page, one posting per
+(term, page) with the term frequency. Terms come from tokenize(), which reads
+text the way LyricsScraper._clean_lyrics leaves it, so a line remembered from
+the song finds the page. Lookups are ranked with BM25, pages containing the
+query as a phrase rank higher, and each match comes with the best matching
+lines as a snippet.
+
+search_lyrics() answers from the index and only goes to DDGS + Genius on a
+local miss; pages fetched that way are indexed, so the next lookup is local.
+
+Usage (from the project root):
+    python -m tools.lyrics_index backfill   # index the lyrics already in the lyrics cache
+"""
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+import logging
+from collections import Counter
+from contextlib import closing, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from tools.metrics import cache_result, timed
+from tools.registry import registry
+
+logger = logging.getLogger(__name__)
+
+# Define the project's root directory by going up two levels from the current file
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+INDEX_FILE = os.getenv("LYRICS_INDEX_PATH", os.path.join(DATA_DIR, 'lyrics_index.db'))
+
+# Share of the query's distinct terms a page must contain to count as a local hit
+MIN_COVERAGE = float(os.getenv("LYRICS_SEARCH_MIN_COVERAGE", 0.6))
+SNIPPET_LINES = int(os.getenv("LYRICS_SEARCH_SNIPPET_LINES", 2))
+# Live fallback: DDGS results to ask for, and Genius pages to fetch from them
+LIVE_SEARCH_RESULTS = int(os.getenv("LYRICS_SEARCH_LIVE_RESULTS", 10))
+LIVE_FETCH_PAGES = int(os.getenv("LYRICS_SEARCH_LIVE_PAGES", 3))
+PHRASE_BOOST = 1.5
+
+_BRACKETS = re.compile(r'\[.*?\]')
+_APOSTROPHES = re.compile(r"['’`]")
+_TOKEN = re.compile(r'\w+')
+# "Artist – Song Lyrics | Genius Lyrics"
+_GENIUS_TITLE = re.compile(r'^(?P<artist>.+?)\s+[–—-]\s+(?P<song>.+?)\s+Lyrics\b')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower-cased word tokens, read the way _clean_lyrics leaves lyrics:
+    section headers such as [Chorus] are dropped and apostrophes don't split
+    words, so "don't" and "dont" are the same term.
+    """
+    return _TOKEN.findall(_APOSTROPHES.sub('', _BRACKETS.sub('', text or '')).lower())
+
+
+def _contains_phrase(tokens: List[str], phrase: List[str]) -> bool:
+    size = len(phrase)
+    return size > 1 and any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+
+def _snippet(lines: List[str], line_tokens: List[List[str]], terms: set, phrase: List[str]) -> str:
+    """The SNIPPET_LINES consecutive lines sharing the most terms with the query, phrase matches first."""
+    if not lines:
+        return ""
+    width = max(1, SNIPPET_LINES)
+    best, best_rank = 0, None
+    for start in range(max(1, len(lines) - width + 1)):
+        tokens = [token for tokens in line_tokens[start:start + width] for token in tokens]
+        rank = (_contains_phrase(tokens, phrase), len(terms.intersection(tokens)))
+        if best_rank is None or rank > best_rank:
+            best, best_rank = start, rank
+    return '\n'.join(lines[best:best + width])
+
+
+class LyricsIndex:
+    """
+    SQLite inverted index shared by every process that points at the same file.
+
+    Pages are keyed on their URL, so lookups of the same song under different
+    spellings share one entry. Writers take BEGIN IMMEDIATE, so concurrent
+    workers add pages one after the other.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lyrics_docs (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            artist TEXT NOT NULL,
+            song TEXT NOT NULL,
+            lyrics TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            indexed_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS lyrics_postings (
+            term TEXT NOT NULL,
+            doc_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, doc_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_lyrics_postings_doc ON lyrics_postings (doc_id);
+        CREATE TABLE IF NOT EXISTS lyrics_index_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            doc_count INTEGER NOT NULL,
+            total_length INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO lyrics_index_stats (id, doc_count, total_length) VALUES (1, 0, 0);
+    """
+
+    def __init__(self, path: str = INDEX_FILE, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            path: Location of the SQLite database file
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _init_db(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            logger.info(f"Index directory not found. Creating directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _remove(self, conn: sqlite3.Connection, doc_id: int, length: int):
+        conn.execute("DELETE FROM lyrics_postings WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM lyrics_docs WHERE id = ?", (doc_id,))
+        conn.execute("UPDATE lyrics_index_stats SET doc_count = doc_count - 1, total_length = total_length - ?",
+                     (length,))
+
+    def add(self, artist: str, song: str, url: str, lyrics: str) -> bool:
+        """
+        Index one lyrics page, replacing the entry for ``url`` if its text changed.
+
+        Returns:
+            True if the index was updated, False if the page was already indexed
+        """
+        tokens = tokenize(lyrics)
+        if not url or not tokens:
+            return False
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT lyrics FROM lyrics_docs WHERE url = ?", (url,)).fetchone()
+            if row is not None and row[0] == lyrics:
+                return False
+
+            with self._transaction() as conn:
+                existing = conn.execute("SELECT id, lyrics, length FROM lyrics_docs WHERE url = ?", (url,)).fetchone()
+                if existing is not None:
+                    if existing[1] == lyrics:
+                        return False
+                    self._remove(conn, existing[0], existing[2])
+                doc_id = conn.execute(
+                    "INSERT INTO lyrics_docs (url, artist, song, lyrics, length, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, artist or "", song or "", lyrics, len(tokens), time.time())
+                ).lastrowid
+                conn.executemany("INSERT INTO lyrics_postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                                 [(term, doc_id, tf) for term, tf in Counter(tokens).items()])
+                conn.execute("UPDATE lyrics_index_stats SET doc_count = doc_count + 1, total_length = total_length + ?",
+                             (len(tokens),))
+            logger.info(f"Indexed lyrics of {song} by {artist} ({len(tokens)} terms)")
+            return True
+        except sqlite3.Error as e:
+            logger.warning(f"Lyrics index update failed: {e}")
+            return False
+
+    def remove(self, urls: List[str]) -> int:
+        """
+        Drop the pages at ``urls`` from the index, e.g. once the lyrics cache evicted them.
+
+        Returns:
+            The number of pages removed
+        """
+        removed = 0
+        try:
+            with self._transaction() as conn:
+                for url in urls:
+                    row = conn.execute("SELECT id, length FROM lyrics_docs WHERE url = ?", (url,)).fetchone()
+                    if row is not None:
+                        self._remove(conn, row[0], row[1])
+                        removed += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Lyrics index removal failed: {e}")
+            return 0
+        if removed:
+            logger.info(f"Removed {removed} evicted lyrics pages from the index")
+        return removed
+
+    def search(self, query: str, limit: int = 10, min_coverage: float = MIN_COVERAGE) -> List[Dict[str, Any]]:
+        """
+        Rank the indexed pages for ``query`` with BM25.
+
+        Only pages containing at least ``min_coverage`` of the query's distinct
+        terms are returned, so an empty list means a local miss.
+
+        Returns:
+            [{"artist", "song", "url", "snippet", "score"}, ...], best first
+        """
+        phrase = tokenize(query)
+        terms = set(phrase)
+        if not terms or limit <= 0:
+            return []
+        try:
+            with closing(self._connect()) as conn:
+                doc_count, total_length = conn.execute(
+                    "SELECT doc_count, total_length FROM lyrics_index_stats WHERE id = 1").fetchone()
+                if not doc_count:
+                    return []
+                placeholders = ','.join('?' * len(terms))
+                postings = conn.execute(
+                    f"SELECT p.term, p.doc_id, p.tf, d.length FROM lyrics_postings p "
+                    f"JOIN lyrics_docs d ON d.id = p.doc_id WHERE p.term IN ({placeholders})", tuple(terms)
+                ).fetchall()
+
+                document_frequency = Counter(term for term, _, _, _ in postings)
+                average_length = total_length / doc_count
+                scores: Dict[int, float] = {}
+                matched: Dict[int, int] = {}
+                for term, doc_id, tf, length in postings:
+                    df = document_frequency[term]
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+                needed = max(1, math.ceil(min_coverage * len(terms)))
+                candidates = sorted((doc_id for doc_id in scores if matched[doc_id] >= needed),
+                                    key=lambda doc_id: scores[doc_id], reverse=True)[:limit * 3]
+                if not candidates:
+                    return []
+                rows = conn.execute(
+                    f"SELECT id, artist, song, url, lyrics FROM lyrics_docs WHERE id IN ({','.join('?' * len(candidates))})",
+                    tuple(candidates)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Lyrics index search failed: {e}")
+            return []
+
+        ranked = []
+        for doc_id, artist, song, url, lyrics in rows:
+            lines = [line for line in lyrics.split('\n') if line.strip()]
+            line_tokens = [tokenize(line) for line in lines]
+            score = scores[doc_id]
+            if _contains_phrase([token for tokens in line_tokens for token in tokens], phrase):
+                score *= PHRASE_BOOST
+            ranked.append((score, artist, song, url, lines, line_tokens))
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        # Snippets only for what is returned
+        return [{"artist": artist, "song": song, "url": url,
+                 "snippet": _snippet(lines, line_tokens, terms, phrase), "score": round(score, 3)}
+                for score, artist, song, url, lines, line_tokens in ranked[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        with closing(self._connect()) as conn:
+            doc_count, total_length = conn.execute(
+                "SELECT doc_count, total_length FROM lyrics_index_stats WHERE id = 1").fetchone()
+            (terms,) = conn.execute("SELECT COUNT(DISTINCT term) FROM lyrics_postings").fetchone()
+        return {"documents": doc_count, "terms": terms, "total_length": total_length}
+
+
+_default_index = None
+
+
+def get_default_index() -> Optional[LyricsIndex]:
+    """
+    Return the process-wide index configured from the environment,
+    or None when indexing is disabled with LYRICS_INDEX_ENABLED=0.
+    """
+    global _default_index
+    if os.getenv("LYRICS_INDEX_ENABLED", "1") == "0":
+        return None
+    if _default_index is None:
+        _default_index = LyricsIndex()
+    return _default_index
+
+
+def _is_genius_song_page(url: str, genius_base_url: str) -> bool:
+    parsed = urlparse(url or '')
+    return parsed.netloc == urlparse(genius_base_url).netloc and parsed.path.rstrip('/').endswith('-lyrics')
+
+
+def _artist_and_song(result: Dict[str, Any]) -> Tuple[str, str]:
+    """Read artist and song from a Genius search result title, falling back to the URL slug."""
+    match = _GENIUS_TITLE.match(result.get('title') or '')
+    if match:
+        return match.group('artist').strip(), match.group('song').strip()
+    slug = urlparse(result.get('href') or '').path.strip('/')
+    return "", slug[:-len('-lyrics')].replace('-', ' ').strip() if slug.endswith('-lyrics') else slug
+
+
+def search_local(query: str, max_results: int = 10) -> List[Dict[str, Any]]:
+    """Index-only lookup; an empty list is a local miss."""
+    index = get_default_index()
+    if index is None:
+        return []
+    with timed("tool_phase_seconds", phase="lyrics_index_search"):
+        matches = index.search(query, max_results)
+    cache_result("lyrics_index", bool(matches))
+    return matches
+
+
+def search_live(query: str, max_results: int = 10, deadline=None) -> List[Dict[str, Any]]:
+    """
+    Look the line up on DuckDuckGo, fetch the Genius pages it points to,
+    remember them like any lyrics lookup (cache and index) and rank them
+    like a local lookup.
+    """
+    index = get_default_index()
+    if index is None:
+        return []
+    lyrics_tool = registry.tool('lyrics')
+    scraper = lyrics_tool.get_shared_scraper()
+    search_query = f"{query} lyrics site:{urlparse(lyrics_tool.GENIUS_BASE_URL).netloc}"
+    results = registry.tool('search').search(search_query, LIVE_SEARCH_RESULTS, deadline)
+    pages = [result for result in results
+             if _is_genius_song_page(result.get('href'), lyrics_tool.GENIUS_BASE_URL)][:LIVE_FETCH_PAGES]
+    logger.info(f"Lyrics search fallback for {query!r}: {len(pages)} Genius pages among {len(results)} results")
+
+    for page in pages:
+        if deadline is not None and not deadline.check("lyrics_search"):
+            break
+        lyrics = scraper.get_lyrics_from_url(page['href'], deadline=deadline)
+        if lyrics:
+            artist, song = _artist_and_song(page)
+            result = scraper.lyrics_result(artist, song, [page['href']], page['href'], lyrics)
+            error, clean_artist, clean_song = scraper.prepare_lookup(artist, song)
+            if error:
+                # Without an artist there's no cache key; the page is only indexed
+                scraper.index_result(result)
+            else:
+                scraper.remember(clean_artist, clean_song, result)
+    return index.search(query, max_results)
+
+
+def search_lyrics(query: str, max_results: int = 10, live_fallback: bool = True, deadline=None) -> Dict[str, Any]:
+    """
+    Find songs containing a remembered line.
+
+    Returns:
+        {"query", "source": "local"|"live", "matches": [...]}, plus "partial": True
+        when the deadline cut the live lookup short
+    """
+    return search_lyrics_local(query, max_results, live_fallback) or search_lyrics_live(query, max_results, deadline)
+
+
+def search_lyrics_local(query: str, max_results: int = 10, live_fallback: bool = True) -> Optional[Dict[str, Any]]:
+    """The search_lyrics() result from the local index, or None when it has no match and the live search should run."""
+    matches = search_local(query, max_results)
+    if matches or not live_fallback:
+        return {"query": query, "source": "local", "matches": matches}
+    return None
+
+
+def search_lyrics_live(query: str, max_results: int = 10, deadline=None) -> Dict[str, Any]:
+    """The search_lyrics() result of a live DDGS + Genius lookup; a failure is reported in "error"."""
+    result = {"query": query, "source": "live", "matches": []}
+    try:
+        result["matches"] = search_live(query, max_results, deadline)
+    except Exception as e:
+        logger.error(f"Live lyrics search for {query!r} failed: {e}")
+        result["error"] = str(e)
+    if deadline is not None and deadline.partial:
+        result["partial"] = True
+    return result
+
+
+def backfill_from_cache(index: LyricsIndex, cache) -> int:
+    """Index every found result of a LyricsCache. Returns the number of pages added."""
+    added = 0
+    for result in cache.found_results():
+        if index.add(result.get("artist", ""), result.get("song", ""), result.get("url", ""), result.get("lyrics", "")):
+            added += 1
+    return added
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print(__doc__)
+        sys.exit(1)
+    from tools.lyrics_cache import LyricsCache
+    count = backfill_from_cache(LyricsIndex(), LyricsCache())
+    logger.info(f"Indexed {count} cached lyrics pages")
@@ -0,0 +1,113 @@
+"""
+Background lyrics prefetching for newly seen songs.
+
+Saving the song history queues every new (artist, song) pair; a small pool
+of daemon threads resolves them through the shared LyricsScraper, which
+stores the result in the lyrics cache. When an agent asks /webhook/get_lyrics
+for the song minutes later, the answer comes from the cache.
+
+Prefetches share the worker's Genius rate limiter with user requests and are
+additionally paced by LYRICS_PREFETCH_RATE, so a burst of new songs never
+crowds out interactive lookups.
+"""
+import os
+import queue
+import threading
+import logging
+from typing import Iterable, Tuple
+
+from tools.lyrics_cache import get_default_cache
+from tools.rate_limit import TokenBucket
+from tools.registry import registry
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv("LYRICS_PREFETCH", "1") == "1"
+PREFETCH_WORKERS = int(os.getenv("LYRICS_PREFETCH_WORKERS", 2))
+PREFETCH_QUEUE_SIZE = int(os.getenv("LYRICS_PREFETCH_QUEUE_SIZE", 200))
+# Songs prefetched per second by this process, on top of Genius' per-host limit
+PREFETCH_RATE = float(os.getenv("LYRICS_PREFETCH_RATE", 0.2))
+
+_queue: "queue.Queue[Tuple[str, str]]" = queue.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+_pending = set()
+_pending_lock = threading.Lock()
+_pacer = TokenBucket(PREFETCH_RATE, 1)
+_workers_pid = None
+
+
+def _cached(scraper, artist: str, song_name: str) -> bool:
+    if scraper.cache is None:
+        return False
+    clean_artist = scraper._clean_text_for_url(artist)
+    clean_song = scraper._clean_text_for_url(song_name)
+    return scraper.cache.get(clean_artist, clean_song) is not None
+
+
+def _worker_loop():
+    while True:
+        key = _queue.get()
+        artist, song_name = key
+        try:
+            scraper = registry.tool("lyrics").get_shared_scraper()
+            if _cached(scraper, artist, song_name):
+                continue
+            _pacer.acquire()
+            result = scraper.get_lyrics(artist, song_name)
+            if "lyrics" in result:
+                logger.info(f"Prefetched lyrics for {song_name} by {artist}")
+            else:
+                logger.info(f"No lyrics found while prefetching {song_name} by {artist}: {result.get('error')}")
+        except Exception as e:
+            logger.error(f"Prefetching lyrics for {song_name} by {artist} failed: {e}", exc_info=True)
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+            _queue.task_done()
+
+
+def _start_workers():
+    """Start this process' prefetch threads (again after a fork, where threads don't survive)."""
+    global _workers_pid
+    with _pending_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        _pending.clear()
+    for number in range(max(1, PREFETCH_WORKERS)):
+        threading.Thread(target=_worker_loop, name=f"lyrics-prefetch-{number}", daemon=True).start()
+
+
+def prefetch(songs: Iterable[Tuple[str, str]]) -> int:
+    """
+    Queue (artist, song) pairs for background lyrics lookup.
+
+    Pairs already queued in this process are skipped, and so is everything
+    once the queue is full; a dropped prefetch only costs a slower first request.
+
+    Returns:
+        Number of pairs queued.
+    """
+    songs = [(artist, song_name) for artist, song_name in songs if artist and song_name]
+    # Without a cache there is nowhere to keep the result; the scraper itself is imported by the workers
+    if not songs or not PREFETCH_ENABLED or get_default_cache() is None:
+        return 0
+    _start_workers()
+    queued = 0
+    for artist, song_name in songs:
+        key = (artist, song_name)
+        with _pending_lock:
+            if key in _pending:
+                continue
+            _pending.add(key)
+        try:
+            _queue.put_nowait(key)
+            queued += 1
+        except queue.Full:
+            with _pending_lock:
+                _pending.discard(key)
+            logger.warning(f"Lyrics prefetch queue is full, dropping {song_name} by {artist}")
+    return queued
+
+
+def queue_depth() -> int:
+    return _queue.qsize()
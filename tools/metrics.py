@@ -0,0 +1,353 @@
+"""
+Process-local metrics, aggregated across gunicorn workers for GET /metrics.
+
+Every process records counters, gauges and histograms in memory and a
+background thread writes them to data/metrics/<pid>.json every
+METRICS_FLUSH_INTERVAL seconds. render() merges the files of all processes
+(gunicorn workers, the tracker) into the Prometheus text format. Files of
+processes that exited are folded into retired.json, so counters don't drop
+when gunicorn recycles a worker.
+
+Tools time their phases with the shared helper:
+
+    with timed("tool_phase_seconds", phase="genius_fetch"):
+        ...
+
+    @timed("tool_phase_seconds", phase="ddgs_query")
+    def search(...): ...
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import ContextDecorator
+
+logger = logging.getLogger(__name__)
+
+# Define the project's root directory by going up two levels from the current file
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(DATA_DIR, 'metrics'))
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+RETIRED_FILE = os.path.join(METRICS_DIR, 'retired.json')
+
+# Upper bounds in seconds; scrapes of the inbox can take a minute or more
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HELP = {
+    "http_requests_total": "Requests handled, by route, method and status.",
+    "http_request_duration_seconds": "Time to build the response, by route and method.",
+    "http_requests_in_flight": "Requests currently being handled.",
+    "tool_phase_seconds": "Duration of external phases (DDGS, Genius, Chrome) by phase.",
+    "song_history_save_seconds": "Duration of song history saves, by backend.",
+    "song_history_file_bytes": "Size of the song history file after the last save.",
+    "cache_requests_total": "Cache lookups by cache and result (hit or miss).",
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_types = {}
+_flusher_pid = None
+
+
+def _key(name, labels):
+    return name, json.dumps(labels, sort_keys=True)
+
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        if _flusher_pid is not None:
+            # Forked from a process that already recorded metrics: start from zero
+            _counters.clear()
+            _gauges.clear()
+            _histograms.clear()
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flusher_loop, name="metrics-flusher", daemon=True).start()
+
+
+def inc(name, amount=1, **labels):
+    """Increase a counter."""
+    if not METRICS_ENABLED:
+        return
+    _ensure_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _types[name] = "counter"
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def add_gauge(name, amount, **labels):
+    """Move a gauge that is summed across the live processes (e.g. requests in flight)."""
+    if not METRICS_ENABLED:
+        return
+    _ensure_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _types[name] = "gauge"
+        value, _, _ = _gauges.get(key, (0, 0, "sum"))
+        _gauges[key] = (value + amount, time.time(), "sum")
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge whose most recently written value wins across processes (e.g. a file size)."""
+    if not METRICS_ENABLED:
+        return
+    _ensure_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _types[name] = "gauge"
+        _gauges[key] = (value, time.time(), "last")
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record one observation in a histogram."""
+    if not METRICS_ENABLED:
+        return
+    _ensure_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _types[name] = "histogram"
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": list(buckets), "counts": [0] * len(buckets),
+                                            "sum": 0.0, "count": 0}
+        for i, bound in enumerate(histogram["buckets"]):
+            if value <= bound:
+                histogram["counts"][i] += 1
+                break
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+class timed(ContextDecorator):
+    """Observe the duration of a block or function call, in seconds, in a histogram."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._started = threading.local()
+
+    def __enter__(self):
+        # A thread-local start time keeps a shared decorator instance safe across threads
+        self._started.__dict__.setdefault("stack", []).append(time.perf_counter())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        started = self._started.stack.pop()
+        observe(self.name, time.perf_counter() - started, **self.labels)
+        return False
+
+
+def cache_result(cache, hit):
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def _snapshot():
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "types": dict(_types),
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "gauges": [[name, labels, *gauge] for (name, labels), gauge in _gauges.items()],
+            "histograms": [[name, labels, dict(h, counts=list(h["counts"]))]
+                           for (name, labels), h in _histograms.items()],
+        }
+
+
+def _write_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def flush():
+    """Write this process' metrics to its file under METRICS_DIR."""
+    if not METRICS_ENABLED or _flusher_pid != os.getpid():
+        return
+    _write_json_atomic(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), _snapshot())
+
+
+def _flusher_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.warning(f"Writing metrics failed: {e}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+class _Aggregate:
+    def __init__(self):
+        self.types = {}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def add(self, snapshot, live=True):
+        self.types.update(snapshot.get("types", {}))
+        for name, labels, value in snapshot.get("counters", []):
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+        for name, labels, value, updated_at, mode in snapshot.get("gauges", []):
+            if mode == "sum":
+                # Requests in flight in a process that exited are gone
+                if live:
+                    current = self.gauges.get((name, labels), (0, 0, mode))
+                    self.gauges[(name, labels)] = (current[0] + value, max(current[1], updated_at), mode)
+            elif updated_at >= self.gauges.get((name, labels), (0, 0, mode))[1]:
+                self.gauges[(name, labels)] = (value, updated_at, mode)
+        for name, labels, histogram in snapshot.get("histograms", []):
+            current = self.histograms.get((name, labels))
+            if current is None or current["buckets"] != histogram["buckets"]:
+                if current is not None:
+                    logger.warning(f"Bucket layout of {name} changed, keeping the newest")
+                self.histograms[(name, labels)] = dict(histogram, counts=list(histogram["counts"]))
+                continue
+            current["counts"] = [a + b for a, b in zip(current["counts"], histogram["counts"])]
+            current["sum"] += histogram["sum"]
+            current["count"] += histogram["count"]
+
+    def snapshot(self):
+        return {
+            "types": self.types,
+            "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+            "gauges": [[name, labels, *gauge] for (name, labels), gauge in self.gauges.items()
+                       if gauge[2] == "last"],
+            "histograms": [[name, labels, h] for (name, labels), h in self.histograms.items()],
+        }
+
+
+def _retire(paths):
+    """Fold the files of exited processes into retired.json."""
+    with open(f"{RETIRED_FILE}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            retired = _Aggregate()
+            retired.add(_read_json(RETIRED_FILE) or {}, live=False)
+            for path in paths:
+                snapshot = _read_json(path)
+                if snapshot is None:
+                    continue
+                retired.add(snapshot, live=False)
+            _write_json_atomic(RETIRED_FILE, retired.snapshot())
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def collect():
+    """Merge the metrics of every process, using live values for the calling process."""
+    aggregate = _Aggregate()
+    dead = []
+    if os.path.isdir(METRICS_DIR):
+        for entry in os.listdir(METRICS_DIR):
+            name, ext = os.path.splitext(entry)
+            if ext != ".json" or not name.isdigit():
+                continue
+            pid = int(name)
+            path = os.path.join(METRICS_DIR, entry)
+            if pid == os.getpid():
+                continue
+            if not _pid_alive(pid):
+                dead.append(path)
+                continue
+            snapshot = _read_json(path)
+            if snapshot is not None:
+                aggregate.add(snapshot)
+        if dead:
+            _retire(dead)
+        aggregate.add(_read_json(RETIRED_FILE) or {}, live=False)
+    aggregate.add(_snapshot())
+    return aggregate
+
+
+def _format_labels(labels, extra=None):
+    items = list(json.loads(labels).items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    escaped = []
+    for key, value in items:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Return the aggregated metrics in the Prometheus text exposition format."""
+    aggregate = collect()
+    lines = []
+    by_name = {}
+    for (name, labels), value in aggregate.counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), (value, _, _) in aggregate.gauges.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), histogram in aggregate.histograms.items():
+        by_name.setdefault(name, []).append((labels, histogram))
+
+    for name in sorted(by_name):
+        metric_type = aggregate.types.get(name, "untyped")
+        if name in HELP:
+            lines.append(f"# HELP {name} {HELP[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in sorted(by_name[name], key=lambda item: item[0]):
+            if metric_type != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value["buckets"], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': _format_number(bound)})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {value['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception as e:
+        logger.warning(f"Writing metrics at exit failed: {e}")
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import fcntl
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Optional, Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Characters of a host name kept in its bucket's file name
+_STATE_FILE_CHARS = re.compile(r'[^\w.-]')
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    The bucket starts full, so an idle caller never waits. Once the burst is
+    spent, callers are spaced out to ``rate`` requests per second.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            yield
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Reserve one token.
+
+        Args:
+            max_wait: Give up instead of reserving if the wait would be longer than this
+
+        Returns:
+            Seconds the caller has to wait before using the token, or None if
+            the wait would exceed ``max_wait`` (nothing is reserved in that case)
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._locked():
+            self._refill()
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def poll(self, spare: float = 0) -> float:
+        """
+        Take a token only if one is available right now with ``spare`` tokens left over.
+
+        Unlike reserve, nothing is held while the caller waits, so a caller
+        that may give up (e.g. a speculative probe) doesn't use up a slot.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one would be available
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._locked():
+            self._refill()
+            needed = 1 + spare
+            if self._tokens >= needed:
+                self._tokens -= 1
+                return 0.0
+            return (needed - self._tokens) / self.rate
+
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """Block until a token is available. Returns False if it would take longer than ``max_wait``."""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a file, so every process using the same
+    file (e.g. all gunicorn workers) shares one rate.
+
+    Each operation holds an flock on the file while it reads, updates and
+    writes back the tokens. time.monotonic() is system-wide on Linux, so the
+    processes agree on it; a state written before a reboot (a timestamp from
+    the future) is treated as a full bucket.
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float = 1.0):
+        """
+        Args:
+            path: State file shared by the processes
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        super().__init__(rate, capacity)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self.path, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            try:
+                state_file.seek(0)
+                try:
+                    state = json.loads(state_file.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.monotonic()
+                updated = state.get("updated", now)
+                if updated > now:
+                    updated, state = now, {}
+                self._tokens = state.get("tokens", self.capacity)
+                self._updated = updated
+                yield
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(json.dumps({"tokens": self._tokens, "updated": self._updated}))
+                state_file.flush()
+            finally:
+                fcntl.flock(state_file, fcntl.LOCK_UN)
+
+
+class HostRateLimiter:
+    """
+    Keeps one token bucket per host so politeness towards one site doesn't slow down another.
+
+    The buckets live in this process unless ``state_dir`` is given; then they
+    are SharedTokenBucket files in it, and every process pointing at the same
+    directory shares the rate.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, state_dir: Optional[str] = None):
+        """
+        Args:
+            rate: Allowed requests per second per host (0 disables limiting)
+            burst: Requests allowed back to back before spacing kicks in
+            state_dir: Directory of the bucket files shared across processes
+        """
+        self.rate = rate
+        self.burst = burst
+        self.state_dir = state_dir
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url_or_host: str) -> str:
+        return urlparse(url_or_host).netloc or url_or_host
+
+    def bucket(self, url_or_host: str) -> TokenBucket:
+        host = self._host(url_or_host)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None and self.state_dir:
+                path = os.path.join(self.state_dir, _STATE_FILE_CHARS.sub('_', host) + ".json")
+                bucket = SharedTokenBucket(path, self.rate, self.burst)
+                self._buckets[host] = bucket
+            elif bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def reserve(self, url_or_host: str, max_wait: Optional[float] = None) -> Optional[float]:
+        """Reserve a request slot for the host of ``url_or_host``. See TokenBucket.reserve."""
+        return self.bucket(url_or_host).reserve(max_wait)
+
+    def poll(self, url_or_host: str, spare: float = 0) -> float:
+        """Take a request slot for the host of ``url_or_host`` if one is free now. See TokenBucket.poll."""
+        return self.bucket(url_or_host).poll(spare)
+
+    def acquire(self, url_or_host: str, max_wait: Optional[float] = None) -> bool:
+        """Wait until a request to the host of ``url_or_host`` is allowed."""
+        wait = self.reserve(url_or_host, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            logger.debug(f"Rate limiting {self._host(url_or_host)} for {wait:.2f}s")
+            time.sleep(wait)
+        return True
@@ -0,0 +1,115 @@
+"""
+Lazy registry of the heavyweight tools.
+
+The search, lyrics and Instagram tools pull in ddgs, bs4/lxml,
+fake_useragent and selenium. A worker only imports a tool the first time a
+request needs it, so one that only ever serves song history never pays for
+a browser driver. TOOLS_WARMUP=search,lyrics (or "all") imports tools at
+startup instead; under `gunicorn --preload` that happens once in the master
+and the imported modules are shared copy-on-write by every worker.
+
+registry.report() lists, per tool, how long its import took and how much
+the process' RSS grew meanwhile. Modules imported by an earlier tool (e.g.
+requests) are counted only for the first one.
+"""
+import importlib
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+TOOLS = {
+    "search": "tools.duckduckgo_search",
+    "lyrics": "tools.get_lyrics",
+    "instagram": "tools.instagram_jobs",
+}
+
+WARMUP = os.getenv("TOOLS_WARMUP", "")
+
+
+def process_rss_mb():
+    """Resident memory of the current process in MiB (0 where /proc isn't available)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+
+class ToolRegistry:
+    """Imports each registered tool module on first use and records what it cost."""
+
+    def __init__(self, tools=None):
+        self._modules = dict(tools or {})
+        self._loaded = {}
+        self._reports = {}
+        # Reentrant: a tool's import may itself ask the registry for another tool
+        self._lock = threading.RLock()
+
+    def register(self, name, module_name):
+        with self._lock:
+            self._modules[name] = module_name
+
+    def tool(self, name):
+        """Return the module of tool ``name``, importing it on first use."""
+        module = self._loaded.get(name)
+        if module is not None:
+            return module
+        with self._lock:
+            module = self._loaded.get(name)
+            if module is not None:
+                return module
+            if name not in self._modules:
+                raise KeyError(f"Unknown tool: {name}")
+
+            rss_before = process_rss_mb()
+            started = time.perf_counter()
+            module = importlib.import_module(self._modules[name])
+            elapsed = time.perf_counter() - started
+            self._reports[name] = {
+                "module": self._modules[name],
+                "import_seconds": round(elapsed, 4),
+                "rss_delta_mb": round(process_rss_mb() - rss_before, 1),
+                "loaded_by_pid": os.getpid(),
+                "loaded_at": time.time(),
+            }
+            self._loaded[name] = module
+            logger.info(f"Loaded tool '{name}' in {elapsed * 1000:.0f} ms "
+                        f"(+{self._reports[name]['rss_delta_mb']} MiB RSS)")
+            return module
+
+    def warm_up(self, names=None):
+        """Import the given tools (all of them by default) ahead of the first request."""
+        for name in names or list(self._modules):
+            try:
+                self.tool(name)
+            except Exception as e:
+                # A broken optional tool must not keep the others from serving
+                logger.error(f"Warming up tool '{name}' failed: {e}", exc_info=True)
+
+    def warm_up_from_env(self):
+        names = [name.strip() for name in WARMUP.split(",") if name.strip()]
+        if names == ["all"]:
+            names = None
+        elif not names:
+            return
+        self.warm_up(names)
+
+    def report(self):
+        """Import cost of every tool, as seen by the current process."""
+        return {
+            "pid": os.getpid(),
+            "rss_mb": round(process_rss_mb(), 1),
+            "tools": {
+                name: {"loaded": name in self._loaded, **self._reports.get(name, {"module": module_name})}
+                for name, module_name in self._modules.items()
+            },
+        }
+
+
+registry = ToolRegistry(TOOLS)
@@ -1,100 +1,111 @@
-
-import json
 import os
 import logging
-from datetime import datetime
+
+from tools.song_history_store import BACKEND, get_store, unwrap_payload
+from tools.song_events import EVENTS_ENABLED, SnapshotDiffer, get_event_log
+from tools.lyrics_prefetch import prefetch
+from tools import metrics
 
 # Get the logger instance
 logger = logging.getLogger(__name__)
 
-# Define the project's root directory by going up two levels from the current file
-ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(ROOT_DIR, 'data')
-JSON_FILE = os.path.join(DATA_DIR, 'songs_data.json')
-
 def save_song_history_from_webhook(payload):
     """
-    Saves song history from a webhook payload to the songs_data.json file.
+    Saves song history from a webhook payload to the configured history store
+    (songs_data.json by default, see tools.song_history_store).
     The JSON file will have a top-level 'last_updated' timestamp and a 'users' object.
 
     Args:
-        payload (dict): A dictionary of users and their songs.
+        payload (dict): A dictionary of users and their songs, or a snapshot envelope
+            (see tools.song_history_store.unwrap_payload).
         
     Returns:
         bool: True if successful, False otherwise.
     """
     logger.info("Attempting to save song history from webhook.")
-    logger.info(f"Received payload: {payload}")
+    # The full payload is large; only dump it at DEBUG, and not for every request
+    logger.debug("Received payload: %s", payload, extra={"sample": "payload_dump"})
     
     try:
-        if not os.path.exists(DATA_DIR):
-            logger.info(f"Data directory not found. Creating directory: {DATA_DIR}")
-            os.makedirs(DATA_DIR)
-
-        if os.path.exists(JSON_FILE):
-            logger.info(f"Loading existing data from {JSON_FILE}")
-            with open(JSON_FILE, 'r') as f:
-                try:
-                    file_data = json.load(f)
-                    user_data = file_data.get('users', {})
-                except json.JSONDecodeError:
-                    logger.warning(f"Could not decode JSON from {JSON_FILE}. Starting with an empty structure.")
-                    user_data = {}
-        else:
-            logger.info(f"JSON file not found at {JSON_FILE}. Starting with an empty structure.")
-            user_data = {}
-
         if not payload or not isinstance(payload, dict):
             logger.error("Payload is empty or not a dictionary.")
             return False
 
-        for username, songs in payload.items():
-            logger.info(f"Processing user: {username}")
-            if username not in user_data:
-                user_data[username] = {
-                    "songs-played": [],
-                    "current-played": "",
-                    "note": "",
-                    "notes": []
-                }
+        _save_with_events([(payload, None)])
+            
+        logger.info("Successfully saved song history.")
+        return True
+        
+    except Exception as e:
+        logger.error(f"An error occurred while saving song history: {e}", exc_info=True)
+        return False
 
-            for song_item in songs:
-                song_string = f"{song_item['song']} by {song_item['artist']}"
-                if "songs-played" not in user_data[username]:
-                    user_data[username]["songs-played"] = []
-                
-                if song_string not in user_data[username]["songs-played"]:
-                    logger.info(f"Adding new song for {username}: {song_string}")
-                    user_data[username]["songs-played"].append(song_string)
-                else:
-                    logger.info(f"Song already exists for {username}, skipping: {song_string}")
+def _save_timed(batch, observer=None):
+    store = get_store()
+    with metrics.timed("song_history_save_seconds", backend=BACKEND):
+        added = store.save_payloads(batch, observer=observer)
+    try:
+        metrics.set_gauge("song_history_file_bytes", os.path.getsize(store.path), backend=BACKEND)
+    except OSError:
+        pass
+    return added
 
-                user_data[username]["current-played"] = song_string
-                note = song_item.get("note", "")
-                user_data[username]["note"] = note
+def _save_with_events(batch):
+    """Save (payload, seen_at) pairs, record the change events they caused and prefetch the new songs' lyrics."""
+    differ = None
+    if EVENTS_ENABLED:
+        try:
+            # Reads the previous snapshot and records the events under the store's lock
+            differ = SnapshotDiffer(get_event_log())
+        except Exception as e:
+            logger.error(f"Song event log unavailable, saving without events: {e}", exc_info=True)
+    added = _save_timed(batch, observer=differ)
 
-                if "notes" not in user_data[username]:
-                    user_data[username]["notes"] = []
-                
-                if note and note not in user_data[username]["notes"]:
-                    logger.info(f"Adding new note for {username}: {note}")
-                    user_data[username]["notes"].append(note)
-                elif note:
-                    logger.info(f"Note already exists for {username}, skipping: {note}")
+    try:
+        # Agents usually ask for a new song's lyrics shortly after it shows up
+        queued = prefetch(added)
+        if queued:
+            logger.info(f"Queued {queued} songs for lyrics prefetch.")
+    except Exception as e:
+        logger.error(f"Could not queue lyrics prefetch: {e}", exc_info=True)
 
-        # Prepare the final data structure with a top-level timestamp
-        output_data = {
-            "last_updated": datetime.now().isoformat(),
-            "users": user_data
-        }
+def validate_payload(payload):
+    """
+    Check the shape of a webhook payload without saving it.
 
-        logger.info(f"Writing updated data to {JSON_FILE}")
-        with open(JSON_FILE, 'w') as f:
-            json.dump(output_data, f, indent=4)
-            
-        logger.info("Successfully saved song history.")
+    Returns:
+        str: A description of the problem, or None if the payload is valid.
+    """
+    users, _ = unwrap_payload(payload)
+    if not users or not isinstance(users, dict):
+        return "Payload is empty or not a dictionary."
+    for username, songs in users.items():
+        if not isinstance(songs, list):
+            return f"Songs for user '{username}' must be a list."
+        for song_item in songs:
+            if not isinstance(song_item, dict) or 'song' not in song_item or 'artist' not in song_item:
+                return f"Every song item for user '{username}' needs 'song' and 'artist' keys."
+            if not isinstance(song_item['song'], str) or not isinstance(song_item['artist'], str):
+                return f"'song' and 'artist' of user '{username}' must be strings."
+            if not isinstance(song_item.get('note', ''), (str, type(None))):
+                return f"'note' of user '{username}' must be a string."
+    return None
+
+def save_song_history_batch(batch):
+    """
+    Saves several queued payloads with one store write.
+
+    Args:
+        batch (list): (payload, seen_at) pairs in arrival order.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    logger.info(f"Saving a batch of {len(batch)} song history payloads.")
+    try:
+        _save_with_events(batch)
+        logger.info("Successfully saved song history batch.")
         return True
-        
     except Exception as e:
-        logger.error(f"An error occurred while saving song history: {e}", exc_info=True)
+        logger.error(f"An error occurred while saving song history batch: {e}", exc_info=True)
         return False
@@ -0,0 +1,257 @@
+"""
+Change events for the song history.
+
+Every save is diffed against what the history knew before it, and the
+differences are appended to an event log (data/song_events.db):
+
+    user_appeared         a user shows up who wasn't in the previous snapshot
+    user_disappeared      a user from the previous snapshot is missing
+    new_song              a song the user was never seen with
+    current_song_changed  the user's current song is a different one
+    new_note              a note text the user never had
+
+Consumers page through the log with a cursor (GET /webhook/song_note/events)
+instead of diffing songs_data.json themselves. URLs listed in
+SONG_EVENT_WEBHOOKS additionally get every new batch of events POSTed to them.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import closing
+
+import requests
+
+from tools.song_history_store import DATA_DIR, song_string_for
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DB = os.getenv("SONG_EVENTS_DB", os.path.join(DATA_DIR, 'song_events.db'))
+EVENTS_ENABLED = os.getenv("SONG_EVENTS_ENABLED", "1") == "1"
+# Events older than this many days are pruned when new ones are appended (0 keeps everything)
+RETENTION_DAYS = float(os.getenv("SONG_EVENTS_RETENTION_DAYS", 30))
+WEBHOOK_URLS = [url.strip() for url in os.getenv("SONG_EVENT_WEBHOOKS", "").split(",") if url.strip()]
+WEBHOOK_TIMEOUT = float(os.getenv("SONG_EVENT_WEBHOOK_TIMEOUT", 10))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        seen_at TEXT,
+        type TEXT NOT NULL,
+        user TEXT NOT NULL,
+        data TEXT NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_created_at ON events (created_at);
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+"""
+
+
+class SnapshotDiffer:
+    """
+    Collects the events of one or more payloads while a history store saves them.
+
+    Pass it as the store's ``observer``. The store calls it while holding its
+    lock: begin() reads the users of the previous snapshot from the event log,
+    observe() gets the previous_state() of every user before their payload is
+    merged, so the diff sees exactly what the save changes, batches included,
+    and finish() records the events together with the new snapshot's users.
+
+    Presence (user_appeared/user_disappeared) is only diffed for payloads marked
+    as full inbox snapshots; a partial or hand-made payload lacking a user
+    says nothing about them.
+    """
+
+    def __init__(self, event_log=None):
+        """
+        Args:
+            event_log (EventLog): Where the previous snapshot is read from and the events go;
+                None only collects the events
+        """
+        self.event_log = event_log
+        self.snapshot_users = None
+        self.events = []
+
+    def begin(self):
+        if self.event_log is None:
+            return
+        try:
+            users = self.event_log.snapshot_users()
+            self.snapshot_users = None if users is None else set(users)
+        except Exception as e:
+            logger.error(f"Song event log unavailable, saving without events: {e}", exc_info=True)
+            self.event_log = None
+
+    def _event(self, event_type, username, seen_at, **data):
+        self.events.append({"type": event_type, "user": username, "seen_at": seen_at, "data": data})
+
+    def observe(self, states, payload, seen_at, snapshot=False):
+        for username, songs in payload.items():
+            state = states.get(username)
+            if snapshot and self.snapshot_users is not None:
+                known = username in self.snapshot_users
+            else:
+                known = state is not None
+            if not known:
+                self._event("user_appeared", username, seen_at)
+
+            state = state or {"current-played": "", "known-songs": set(), "known-notes": set()}
+            current = state["current-played"]
+            known_songs = set(state["known-songs"])
+            known_notes = set(state["known-notes"])
+            for song_item in songs:
+                song_string = song_string_for(song_item)
+                # Note-only items are stored as " by " and aren't songs
+                if song_item['song']:
+                    if song_string not in known_songs:
+                        self._event("new_song", username, seen_at, song=song_string,
+                                    title=song_item['song'], artist=song_item['artist'])
+                    if song_string != current:
+                        self._event("current_song_changed", username, seen_at,
+                                    previous="" if current == " by " else current, current=song_string)
+                known_songs.add(song_string)
+                current = song_string
+
+                note = song_item.get("note", "")
+                if note and note not in known_notes:
+                    known_notes.add(note)
+                    self._event("new_note", username, seen_at, note=note)
+
+        if not snapshot:
+            return
+        # A full inbox snapshot: whoever it lacks has no note up anymore
+        if self.snapshot_users is not None:
+            for username in sorted(self.snapshot_users - set(payload)):
+                self._event("user_disappeared", username, seen_at)
+        self.snapshot_users = set(payload)
+
+    def finish(self):
+        if self.event_log is None:
+            return
+        try:
+            record_events(self)
+        except Exception as e:
+            # The history itself is saved; a lost event must not turn the save into a failure
+            logger.error(f"Could not record song events: {e}", exc_info=True)
+
+
+class EventLog:
+    """Append-only event log in SQLite (WAL mode); ids increase monotonically and serve as cursors."""
+
+    def __init__(self, path=EVENTS_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def snapshot_users(self):
+        """Users of the last recorded snapshot, or None before the first one."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'snapshot_users'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append(self, events, snapshot_users=None):
+        """
+        Store events and the users of the latest snapshot in one transaction.
+
+        Returns:
+            list: The stored events with their "id" and "created_at".
+        """
+        now = time.time()
+        stored = []
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for event in events:
+                    cursor = conn.execute(
+                        "INSERT INTO events (created_at, seen_at, type, user, data) VALUES (?, ?, ?, ?, ?)",
+                        (now, event.get("seen_at"), event["type"], event["user"], json.dumps(event.get("data", {})))
+                    )
+                    stored.append({"id": cursor.lastrowid, "created_at": now, **event})
+                if snapshot_users is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('snapshot_users', ?)",
+                        (json.dumps(sorted(snapshot_users)),)
+                    )
+                if RETENTION_DAYS:
+                    conn.execute("DELETE FROM events WHERE created_at < ?", (now - RETENTION_DAYS * 86400,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return stored
+
+    def read(self, cursor=0, limit=100, event_type=None, username=None):
+        """
+        Return up to ``limit`` events with an id greater than ``cursor``, oldest first.
+
+        Returns:
+            dict: "events" plus "next_cursor", the value to pass on the next call.
+        """
+        query = "SELECT id, created_at, seen_at, type, user, data FROM events WHERE id > ?"
+        params = [cursor]
+        if event_type:
+            query += " AND type = ?"
+            params.append(event_type)
+        if username:
+            query += " AND user = ?"
+            params.append(username)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        events = [
+            {"id": event_id, "created_at": created_at, "seen_at": seen_at, "type": kind, "user": user,
+             "data": json.loads(data)}
+            for event_id, created_at, seen_at, kind, user, data in rows
+        ]
+        return {"events": events, "next_cursor": events[-1]["id"] if events else cursor}
+
+
+_event_log = None
+_event_log_lock = threading.Lock()
+
+
+def get_event_log():
+    global _event_log
+    with _event_log_lock:
+        if _event_log is None:
+            _event_log = EventLog()
+        return _event_log
+
+
+def _push(events):
+    for url in WEBHOOK_URLS:
+        try:
+            requests.post(url, json={"events": events}, timeout=WEBHOOK_TIMEOUT)
+            logger.info(f"Delivered {len(events)} song events to {url}")
+        except requests.RequestException as e:
+            logger.error(f"Pushing song events to {url} failed: {e}")
+
+
+def record_events(differ):
+    """
+    Append the events a SnapshotDiffer collected and push them to SONG_EVENT_WEBHOOKS.
+
+    Returns:
+        list: The stored events.
+    """
+    stored = (differ.event_log or get_event_log()).append(differ.events, differ.snapshot_users)
+    if stored:
+        logger.info(f"Recorded {len(stored)} song events.")
+        if WEBHOOK_URLS:
+            threading.Thread(target=_push, args=(stored,), name="song-event-push", daemon=True).start()
+    return stored
@@ -0,0 +1,257 @@
+"""
+Write-behind queue for /webhook/song_note.
+
+Accepted payloads are appended to an fsync'ed JSON-lines file and merged into
+the history in batches, either once SONG_NOTE_BATCH_SIZE payloads are waiting
+or every SONG_NOTE_FLUSH_INTERVAL seconds. A flush first renames the queue to
+a ".processing" file, so payloads arriving meanwhile go to a fresh queue, and
+only deletes it after the store write succeeded; a crashed flush is retried.
+A batch that fails SONG_NOTE_MAX_FLUSH_ATTEMPTS times is saved one payload at
+a time instead, and the payloads that still fail are moved to a dead-letter
+file so they can't hold up the rest of the queue.
+"""
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from contextlib import contextmanager
+
+from tools.simple_song_history import save_song_history_batch
+from tools.song_history_store import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+QUEUE_FILE = os.path.join(DATA_DIR, 'song_note_queue.jsonl')
+PROCESSING_FILE = f"{QUEUE_FILE}.processing"
+QUEUE_LOCK_FILE = f"{QUEUE_FILE}.lock"
+FLUSH_LOCK_FILE = f"{QUEUE_FILE}.flush.lock"
+STATE_FILE = os.path.join(DATA_DIR, 'song_note_queue_state.json')
+ATTEMPTS_FILE = f"{PROCESSING_FILE}.attempts"
+DEAD_LETTER_FILE = os.path.join(DATA_DIR, 'song_note_queue.dead.jsonl')
+
+WRITE_BEHIND = os.getenv("SONG_NOTE_WRITE_BEHIND", "0") == "1"
+BATCH_SIZE = int(os.getenv("SONG_NOTE_BATCH_SIZE", 50))
+FLUSH_INTERVAL = float(os.getenv("SONG_NOTE_FLUSH_INTERVAL", 5))
+MAX_FLUSH_ATTEMPTS = int(os.getenv("SONG_NOTE_MAX_FLUSH_ATTEMPTS", 3))
+
+
+@contextmanager
+def _file_lock(path):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_entries(path):
+    entries = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-append
+                    logger.warning(f"Skipping corrupt queue entry in {path}")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _count_lines(path):
+    try:
+        with open(path, 'rb') as f:
+            return sum(1 for line in f if line.strip())
+    except FileNotFoundError:
+        return 0
+
+
+def _record_failed_attempt():
+    """Count a failed flush of the current .processing file; returns the attempts so far."""
+    try:
+        with open(ATTEMPTS_FILE, 'r') as f:
+            attempts = int(f.read() or 0)
+    except (OSError, ValueError):
+        attempts = 0
+    attempts += 1
+    with open(ATTEMPTS_FILE, 'w') as f:
+        f.write(str(attempts))
+    return attempts
+
+
+def _dead_letter(entries):
+    """Append entries that can't be saved to the dead-letter file."""
+    with open(DEAD_LETTER_FILE, 'a') as f:
+        for entry in entries:
+            f.write(json.dumps({**entry, "dead_at": time.time()}) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _batch(entries):
+    return [(entry["payload"], datetime.fromtimestamp(entry["enqueued_at"]).isoformat()) for entry in entries]
+
+
+def _save_one_by_one(entries):
+    """Save each entry on its own, dead-lettering the ones that fail. Returns the entries saved."""
+    saved, dead = [], []
+    for entry in entries:
+        (saved if save_song_history_batch(_batch([entry])) else dead).append(entry)
+    if dead:
+        _dead_letter(dead)
+        logger.error(f"Moved {len(dead)} queued payloads that keep failing to {DEAD_LETTER_FILE}.")
+    return saved
+
+
+def _finish_processing():
+    for path in (PROCESSING_FILE, ATTEMPTS_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def enqueue(payload):
+    """
+    Durably append a validated payload to the queue.
+
+    Returns:
+        int: Number of payloads waiting in the queue, including this one.
+    """
+    entry = {"enqueued_at": time.time(), "payload": payload}
+    with _file_lock(QUEUE_LOCK_FILE):
+        with open(QUEUE_FILE, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        depth = _count_lines(QUEUE_FILE)
+
+    start_flusher()
+    if depth >= BATCH_SIZE:
+        _flush_requested.set()
+    return depth
+
+
+def flush():
+    """
+    Merge every queued payload into the history with one store write.
+
+    After MAX_FLUSH_ATTEMPTS failed writes of the same batch its payloads are
+    saved one by one and those that still fail are dead-lettered.
+
+    Returns:
+        int: Number of payloads written (0 when the queue was empty or the write failed).
+    """
+    with _file_lock(FLUSH_LOCK_FILE):
+        with _file_lock(QUEUE_LOCK_FILE):
+            if not os.path.exists(PROCESSING_FILE) and os.path.exists(QUEUE_FILE):
+                os.replace(QUEUE_FILE, PROCESSING_FILE)
+
+        entries = _read_entries(PROCESSING_FILE)
+        if not entries:
+            _finish_processing()
+            return 0
+
+        if not save_song_history_batch(_batch(entries)):
+            attempts = _record_failed_attempt()
+            if attempts < MAX_FLUSH_ATTEMPTS:
+                logger.error(f"Flushing {len(entries)} queued payloads failed (attempt {attempts} of "
+                             f"{MAX_FLUSH_ATTEMPTS}), keeping them for the next attempt.")
+                return 0
+            logger.error(f"Flushing {len(entries)} queued payloads failed {attempts} times, saving them one by one.")
+            saved = _save_one_by_one(entries)
+        else:
+            saved = entries
+
+        _finish_processing()
+        now = time.time()
+        state = {
+            "last_flush_at": now,
+            "last_flush_count": len(saved),
+            "last_flush_lag_seconds": now - entries[0]["enqueued_at"],
+        }
+        tmp_path = f"{STATE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, STATE_FILE)
+        logger.info(f"Flushed {len(saved)} queued song history payloads.")
+        return len(saved)
+
+
+def queue_status():
+    """Report queue depth and how far behind the history is."""
+    with _file_lock(QUEUE_LOCK_FILE):
+        depth = _count_lines(PROCESSING_FILE) + _count_lines(QUEUE_FILE)
+        oldest = None
+        for path in (PROCESSING_FILE, QUEUE_FILE):
+            try:
+                with open(path, 'r') as f:
+                    oldest = json.loads(f.readline())["enqueued_at"]
+                    break
+            except (FileNotFoundError, json.JSONDecodeError, KeyError):
+                continue
+
+    try:
+        with open(STATE_FILE, 'r') as f:
+            state = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        state = {}
+
+    return {
+        "write_behind": WRITE_BEHIND,
+        "depth": depth,
+        "dead_letters": _count_lines(DEAD_LETTER_FILE),
+        "oldest_enqueued_at": oldest,
+        "flush_lag_seconds": time.time() - oldest if oldest else 0,
+        "batch_size": BATCH_SIZE,
+        "flush_interval_seconds": FLUSH_INTERVAL,
+        **state,
+    }
+
+
+_flush_requested = threading.Event()
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flusher_loop():
+    while True:
+        _flush_requested.wait(FLUSH_INTERVAL)
+        _flush_requested.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Background flush failed: {e}", exc_info=True)
+
+
+def start_flusher():
+    """Start this process' flusher thread (again after a fork, where threads don't survive)."""
+    global _flusher_pid
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flusher_loop, name="song-note-flusher", daemon=True).start()
+
+
+def flush_on_shutdown():
+    """Write out whatever is still queued; called at exit and from the gunicorn worker_exit hook."""
+    if not WRITE_BEHIND:
+        return
+    try:
+        flushed = flush()
+        if flushed:
+            logger.info(f"Flushed {flushed} queued payloads on shutdown.")
+    except Exception as e:
+        logger.error(f"Flush on shutdown failed: {e}", exc_info=True)
+
+
+atexit.register(flush_on_shutdown)
@@ -0,0 +1,789 @@
+"""
+Storage backends for the song history.
+
+The JSON backend keeps data/songs_data.json as the source of truth and
+rewrites it atomically under a cross-process lock. The SQLite backend
+(SONG_HISTORY_BACKEND=sqlite) keeps users, songs and notes in separate tables
+in WAL mode, so a save only touches the rows of the users in the payload.
+
+Usage (from the project root):
+    python -m tools.song_history_store import [songs_data.json]   # JSON file -> SQLite
+    python -m tools.song_history_store export [songs_data.json]   # SQLite -> JSON file
+"""
+import fcntl
+import json
+import os
+import sqlite3
+import sys
+import threading
+import logging
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Define the project's root directory by going up two levels from the current file
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(ROOT_DIR, 'data'))
+JSON_FILE = os.path.join(DATA_DIR, 'songs_data.json')
+DB_FILE = os.getenv("SONG_HISTORY_DB", os.path.join(DATA_DIR, 'songs_data.db'))
+BACKEND = os.getenv("SONG_HISTORY_BACKEND", "json")
+
+
+def song_string_for(song_item):
+    return f"{song_item['song']} by {song_item['artist']}"
+
+
+def unwrap_payload(data):
+    """
+    Split a song_note payload into (users, snapshot).
+
+    A payload is either a plain {username: [song items]} mapping or an envelope
+    {"users": {...}, "snapshot": true} sent by a scraper that saw the whole
+    inbox. Only snapshots say anything about who is *not* in the inbox.
+    """
+    if isinstance(data, dict) and isinstance(data.get("users"), dict):
+        return data["users"], data.get("snapshot") is True
+    return data, False
+
+
+def new_user_entry():
+    return {
+        "songs-played": [],
+        "current-played": "",
+        "note": "",
+        "notes": [],
+        "song-stats": {}
+    }
+
+
+class UserHistoryIndex:
+    """
+    Ordered set view over one user's entry in songs_data.json.
+
+    The "songs-played" and "notes" lists keep insertion order, the sets beside
+    them answer membership in O(1). Per-song first/last sighting and play
+    counts live in the entry's "song-stats" mapping.
+    """
+
+    def __init__(self, entry):
+        self.entry = entry
+        entry.setdefault("songs-played", [])
+        entry.setdefault("notes", [])
+        self.stats = entry.setdefault("song-stats", {})
+        self._songs = set(entry["songs-played"])
+        self._notes = set(entry["notes"])
+
+    def __contains__(self, song_string):
+        return song_string in self._songs
+
+    def add_song(self, song_string, seen_at):
+        """
+        Record a sighting of ``song_string`` and make it the current song.
+
+        A play is counted when the song is new or replaces a different current
+        song; seeing the same current song again only moves "last-seen".
+
+        Returns:
+            bool: True if the song was not in the history yet
+        """
+        is_new = song_string not in self._songs
+        if is_new:
+            self._songs.add(song_string)
+            self.entry["songs-played"].append(song_string)
+
+        stats = self.stats.get(song_string)
+        if stats is None:
+            self.stats[song_string] = {"first-seen": seen_at, "last-seen": seen_at, "plays": 1}
+        else:
+            if song_string != self.entry.get("current-played"):
+                stats["plays"] += 1
+            stats["last-seen"] = seen_at
+
+        self.entry["current-played"] = song_string
+        return is_new
+
+    def add_note(self, note):
+        """Returns True if ``note`` was not in the history yet."""
+        if note in self._notes:
+            return False
+        self._notes.add(note)
+        self.entry["notes"].append(note)
+        return True
+
+    def has_note(self, note):
+        return note in self._notes
+
+
+def user_index(user_data, indexes, username, create=False):
+    """
+    The UserHistoryIndex of ``username``, built on first use and kept in ``indexes``.
+
+    Returns None for a user who isn't in ``user_data`` yet, unless ``create``
+    adds an empty entry for them.
+    """
+    index = indexes.get(username)
+    if index is None:
+        if username not in user_data:
+            if not create:
+                return None
+            user_data[username] = new_user_entry()
+        index = indexes[username] = UserHistoryIndex(user_data[username])
+    return index
+
+
+def merge_payload(user_data, payload, seen_at=None, indexes=None):
+    """
+    Merge a webhook payload into the ``users`` mapping of the JSON document, in place.
+
+    Args:
+        user_data (dict): The 'users' object of songs_data.json
+        payload (dict): A dictionary of users and their songs
+        seen_at (str): ISO timestamp recorded for the sightings, defaults to now
+        indexes (dict): UserHistoryIndex by username, reused and filled in
+            (see user_index) so the sets are only built once per document
+
+    Returns:
+        list: (artist, title) of the songs that were new to a user's history
+    """
+    seen_at = seen_at or datetime.now().isoformat()
+    indexes = {} if indexes is None else indexes
+    added = []
+    new_notes = 0
+    for username, songs in payload.items():
+        logger.debug("Processing user: %s", username, extra={"sample": "history_item"})
+        index = user_index(user_data, indexes, username, create=True)
+
+        for song_item in songs:
+            song_string = song_string_for(song_item)
+            if index.add_song(song_string, seen_at):
+                added.append((song_item['artist'], song_item['song']))
+                logger.debug("Adding new song for %s: %s", username, song_string, extra={"sample": "history_item"})
+            else:
+                logger.debug("Song already exists for %s, skipping: %s", username, song_string,
+                             extra={"sample": "history_item"})
+
+            note = song_item.get("note", "")
+            user_data[username]["note"] = note
+
+            if note and index.add_note(note):
+                new_notes += 1
+                logger.debug("Adding new note for %s: %s", username, note, extra={"sample": "history_item"})
+            elif note:
+                logger.debug("Note already exists for %s, skipping: %s", username, note,
+                             extra={"sample": "history_item"})
+    logger.info(f"Merged payload for {len(payload)} users: {len(added)} new songs, {new_notes} new notes")
+    return added
+
+
+def previous_state(index, songs):
+    """
+    What the history knew about a user before ``songs`` (one payload's items) are merged.
+
+    Only the payload's own songs and notes are looked up, so both backends
+    can answer this without loading the user's whole history.
+
+    Args:
+        index (UserHistoryIndex): The user's index, or None if the user isn't in the history yet
+
+    Returns:
+        dict: "current-played" plus the "known-songs" and "known-notes" among the payload's items,
+        or None if the user isn't in the history yet.
+    """
+    if index is None:
+        return None
+    return {
+        "current-played": index.entry.get("current-played", ""),
+        "known-songs": {song for song in (song_string_for(item) for item in songs) if song in index},
+        "known-notes": {note for note in (item.get("note", "") for item in songs) if index.has_note(note)},
+    }
+
+
+def _song_row(username, song_string, stats):
+    title, _, artist = song_string.rpartition(" by ")
+    return {
+        "user": username,
+        "song": song_string,
+        "title": title,
+        "artist": artist,
+        "first-seen": stats.get("first-seen"),
+        "last-seen": stats.get("last-seen"),
+        # Songs saved before play statistics existed count as one play
+        "plays": stats.get("plays", 1),
+    }
+
+
+def _user_summary(entry, song_count):
+    return {
+        "current-played": entry.get("current-played", ""),
+        "note": entry.get("note", ""),
+        "notes": entry.get("notes", []),
+        "songs-played-count": song_count,
+    }
+
+
+class HistoryView:
+    """
+    Read-optimized view over a parsed songs_data.json document.
+
+    Built once per file version; recent plays and top songs/artists are
+    precomputed so queries don't walk the whole history.
+    """
+
+    def __init__(self, data):
+        self.last_updated = data.get("last_updated")
+        self.users = data.get("users", {})
+
+        self.recent = []
+        songs = {}
+        artists = {}
+        for username, entry in self.users.items():
+            stats = entry.get("song-stats", {})
+            for song_string in entry.get("songs-played", []):
+                row = _song_row(username, song_string, stats.get(song_string, {}))
+                if not row["title"]:
+                    # Note-only entries are stored as " by "
+                    continue
+                if row["last-seen"]:
+                    self.recent.append(row)
+                song = songs.setdefault(song_string, {"song": song_string, "title": row["title"],
+                                                      "artist": row["artist"], "plays": 0, "listeners": 0})
+                song["plays"] += row["plays"]
+                song["listeners"] += 1
+                artist = artists.setdefault(row["artist"], {"artist": row["artist"], "plays": 0, "listeners": set()})
+                artist["plays"] += row["plays"]
+                artist["listeners"].add(username)
+
+        self.recent.sort(key=lambda row: row["last-seen"], reverse=True)
+        self.top_songs = sorted(songs.values(), key=lambda song: (song["plays"], song["listeners"]), reverse=True)
+        for artist in artists.values():
+            artist["listeners"] = len(artist["listeners"])
+        self.top_artists = sorted(artists.values(), key=lambda artist: (artist["plays"], artist["listeners"]), reverse=True)
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonHistoryStore:
+    """
+    songs_data.json, rewritten atomically while holding an exclusive lock file.
+
+    The users mapping and its UserHistoryIndex sets are kept between saves
+    for as long as the file is the one this store last wrote, so a save only
+    re-reads the file after another process changed it.
+    """
+
+    def __init__(self, path=JSON_FILE):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._view_cache = None
+        self._view_lock = threading.Lock()
+        # (file version, users, indexes) as of this store's last save; only used under the file lock
+        self._document = None
+
+    @contextmanager
+    def _locked(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            logger.info(f"Data directory not found. Creating directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _version(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _load_indexed(self):
+        """Return (users, indexes) of the current file, reusing those of the last save when it is unchanged."""
+        if self._document is not None and self._document[0] == self._version():
+            return self._document[1], self._document[2]
+        self._document = None
+        return self._load(), {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"JSON file not found at {self.path}. Starting with an empty structure.")
+            return {}
+        logger.info(f"Loading existing data from {self.path}")
+        with open(self.path, 'r') as f:
+            try:
+                return json.load(f).get('users', {})
+            except json.JSONDecodeError:
+                logger.warning(f"Could not decode JSON from {self.path}. Starting with an empty structure.")
+                return {}
+
+    def save_payload(self, payload):
+        return self.save_payloads([(payload, None)])
+
+    def save_payloads(self, batch, observer=None):
+        """
+        Merge several payloads with a single read and write of the file.
+
+        Args:
+            batch (list): (payload, seen_at) pairs, applied in order; seen_at may be None for "now".
+                A payload may be a snapshot envelope (see unwrap_payload).
+            observer: Notified while the store lock is held: observer.begin() first, then
+                observer.observe(states, users, seen_at, snapshot) before each payload is merged,
+                with the previous_state() of every user in it, and observer.finish() once the
+                batch is written
+
+        Returns:
+            list: (artist, title) of the songs that were new to a user's history, in merge order
+        """
+        added = []
+        with self._locked():
+            user_data, indexes = self._load_indexed()
+            # Dropped until the write succeeded: a failed save may leave the in-memory copy half merged
+            self._document = None
+            if observer is not None:
+                observer.begin()
+            for payload, seen_at in batch:
+                seen_at = seen_at or datetime.now().isoformat()
+                users, snapshot = unwrap_payload(payload)
+                if observer is not None:
+                    observer.observe({username: previous_state(user_index(user_data, indexes, username), songs)
+                                      for username, songs in users.items()}, users, seen_at, snapshot)
+                added.extend(merge_payload(user_data, users, seen_at, indexes))
+
+            # Prepare the final data structure with a top-level timestamp
+            output_data = {
+                "last_updated": datetime.now().isoformat(),
+                "users": user_data
+            }
+
+            logger.info(f"Writing updated data to {self.path}")
+            _write_json_atomic(self.path, output_data)
+            self._document = (self._version(), user_data, indexes)
+            if observer is not None:
+                observer.finish()
+        return added
+
+    def export_data(self):
+        with self._locked():
+            if not os.path.exists(self.path):
+                return {"last_updated": None, "users": {}}
+            with open(self.path, 'r') as f:
+                return json.load(f)
+
+    def _view(self):
+        """Return the HistoryView of the current file, re-parsing only when the file changed."""
+        version = self._version()
+        with self._view_lock:
+            if self._view_cache is None or self._view_cache[0] != version:
+                data = {}
+                if version is not None:
+                    with open(self.path, 'r') as f:
+                        try:
+                            data = json.load(f)
+                        except json.JSONDecodeError:
+                            logger.warning(f"Could not decode JSON from {self.path}.")
+                self._view_cache = (version, HistoryView(data))
+            return self._view_cache[1]
+
+    def last_updated(self):
+        return self._view().last_updated
+
+    def get_user(self, username):
+        entry = self._view().users.get(username)
+        if entry is None:
+            return None
+        return _user_summary(entry, len(entry.get("songs-played", [])))
+
+    def songs_played(self, username, offset=0, limit=50):
+        entry = self._view().users.get(username)
+        if entry is None:
+            return None
+        songs = entry.get("songs-played", [])
+        stats = entry.get("song-stats", {})
+        return {
+            "total": len(songs),
+            "items": [_song_row(username, song, stats.get(song, {})) for song in songs[offset:offset + limit]],
+        }
+
+    def recent_plays(self, since=None, limit=50):
+        rows = self._view().recent
+        if since:
+            # Sorted newest first: stop at the first play that isn't newer than ``since``
+            end = next((i for i, row in enumerate(rows) if row["last-seen"] <= since), len(rows))
+            rows = rows[:end]
+        return rows[:limit]
+
+    def top_songs(self, limit=10):
+        return self._view().top_songs[:limit]
+
+    def top_artists(self, limit=10):
+        return self._view().top_artists[:limit]
+
+
+class SqliteHistoryStore:
+    """
+    Song history in SQLite (WAL mode).
+
+    Writers take the database write lock with BEGIN IMMEDIATE, so concurrent
+    gunicorn workers and the tracker serialize their upserts instead of
+    overwriting each other. Insertion order of songs and notes is kept through
+    the autoincrement ids.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            current_played TEXT NOT NULL DEFAULT '',
+            note TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS songs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            song_string TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL DEFAULT '',
+            artist TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS user_songs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            song_id INTEGER NOT NULL REFERENCES songs(id),
+            first_seen TEXT,
+            last_seen TEXT,
+            play_count INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (user_id, song_id)
+        );
+        CREATE TABLE IF NOT EXISTS user_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            note TEXT NOT NULL,
+            UNIQUE (user_id, note)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            logger.info(f"Data directory not found. Creating directory: {directory}")
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(self.SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        # Databases created before play statistics were tracked lack these columns
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(user_songs)")}
+        for column, definition in (("first_seen", "TEXT"), ("last_seen", "TEXT"),
+                                   ("play_count", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE user_songs ADD COLUMN {column} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_songs_last_seen ON user_songs (last_seen)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _user_id(conn, username):
+        conn.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (username,))
+        return conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+    @staticmethod
+    def _song_id(conn, song_string, title, artist):
+        conn.execute(
+            "INSERT OR IGNORE INTO songs (song_string, title, artist) VALUES (?, ?, ?)",
+            (song_string, title, artist)
+        )
+        return conn.execute("SELECT id FROM songs WHERE song_string = ?", (song_string,)).fetchone()[0]
+
+    @staticmethod
+    def _touch(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_updated', ?)",
+            (datetime.now().isoformat(),)
+        )
+
+    def save_payload(self, payload):
+        return self.save_payloads([(payload, None)])
+
+    def save_payloads(self, batch, observer=None):
+        """
+        Apply several payloads in one transaction.
+
+        Args:
+            batch (list): (payload, seen_at) pairs, applied in order; seen_at may be None for "now"
+            observer: See JsonHistoryStore.save_payloads; finish() runs just before the commit,
+                while the write lock is still held
+
+        Returns:
+            list: See JsonHistoryStore.save_payloads
+        """
+        added = []
+        with self._transaction() as conn:
+            if observer is not None:
+                observer.begin()
+            for payload, seen_at in batch:
+                seen_at = seen_at or datetime.now().isoformat()
+                users, snapshot = unwrap_payload(payload)
+                if observer is not None:
+                    observer.observe({username: self._previous_state(conn, username, songs)
+                                      for username, songs in users.items()}, users, seen_at, snapshot)
+                added.extend(self._apply_payload(conn, users, seen_at))
+            self._touch(conn)
+            if observer is not None:
+                observer.finish()
+        return added
+
+    @staticmethod
+    def _previous_state(conn, username, songs):
+        row = conn.execute("SELECT id, current_played FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        user_id, current_played = row
+        song_strings = list({song_string_for(item) for item in songs})
+        notes = list({item.get("note", "") for item in songs})
+        known_songs = set()
+        known_notes = set()
+        # Chunked to stay below SQLite's bound-parameter limit
+        for start in range(0, len(song_strings), 500):
+            chunk = song_strings[start:start + 500]
+            known_songs.update(song for (song,) in conn.execute(
+                "SELECT s.song_string FROM user_songs us JOIN songs s ON s.id = us.song_id "
+                f"WHERE us.user_id = ? AND s.song_string IN ({','.join('?' * len(chunk))})", (user_id, *chunk)))
+        for start in range(0, len(notes), 500):
+            chunk = notes[start:start + 500]
+            known_notes.update(note for (note,) in conn.execute(
+                f"SELECT note FROM user_notes WHERE user_id = ? AND note IN ({','.join('?' * len(chunk))})",
+                (user_id, *chunk)))
+        return {"current-played": current_played, "known-songs": known_songs, "known-notes": known_notes}
+
+    def _apply_payload(self, conn, payload, seen_at):
+        """Upsert one payload's users, songs and notes; returns (artist, title) of the songs new to a user."""
+        added = []
+        new_notes = 0
+        for username, songs in payload.items():
+            logger.debug("Processing user: %s", username, extra={"sample": "history_item"})
+            user_id = self._user_id(conn, username)
+            (current_played,) = conn.execute("SELECT current_played FROM users WHERE id = ?", (user_id,)).fetchone()
+            for song_item in songs:
+                song_string = song_string_for(song_item)
+                song_id = self._song_id(conn, song_string, song_item['song'], song_item['artist'])
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO user_songs (user_id, song_id, first_seen, last_seen, play_count) "
+                    "VALUES (?, ?, ?, ?, 1)", (user_id, song_id, seen_at, seen_at)
+                ).rowcount
+                if inserted:
+                    added.append((song_item['artist'], song_item['song']))
+                    logger.debug("Adding new song for %s: %s", username, song_string, extra={"sample": "history_item"})
+                else:
+                    conn.execute(
+                        "UPDATE user_songs SET last_seen = ?, first_seen = COALESCE(first_seen, ?), "
+                        "play_count = play_count + ? WHERE user_id = ? AND song_id = ?",
+                        (seen_at, seen_at, int(song_string != current_played), user_id, song_id)
+                    )
+                current_played = song_string
+
+                note = song_item.get("note", "")
+                conn.execute(
+                    "UPDATE users SET current_played = ?, note = ? WHERE id = ?", (song_string, note, user_id)
+                )
+                if note and conn.execute(
+                    "INSERT OR IGNORE INTO user_notes (user_id, note) VALUES (?, ?)", (user_id, note)
+                ).rowcount:
+                    new_notes += 1
+                    logger.debug("Adding new note for %s: %s", username, note, extra={"sample": "history_item"})
+        logger.info(f"Merged payload for {len(payload)} users: {len(added)} new songs, {new_notes} new notes")
+        return added
+
+    def import_data(self, data):
+        """Load a songs_data.json document. Existing rows are kept, scalar fields are overwritten."""
+        users = data.get('users', {})
+        with self._transaction() as conn:
+            for username, entry in users.items():
+                user_id = self._user_id(conn, username)
+                song_stats = entry.get("song-stats", {})
+                for song_string in entry.get("songs-played", []):
+                    title, _, artist = song_string.rpartition(" by ")
+                    song_id = self._song_id(conn, song_string, title, artist)
+                    stats = song_stats.get(song_string, {})
+                    conn.execute(
+                        "INSERT OR IGNORE INTO user_songs (user_id, song_id, first_seen, last_seen, play_count) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (user_id, song_id, stats.get("first-seen"), stats.get("last-seen"), stats.get("plays", 0))
+                    )
+                for note in entry.get("notes", []):
+                    conn.execute("INSERT OR IGNORE INTO user_notes (user_id, note) VALUES (?, ?)", (user_id, note))
+                conn.execute(
+                    "UPDATE users SET current_played = ?, note = ? WHERE id = ?",
+                    (entry.get("current-played", ""), entry.get("note", ""), user_id)
+                )
+            if data.get("last_updated"):
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_updated', ?)", (data["last_updated"],)
+                )
+            else:
+                self._touch(conn)
+        logger.info(f"Imported {len(users)} users into {self.path}")
+
+    def export_data(self):
+        """Return the history in the songs_data.json shape."""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN")
+            users = {}
+            by_id = {}
+            for user_id, username, current_played, note in conn.execute(
+                    "SELECT id, username, current_played, note FROM users ORDER BY id"):
+                users[username] = by_id[user_id] = {
+                    "songs-played": [],
+                    "current-played": current_played,
+                    "note": note,
+                    "notes": [],
+                    "song-stats": {}
+                }
+            for user_id, song_string, first_seen, last_seen, play_count in conn.execute(
+                    "SELECT us.user_id, s.song_string, us.first_seen, us.last_seen, us.play_count "
+                    "FROM user_songs us JOIN songs s ON s.id = us.song_id ORDER BY us.id"):
+                by_id[user_id]["songs-played"].append(song_string)
+                if first_seen:
+                    by_id[user_id]["song-stats"][song_string] = {
+                        "first-seen": first_seen, "last-seen": last_seen, "plays": play_count
+                    }
+            for user_id, note in conn.execute("SELECT user_id, note FROM user_notes ORDER BY id"):
+                by_id[user_id]["notes"].append(note)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_updated'").fetchone()
+            conn.execute("COMMIT")
+        return {"last_updated": row[0] if row else None, "users": users}
+
+    def last_updated(self):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'last_updated'").fetchone()
+        return row[0] if row else None
+
+    def get_user(self, username):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, current_played, note FROM users WHERE username = ?", (username,)
+            ).fetchone()
+            if row is None:
+                return None
+            user_id, current_played, note = row
+            notes = [note for (note,) in conn.execute(
+                "SELECT note FROM user_notes WHERE user_id = ? ORDER BY id", (user_id,))]
+            (song_count,) = conn.execute("SELECT COUNT(*) FROM user_songs WHERE user_id = ?", (user_id,)).fetchone()
+        return _user_summary({"current-played": current_played, "note": note, "notes": notes}, song_count)
+
+    def songs_played(self, username, offset=0, limit=50):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return None
+            (total,) = conn.execute("SELECT COUNT(*) FROM user_songs WHERE user_id = ?", (row[0],)).fetchone()
+            items = conn.execute(
+                "SELECT s.song_string, us.first_seen, us.last_seen, us.play_count FROM user_songs us "
+                "JOIN songs s ON s.id = us.song_id WHERE us.user_id = ? ORDER BY us.id LIMIT ? OFFSET ?",
+                (row[0], limit, offset)
+            ).fetchall()
+        return {
+            "total": total,
+            "items": [self._row(username, *item) for item in items],
+        }
+
+    @staticmethod
+    def _row(username, song_string, first_seen, last_seen, play_count):
+        stats = {"first-seen": first_seen, "last-seen": last_seen}
+        if first_seen:
+            stats["plays"] = play_count
+        return _song_row(username, song_string, stats)
+
+    def recent_plays(self, since=None, limit=50):
+        with closing(self._connect()) as conn:
+            items = conn.execute(
+                "SELECT u.username, s.song_string, us.first_seen, us.last_seen, us.play_count FROM user_songs us "
+                "JOIN users u ON u.id = us.user_id JOIN songs s ON s.id = us.song_id "
+                "WHERE us.last_seen > ? AND s.title != '' ORDER BY us.last_seen DESC LIMIT ?",
+                (since or '', limit)
+            ).fetchall()
+        return [self._row(*item) for item in items]
+
+    def top_songs(self, limit=10):
+        with closing(self._connect()) as conn:
+            items = conn.execute(
+                "SELECT s.song_string, s.title, s.artist, SUM(MAX(us.play_count, 1)) AS plays, COUNT(*) AS listeners "
+                "FROM user_songs us JOIN songs s ON s.id = us.song_id WHERE s.title != '' "
+                "GROUP BY s.id ORDER BY plays DESC, listeners DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"song": song, "title": title, "artist": artist, "plays": plays, "listeners": listeners}
+                for song, title, artist, plays, listeners in items]
+
+    def top_artists(self, limit=10):
+        with closing(self._connect()) as conn:
+            items = conn.execute(
+                "SELECT s.artist, SUM(MAX(us.play_count, 1)) AS plays, COUNT(DISTINCT us.user_id) AS listeners "
+                "FROM user_songs us JOIN songs s ON s.id = us.song_id WHERE s.title != '' "
+                "GROUP BY s.artist ORDER BY plays DESC, listeners DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"artist": artist, "plays": plays, "listeners": listeners} for artist, plays, listeners in items]
+
+
+_store = None
+
+
+def get_store():
+    """Return the configured history backend (SONG_HISTORY_BACKEND=json|sqlite)."""
+    global _store
+    if _store is None:
+        _store = SqliteHistoryStore() if BACKEND == "sqlite" else JsonHistoryStore()
+    return _store
+
+
+def import_json(json_path=JSON_FILE, db_path=DB_FILE):
+    """One-time import of an existing songs_data.json into the SQLite backend."""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    SqliteHistoryStore(db_path).import_data(data)
+
+
+def export_json(json_path=JSON_FILE, db_path=DB_FILE):
+    """Write the SQLite history to ``json_path`` in the songs_data.json shape."""
+    data = SqliteHistoryStore(db_path).export_data()
+    _write_json_atomic(json_path, data)
+    logger.info(f"Exported {len(data['users'])} users to {json_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[2] if len(sys.argv) > 2 else JSON_FILE
+    if sys.argv[1] == "import":
+        import_json(path)
+    else:
+        export_json(path)
@@ -0,0 +1,264 @@
+import os
+import time
+import atexit
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_pools: List["WebDriverPool"] = []
+_pools_lock = threading.Lock()
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    """
+    Resident memory of a process and all of its descendants, in MiB.
+    Reads /proc directly, so it returns 0 on platforms without it.
+    """
+    children = {}
+    try:
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces, the parent pid follows the closing parenthesis
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(parent, []).append(int(entry))
+    except OSError:
+        return 0.0
+
+    total_kib = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kib += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kib / 1024
+
+
+class MemoryLimitExceeded(RuntimeError):
+    """A browser was quit mid-scrape for using more memory than allowed."""
+
+
+@contextmanager
+def memory_limit(driver: Any, max_rss_mb: float, interval: float = 1.0, name: str = "webdriver"):
+    """
+    Watch the browser process tree while the block runs, and quit the browser
+    from a watchdog thread as soon as it grows beyond ``max_rss_mb``. Whatever
+    the block was doing then fails, and MemoryLimitExceeded is raised instead.
+    A limit of 0 disables the watchdog.
+    """
+    try:
+        pid = driver.service.process.pid
+    except Exception:
+        pid = None
+    if not max_rss_mb or pid is None:
+        yield
+        return
+
+    stop = threading.Event()
+    exceeded = []
+
+    def watch():
+        while not stop.wait(interval):
+            rss = process_tree_rss_mb(pid)
+            if rss > max_rss_mb:
+                exceeded.append(rss)
+                logger.warning(f"[{name}] Browser uses {rss:.0f} MiB, over its {max_rss_mb:.0f} MiB limit, quitting it")
+                try:
+                    driver.quit()
+                except Exception as e:
+                    logger.warning(f"Error while quitting WebDriver: {e}")
+                return
+
+    watchdog = threading.Thread(target=watch, name=f"{name}-memory-watchdog", daemon=True)
+    watchdog.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        watchdog.join()
+        if exceeded:
+            raise MemoryLimitExceeded(f"Browser exceeded its {max_rss_mb:.0f} MiB memory limit ({exceeded[0]:.0f} MiB)")
+
+
+class PooledDriver:
+    """A WebDriver plus the bookkeeping the pool needs to decide when to recycle it."""
+
+    def __init__(self, driver: Any):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Set by the caller once the driver has been logged in / pointed at the right page
+        self.bootstrapped = False
+
+    def rss_mb(self) -> float:
+        try:
+            return process_tree_rss_mb(self.driver.service.process.pid)
+        except Exception:
+            return 0.0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error while quitting WebDriver: {e}")
+
+
+class WebDriverPool:
+    """
+    Keeps up to ``size`` browsers alive between scrapes.
+
+    Idle drivers are health-checked before being handed out, and recycled after
+    ``max_uses`` scrapes, after ``idle_timeout`` seconds without use, or when
+    the browser process tree grows beyond ``max_rss_mb``.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 1, max_uses: int = 50,
+                 max_rss_mb: float = 1024, idle_timeout: float = 600, name: str = "webdriver"):
+        """
+        Args:
+            factory: Creates a new WebDriver
+            size: Maximum number of live drivers
+            max_uses: Scrapes served by a driver before it is replaced
+            max_rss_mb: Memory threshold of the browser process tree (0 disables the check)
+            idle_timeout: Seconds a driver may sit unused before it is replaced
+            name: Used in log messages
+        """
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self._idle: List[PooledDriver] = []
+        self._live = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        with _pools_lock:
+            _pools.append(self)
+
+    def _healthy(self, pooled: PooledDriver) -> bool:
+        if self.idle_timeout and time.monotonic() - pooled.last_used > self.idle_timeout:
+            logger.info(f"[{self.name}] Driver idle for too long, recycling it")
+            return False
+        try:
+            pooled.driver.execute_script("return 1")
+            return True
+        except Exception as e:
+            logger.warning(f"[{self.name}] Driver failed health check: {e}")
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledDriver:
+        """
+        Take a driver out of the pool, creating one if the pool isn't full yet.
+
+        Raises:
+            TimeoutError: if no driver became available within ``timeout`` seconds
+            RuntimeError: if the pool has been shut down
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"{self.name} pool is shut down")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._live < self.size:
+                    self._live += 1
+                    pooled = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No {self.name} driver available within {timeout}s")
+                self._cond.wait(remaining)
+
+        if pooled is not None:
+            if self._healthy(pooled):
+                return pooled
+            pooled.quit()
+
+        # Either the pool had room or an unhealthy driver was dropped: start a new browser
+        logger.info(f"[{self.name}] Starting a new driver")
+        try:
+            return PooledDriver(self.factory())
+        except Exception:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, pooled: PooledDriver, discard: bool = False):
+        """Return a driver to the pool, or quit it when it is broken or due for recycling."""
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+
+        reason = None
+        if discard:
+            reason = "discarded after an error"
+        elif self.max_uses and pooled.uses >= self.max_uses:
+            reason = f"served {pooled.uses} scrapes"
+        elif self.max_rss_mb:
+            rss = pooled.rss_mb()
+            if rss > self.max_rss_mb:
+                reason = f"uses {rss:.0f} MiB"
+
+        with self._cond:
+            if reason is None and not self._closed:
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            self._live -= 1
+            self._cond.notify()
+
+        logger.info(f"[{self.name}] Recycling driver: {reason or 'pool shut down'}")
+        pooled.quit()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """Context manager handing out a PooledDriver; it is discarded if the block raises."""
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled
+        except BaseException:
+            self.release(pooled, discard=True)
+            raise
+        else:
+            self.release(pooled)
+
+    def shutdown(self):
+        """Quit all idle drivers; drivers in use are quit when they are released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.quit()
+        if idle:
+            logger.info(f"[{self.name}] Shut down {len(idle)} idle drivers")
+
+
+def shutdown_all_pools():
+    """Shut down every pool created in this process (used on worker exit)."""
+    with _pools_lock:
+        pools = list(_pools)
+    for pool in pools:
+        pool.shutdown()
+
+
+atexit.register(shutdown_all_pools)
@@ -0,0 +1,242 @@
+"""
+Request parsing and response bodies shared by both serving modes.
+
+app.py (Flask) and async_app.py (aiohttp) only differ in how they run the
+tools: directly in the request thread, or on the event loop and its thread
+pools. Everything else, from reading the payload to the shape of the JSON
+they answer with, lives here so the two can't drift apart.
+
+Parsers raise WebhookError for a bad request; each app turns it into a JSON
+response (an errorhandler in app.py, a middleware in async_app.py).
+"""
+import hashlib
+
+from tools.deadline import DEADLINE_FIELD, DEADLINE_HEADER, parse_deadline
+from tools.lyrics_index import get_default_index
+from tools.registry import registry
+from tools.simple_song_history import validate_payload
+
+MAX_PAGE_SIZE = 500
+MAX_LYRICS_SEARCH_RESULTS = 50
+
+
+class WebhookError(Exception):
+    """A request the webhook refuses; ``body`` is sent as JSON with ``status``."""
+
+    def __init__(self, message, status=400, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body if body is not None else {'error': message}
+
+
+def positive_int(data, name, maximum=None, required=False):
+    """An integer payload field of at least 1, clamped to ``maximum``; None when absent and optional."""
+    value = data.get(name)
+    if value is None and not required:
+        return None
+    try:
+        if isinstance(value, (bool, float)):
+            raise ValueError
+        value = int(value)
+    except (TypeError, ValueError):
+        value = 0
+    if value < 1:
+        raise WebhookError(f'{name} must be a positive integer')
+    return min(value, maximum) if maximum is not None else value
+
+
+def positive_number(data, name):
+    """An optional payload field holding a number of seconds greater than 0."""
+    value = data.get(name)
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        value = float(value)
+    except (TypeError, ValueError):
+        value = 0
+    if not value > 0:
+        raise WebhookError(f'{name} must be a positive number')
+    return value
+
+
+def int_arg(args, name, default, maximum=None):
+    """A non-negative integer query argument; malformed values fall back to ``default``."""
+    try:
+        value = max(0, int(args.get(name, default)))
+    except ValueError:
+        return default
+    return min(value, maximum) if maximum is not None else value
+
+
+def request_deadline(headers, data=None):
+    """The request's deadline (tools.deadline), from the "deadline" payload field or the X-Request-Deadline header."""
+    payload_value = data.get(DEADLINE_FIELD) if isinstance(data, dict) else None
+    try:
+        return parse_deadline(headers.get(DEADLINE_HEADER), payload_value)
+    except ValueError as e:
+        raise WebhookError(str(e))
+
+
+def parse_search(data, headers):
+    """Returns the iter_search/search arguments of a /webhook/search request, plus "stream"."""
+    if not isinstance(data, dict) or 'query' not in data or 'max_results' not in data:
+        raise WebhookError('Missing query parameter')
+    return {
+        'query': data['query'],
+        'max_results': positive_int(data, 'max_results', required=True),
+        # Early termination: stop after N results and/or once the time budget (seconds) is spent
+        'stop_after': positive_int(data, 'stop_after') if data.get('stop_after') else None,
+        'time_budget': positive_number(data, 'time_budget') if data.get('time_budget') else None,
+        'deadline': request_deadline(headers, data),
+        'stream': bool(data.get('stream')),
+    }
+
+
+def search_body(results, deadline):
+    if deadline:
+        # With a deadline the results may be cut short, so they come with a flag
+        return {'results': results, 'partial': deadline.partial}
+    return results
+
+
+def search_stream_trailer(deadline):
+    """The line ending a streamed search whose deadline cut it short, or None."""
+    return {'partial': True} if deadline and deadline.partial else None
+
+
+def parse_instagram(options, headers):
+    """
+    Returns the options of a /webhook/instagram request: "max_age", "async",
+    "callback_url" and, for synchronous requests, "deadline".
+    """
+    options = options if isinstance(options, dict) else {}
+    parsed = {
+        'max_age': options.get('max_age'),
+        'async': bool(options.get('async')),
+        'callback_url': options.get('callback_url'),
+        'deadline': None,
+    }
+    if not parsed['async']:
+        parsed['deadline'] = request_deadline(headers, options)
+    return parsed
+
+
+def job_location(job):
+    return f"/webhook/instagram/jobs/{job['id']}"
+
+
+def job_body(job):
+    if not job:
+        raise WebhookError('Unknown job id', 404)
+    return job
+
+
+def parse_get_lyrics(data, headers):
+    """Returns (artists, song_name, deadline) of a /webhook/get_lyrics request."""
+    if not isinstance(data, dict) or 'artists' not in data or 'song_name' not in data:
+        raise WebhookError('Missing artists or song_name parameter')
+    return data['artists'], data['song_name'], request_deadline(headers, data)
+
+
+def parse_lyrics_batch(data, headers):
+    """Returns (items, concurrency, deadline, stream) of a /webhook/get_lyrics/batch request."""
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        raise WebhookError('Missing items parameter')
+    items = data['items']
+    lyrics_tool = registry.tool('lyrics')
+    if len(items) > lyrics_tool.BATCH_MAX_ITEMS:
+        raise WebhookError(f'Too many items, the limit is {lyrics_tool.BATCH_MAX_ITEMS}')
+    concurrency = positive_int(data, 'concurrency', lyrics_tool.BATCH_MAX_CONCURRENCY)
+    return (items, concurrency or lyrics_tool.BATCH_MAX_CONCURRENCY, request_deadline(headers, data),
+            bool(data.get('stream')))
+
+
+def batch_line(index, result):
+    """One NDJSON line of a streamed batch: the result with its position in the request."""
+    return {'index': index, **result}
+
+
+def parse_lyrics_search(data, headers):
+    """Returns (query, max_results, live_fallback, deadline) of a /webhook/lyrics_search request."""
+    if not isinstance(data, dict) or not data.get('query'):
+        raise WebhookError('Missing query parameter')
+    if get_default_index() is None:
+        raise WebhookError('The lyrics index is disabled (LYRICS_INDEX_ENABLED=0)', 503)
+    max_results = positive_int(data, 'max_results', MAX_LYRICS_SEARCH_RESULTS) if data.get('max_results') else 10
+    return data['query'], max_results, bool(data.get('live_fallback', True)), request_deadline(headers, data)
+
+
+def parse_song_note(data, write_behind):
+    """Check a /webhook/song_note payload; queued payloads are validated up front since nobody sees a later failure."""
+    if not data:
+        raise WebhookError('Invalid payload')
+    if write_behind:
+        error = validate_payload(data)
+        if error:
+            raise WebhookError(error, body={'status': 'error', 'message': error})
+    return data
+
+
+def song_note_queued(depth):
+    return {'status': 'accepted', 'message': 'Song history queued.', 'queue_depth': depth}, 202
+
+
+def song_note_saved(success):
+    if success:
+        return {'status': 'success', 'message': 'Song history saved.'}, 200
+    return {'status': 'error', 'message': 'Failed to save song history.'}, 500
+
+
+def parse_songs_page(args):
+    """Returns (offset, limit) of a songs listing."""
+    return int_arg(args, 'offset', 0), int_arg(args, 'limit', 50, MAX_PAGE_SIZE)
+
+
+def parse_recent(args):
+    """Returns (since, limit) of /webhook/song_note/recent."""
+    return args.get('since'), int_arg(args, 'limit', 50, MAX_PAGE_SIZE)
+
+
+def parse_top(args):
+    """Returns (kind, limit) of /webhook/song_note/top."""
+    kind = args.get('kind', 'songs')
+    if kind not in ('songs', 'artists'):
+        raise WebhookError("kind must be 'songs' or 'artists'")
+    return kind, int_arg(args, 'limit', 10, MAX_PAGE_SIZE)
+
+
+def top_query(store, kind, limit):
+    return store.top_songs(limit) if kind == 'songs' else store.top_artists(limit)
+
+
+def parse_events(args):
+    """Returns the EventLog.read arguments of /webhook/song_note/events."""
+    # Pass the returned next_cursor as ?cursor= to get only the events after it
+    return (int_arg(args, 'cursor', 0), int_arg(args, 'limit', 100, MAX_PAGE_SIZE),
+            args.get('type'), args.get('user'))
+
+
+def history_etag(last_updated, url):
+    """ETag of a history read: changes with every save and differs per URL (path and query)."""
+    return hashlib.sha1(f"{last_updated}|{url}".encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """True if the If-None-Match header lists ``etag`` (weak or strong) or is "*"."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag.strip('"') == etag:
+            return True
+    return False
+
+
+def history_body(data):
+    if data is None:
+        raise WebhookError('Unknown user', 404)
+    return data